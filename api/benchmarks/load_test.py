@@ -0,0 +1,184 @@
+"""API latency under increasing concurrency.
+
+Usage:
+    python benchmarks/load_test.py [--base-url URL] [--concurrency 1 10 50 100]
+                                   [--requests N] [--products N] [--history-products N]
+
+Without --base-url a temporary SQLite database is filled with --products rows,
+the first --history-products of them with a year of hourly observations, and
+the API is started with uvicorn on a free port. Every concurrency level
+runs --requests requests per endpoint with that many clients in flight and
+reports p50/p99 latency and throughput.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[2]
+API_SRC = Path(__file__).resolve().parent.parent / 'src'
+
+
+# Год ежечасных наблюдений
+HISTORY_HOURS = 24 * 365
+
+
+def fill_database(path: Path, products: int, observations: int = 24, history_products: int = 10):
+    sys.path.insert(0, str(ROOT))  # общий models.py
+    from sqlalchemy import create_engine, insert
+
+    from models import Base, PriceObservation, Website
+
+    engine = create_engine(f'sqlite:///{path}')
+    Base.metadata.create_all(engine)
+    rng = random.Random(products)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(Website), [
+            {'title': f'Товар {n}', 'url': f'https://shop{n % 50}.example/product/{n}',
+             'xpath': '//*[@id="price"]', 'status': 'success',
+             'price': rng.randint(100, 200000), 'currency': 'RUB'}
+            for n in range(products)
+        ])
+        for product_id in range(1, min(products, 1000) + 1):
+            hours = HISTORY_HOURS if product_id <= history_products else observations
+            rows = [
+                {'product_id': product_id, 'observed_at': now - timedelta(hours=hours - hour),
+                 'price': rng.randint(100, 200000), 'currency': 'RUB', 'status': 'success'}
+                for hour in range(hours)
+            ]
+            for start in range(0, len(rows), 10000):
+                conn.execute(insert(PriceObservation), rows[start:start + 10000])
+    engine.dispose()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(database: Path):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}',
+               PYTHONPATH=os.pathsep.join([str(API_SRC), str(ROOT)]))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning'],
+        env=env, cwd=str(API_SRC),
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(base_url + '/', timeout=1)
+            return proc, base_url
+        except httpx.TransportError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit('API did not start')
+
+
+def endpoints(products: int, history_products: int):
+    rng = random.Random(0)
+    observed = min(products, 1000)
+    year_ago = (datetime.utcnow() - timedelta(days=365)).isoformat()
+    with_history = max(1, min(history_products, observed))
+    return {
+        'GET /products (page)': lambda: f'/products?after_id={rng.randrange(products)}&limit=100',
+        'GET /products/{id}': lambda: f'/products/{rng.randint(1, products)}',
+        'GET /products/{id}/price': lambda: f'/products/{rng.randint(1, observed)}/price',
+        'GET /products/{id}/prices': lambda: f'/products/{rng.randint(1, observed)}/prices',
+        # Год ежечасных наблюдений: первая страница сырых точек и дневные агрегаты
+        'GET /products/{id}/prices (year)':
+            lambda: f'/products/{rng.randint(1, with_history)}/prices?start={year_ago}&limit=10000',
+        'GET /products/{id}/prices/downsampled (year, day)':
+            lambda: f'/products/{rng.randint(1, with_history)}/prices/downsampled?bucket=day',
+        'GET /statistics': lambda: '/statistics',
+    }
+
+
+async def run_level(client: httpx.AsyncClient, make_path, concurrency: int, total: int):
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def client_loop():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await client.get(make_path())
+            except httpx.TransportError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def percentile(values, q):
+    """q-th percentile of the latencies, or None when no request got a response."""
+    if not values:
+        return None
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1] if len(values) > 1 else values[0]
+
+
+def milliseconds(value) -> str:
+    return f"{value * 1000:8.1f} ms" if value is not None else f"{'n/a':>8}   "
+
+
+async def run(base_url: str, levels, total: int, products: int, history_products: int):
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        for name, make_path in endpoints(products, history_products).items():
+            print(name)
+            for concurrency in levels:
+                latencies, errors, elapsed = await run_level(client, make_path, concurrency, total)
+                print(
+                    f"  concurrency {concurrency:>4}: p50 {milliseconds(percentile(latencies, 50))}, "
+                    f"p99 {milliseconds(percentile(latencies, 99))}, "
+                    f"{len(latencies) / elapsed:8.1f} req/s, errors {errors}"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', help='test a running API instead of a local SQLite one')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50, 100])
+    parser.add_argument('--requests', type=int, default=500, help='requests per level and endpoint')
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--history-products', type=int, default=10,
+                        help='products with a year of hourly observations')
+    args = parser.parse_args()
+
+    proc = None
+    base_url = args.base_url
+    if base_url is None:
+        database = Path(tempfile.mkdtemp()) / 'api_load.db'
+        fill_database(database, args.products, history_products=args.history_products)
+        proc, base_url = start_server(database)
+    try:
+        asyncio.run(run(base_url, args.concurrency, args.requests, args.products, args.history_products))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""Streaming file exports of query results: CSV, XLSX and Parquet.
+
+Rows come from the database in batches and each batch is written out before
+the next is read, so memory stays bounded by one batch whatever the size of
+the table. CSV and Parquet bytes go to the client as they are produced, one
+Parquet row group per batch. An XLSX file can only be read once its zip
+directory is written, so it is built in a temporary file and streamed from
+there. An image built without openpyxl or pyarrow still serves CSV; the
+formats they write are reported as unavailable.
+"""
+import asyncio
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Boolean, DateTime, Integer, Numeric
+from sqlalchemy.sql.schema import Column
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet недоступен
+    pa = None
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # XLSX недоступен
+    Workbook = None
+
+# Порция байт, которой отдаётся ответ
+STREAM_CHUNK_SIZE = 64 * 1024
+# Больше строк Excel на одном листе не откроет
+XLSX_MAX_ROWS = 1_048_576
+
+FORMATS: Dict[str, Tuple[str, str]] = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+Batches = AsyncIterator[Sequence[tuple]]
+
+
+class ExportUnavailable(Exception):
+    """The library that writes this format is not installed."""
+
+
+def check_available(format: str):
+    if format == "parquet" and pa is None:
+        raise ExportUnavailable("Parquet export needs pyarrow installed")
+    if format == "xlsx" and Workbook is None:
+        raise ExportUnavailable("XLSX export needs openpyxl installed")
+
+
+def media_type(format: str) -> str:
+    return FORMATS[format][0]
+
+
+def content_disposition(name: str, format: str) -> str:
+    return f'attachment; filename="{name}.{FORMATS[format][1]}"'
+
+
+def _cell(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+async def csv_stream(fields: Sequence[str], batches: Batches) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    async for batch in batches:
+        # Decimal пишется как есть, без округления через float
+        writer.writerows([_cell(value) for value in row] for row in batch)
+        if buffer.tell() >= STREAM_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def arrow_type(column: Column):
+    """Parquet column type of a model column; anything unknown is written as text."""
+    column_type = column.type
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Numeric) and column_type.precision is not None:
+        return pa.decimal128(column_type.precision, column_type.scale or 0)
+    if isinstance(column_type, Numeric):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us")
+    return pa.string()
+
+
+class _ChunkSink:
+    """Write-only file for ParquetWriter that hands written bytes out in chunks.
+
+    tell() keeps counting from the start of the file, which the footer's
+    offsets depend on, while the bytes themselves are dropped once taken.
+    """
+
+    def __init__(self):
+        self.closed = False
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def parquet_stream(columns: Sequence[Column], batches: Batches) -> AsyncIterator[bytes]:
+    schema = pa.schema([pa.field(column.name, arrow_type(column), nullable=True) for column in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        async for batch in batches:
+            if not batch:
+                continue
+            # Строки превращаются в колонки; сжатие идёт в потоке, не блокируя цикл событий
+            table = pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)],
+                schema=schema,
+            )
+            await asyncio.to_thread(writer.write_table, table)
+            data = sink.take()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+async def xlsx_stream(fields: Sequence[str], batches: Batches,
+                      sheet_title: str = "export") -> AsyncIterator[bytes]:
+    # write_only держит в памяти только текущую строку, остальное пишет во временный XML
+    workbook = Workbook(write_only=True)
+    # Excel не принимает имена листов длиннее 31 символа
+    sheet = workbook.create_sheet(sheet_title[:31])
+    sheet.append(list(fields))
+    written = 1
+    async for batch in batches:
+        rows = list(batch)[:XLSX_MAX_ROWS - written]
+        await asyncio.to_thread(lambda: [sheet.append(list(row)) for row in rows])
+        written += len(rows)
+        if written >= XLSX_MAX_ROWS:
+            break
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        await asyncio.to_thread(workbook.save, path)
+        with open(path, "rb") as f:
+            while True:
+                data = await asyncio.to_thread(f.read, STREAM_CHUNK_SIZE)
+                if not data:
+                    break
+                yield data
+    finally:
+        os.unlink(path)
+
+
+def file_stream(format: str, columns: Sequence[Column], batches: Batches,
+                name: Optional[str] = None) -> AsyncIterator:
+    """Body of an export file in the given format."""
+    fields = [column.name for column in columns]
+    if format == "parquet":
+        return parquet_stream(columns, batches)
+    if format == "xlsx":
+        return xlsx_stream(fields, batches, sheet_title=name or "export")
+    return csv_stream(fields, batches)
@@ -1,35 +1,473 @@
+import asyncio
+import json
 import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import AsyncIterator, List, Literal, Optional
+
+from celery import Celery
+from celery.result import AsyncResult
 from dotenv import load_dotenv
+from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
-from fastapi import FastAPI, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, Gauge, Histogram, generate_latest
+
+import export
+import price_statistics
+from models import CrawlJob, CrawlResult, PriceObservation, Website
+from response_cache import STATISTICS_KEY, get_cache, price_key, product_key
 
 load_dotenv()
 
 class Settings(BaseSettings):
     DATABASE_URL: str = os.getenv("DATABASE_URL", "postgresql://user:password@db:5432/postgres")
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://redis:6379/0")
+    # Пул соединений: постоянные соединения, запас сверх них и ожидание свободного
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_ECHO: bool = os.getenv("DB_ECHO", "false").lower() == "true"
 
 settings = Settings()
 
-# Create synchronous engine
-engine = create_engine(settings.DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+# Синхронные драйверы из DATABASE_URL заменяются асинхронными
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+def create_engine_from_settings(settings: Settings):
+    url = async_database_url(settings.DATABASE_URL)
+    options = {"echo": settings.DB_ECHO}
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+    return create_async_engine(url, **options)
+
+# Create asynchronous engine
+engine = create_engine_from_settings(settings)
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+# Only used to read task states from the result backend
+celery_app = Celery("api", broker=settings.REDIS_URL, backend=settings.REDIS_URL)
 
 app = FastAPI(title="Website Parser API")
 
+REQUEST_SECONDS = Histogram(
+    "api_request_seconds", "Time to build a response, by route template",
+    ["method", "route", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+CACHE_EVENTS = Gauge("api_cache_events", "Response cache counters of this process", ["event"])
+
+@app.middleware("http")
+async def observe_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Шаблон маршрута, а не путь: id в URL не должны плодить серии
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(
+        request.method, route.path if route is not None else "unmatched", response.status_code
+    ).observe(time.perf_counter() - started)
+    return response
+
 # Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+Bucket = Literal["hour", "day", "week", "month"]
+ExportFormat = Literal["json", "csv", "xlsx", "parquet"]
+
+# strftime-шаблоны для SQLite, где нет date_trunc
+SQLITE_BUCKETS = {
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+    "month": "%Y-%m-01 00:00:00",
+}
+
+PRODUCT_FIELDS = (
+    "id", "title", "url", "xpath", "status", "price", "price_raw", "currency", "last_checked",
+)
+RESULT_FIELDS = (
+    "id", "url", "xpath", "title", "success", "price", "price_raw", "currency", "error", "checked_at",
+)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+# Размер порции строк на одну задачу воркера, как у бота
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 200))
+
+def is_postgres(db: AsyncSession) -> bool:
+    return db.bind.dialect.name == "postgresql"
+
+def json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def product_to_dict(product: Website) -> dict:
+    return {name: json_value(getattr(product, name)) for name in PRODUCT_FIELDS}
+
+def observation_to_dict(observation: PriceObservation) -> dict:
+    return {
+        "observed_at": observation.observed_at.isoformat(),
+        "price": float(observation.price) if observation.price is not None else None,
+        "currency": observation.currency,
+        "status": observation.status,
+    }
+
+def job_to_dict(job: CrawlJob) -> dict:
+    processed = job.done + job.failed
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "total": job.total,
+        "done": job.done,
+        "failed": job.failed,
+        "progress": round(processed / job.total, 3) if job.total else None,
+        "created_at": json_value(job.created_at),
+        "updated_at": json_value(job.updated_at),
+        "finished_at": json_value(job.finished_at),
+    }
+
+def result_to_dict(result: CrawlResult) -> dict:
+    return {name: json_value(getattr(result, name)) for name in RESULT_FIELDS}
+
+async def get_product_or_404(db: AsyncSession, product_id: int) -> Website:
+    product = await db.get(Website, product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail=f"Product {product_id} not found")
+    return product
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """observed_at is a naive UTC TIMESTAMP; asyncpg rejects aware values compared with it."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def bucket_expression(db: AsyncSession, bucket: Bucket):
+    if is_postgres(db):
+        return func.date_trunc(bucket, PriceObservation.observed_at)
+    if bucket == "week":
+        # Понедельник недели, к которой относится наблюдение
+        return func.datetime(PriceObservation.observed_at, "weekday 0", "-6 days", "start of day")
+    return func.strftime(SQLITE_BUCKETS[bucket], PriceObservation.observed_at)
 
 @app.get("/")
 async def root():
-    return {"message": "Website Parser API is running"} 
\ No newline at end of file
+    return {"message": "Website Parser API is running"}
+
+@app.get("/products")
+async def list_products(
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    status: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Products ordered by id; pass next_after_id back to get the next page."""
+    # Keyset-пагинация: WHERE id > after_id идёт по индексу, без OFFSET
+    query = select(Website).where(Website.id > after_id).order_by(Website.id).limit(limit)
+    if status is not None:
+        query = query.where(Website.status == status)
+    products = (await db.execute(query)).scalars().all()
+    return {
+        "items": [product_to_dict(p) for p in products],
+        "next_after_id": products[-1].id if len(products) == limit else None,
+    }
+
+async def export_batches(query) -> AsyncIterator[list]:
+    # Сессия открывается внутри генератора: ответ отдаётся уже после выхода из зависимостей
+    async with SessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for batch in result.partitions(EXPORT_BATCH_SIZE):
+            yield batch
+
+async def export_json(fields, batches) -> AsyncIterator[str]:
+    yield "["
+    separator = ""
+    async for batch in batches:
+        for row in batch:
+            yield separator + json.dumps(
+                {name: json_value(value) for name, value in zip(fields, row)}, ensure_ascii=False
+            )
+            separator = ","
+    yield "]"
+
+def export_response(format: ExportFormat, columns, query, name: str) -> StreamingResponse:
+    """Stream query rows as a JSON array or a CSV, XLSX or Parquet file, batch by batch."""
+    fields = [column.name for column in columns]
+    if format == "json":
+        return StreamingResponse(export_json(fields, export_batches(query)), media_type="application/json")
+    try:
+        export.check_available(format)
+    except export.ExportUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return StreamingResponse(
+        export.file_stream(format, columns, export_batches(query), name=name),
+        media_type=export.media_type(format),
+        headers={"Content-Disposition": export.content_disposition(name, format)},
+    )
+
+@app.get("/products/export")
+async def export_products(format: ExportFormat = "json", status: Optional[str] = None):
+    """Stream every product without loading the table into memory."""
+    columns = [Website.__table__.c[name] for name in PRODUCT_FIELDS]
+    query = select(*columns).order_by(Website.id)
+    if status is not None:
+        query = query.where(Website.status == status)
+    return export_response(format, columns, query, "products")
+
+@app.get("/products/{product_id}")
+async def get_product(product_id: int, db: AsyncSession = Depends(get_db)):
+    async def compute():
+        return product_to_dict(await get_product_or_404(db, product_id))
+
+    return await get_cache().aget_or_set(product_key(product_id), compute)
+
+@app.get("/products/{product_id}/price")
+async def latest_price(product_id: int, db: AsyncSession = Depends(get_db)):
+    """Latest observation of a product."""
+    async def compute():
+        product = await get_product_or_404(db, product_id)
+        observation = (await db.execute(
+            select(PriceObservation)
+            .where(PriceObservation.product_id == product_id)
+            .order_by(PriceObservation.observed_at.desc())
+            .limit(1)
+        )).scalar_one_or_none()
+        return {
+            "product_id": product.id,
+            "title": product.title,
+            "url": product.url,
+            "latest": observation_to_dict(observation) if observation else None,
+        }
+
+    return await get_cache().aget_or_set(price_key(product_id), compute)
+
+@app.get("/products/{product_id}/prices")
+async def price_history(
+    product_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after_id: Optional[int] = Query(None, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_db),
+):
+    """Raw observations of a product in [start, end), oldest first.
+
+    A full page carries next_start and next_after_id; pass them back as start
+    and after_id to get the next one.
+    """
+    await get_product_or_404(db, product_id)
+    end = naive_utc(end) or datetime.utcnow()
+    start = naive_utc(start) or end - timedelta(days=30)
+    # Колонки вместо ORM-объектов: страница в тысячи точек не строит identity map
+    query = select(
+        PriceObservation.id, PriceObservation.observed_at, PriceObservation.price,
+        PriceObservation.currency, PriceObservation.status,
+    ).where(
+        PriceObservation.product_id == product_id,
+        PriceObservation.observed_at < end,
+    )
+    if after_id is None:
+        query = query.where(PriceObservation.observed_at >= start)
+    else:
+        # Keyset-пагинация по (observed_at, id): у наблюдений одного момента порядок тоже определён
+        query = query.where(tuple_(PriceObservation.observed_at, PriceObservation.id) > tuple_(start, after_id))
+    observations = (await db.execute(
+        query.order_by(PriceObservation.observed_at, PriceObservation.id).limit(limit)
+    )).all()
+    last = observations[-1] if len(observations) == limit else None
+    return {
+        "product_id": product_id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "observations": [observation_to_dict(o) for o in observations],
+        "next_start": last.observed_at.isoformat() if last is not None else None,
+        "next_after_id": last.id if last is not None else None,
+    }
+
+@app.get("/products/{product_id}/prices/downsampled")
+async def downsampled_prices(
+    product_id: int,
+    bucket: Bucket = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Min/avg/max price per time bucket, aggregated in the database."""
+    await get_product_or_404(db, product_id)
+    end = naive_utc(end) or datetime.utcnow()
+    start = naive_utc(start) or end - timedelta(days=365)
+    period = bucket_expression(db, bucket).label("period")
+    rows = (await db.execute(
+        select(
+            period,
+            func.min(PriceObservation.price),
+            func.avg(PriceObservation.price),
+            func.max(PriceObservation.price),
+            func.count(PriceObservation.price),
+        )
+        .where(
+            PriceObservation.product_id == product_id,
+            PriceObservation.observed_at >= start,
+            PriceObservation.observed_at < end,
+        )
+        .group_by(period)
+        .order_by(period)
+    )).all()
+    return {
+        "product_id": product_id,
+        "bucket": bucket,
+        "points": [
+            {
+                "period": p.isoformat() if isinstance(p, datetime) else str(p),
+                "min": float(low) if low is not None else None,
+                "avg": float(avg) if avg is not None else None,
+                "max": float(high) if high is not None else None,
+                "observations": count,
+            }
+            for p, low, avg, high, count in rows
+        ],
+    }
+
+async def compute_statistics(db: AsyncSession) -> dict:
+    total_products = (await db.execute(price_statistics.total_statement())).scalar()
+    summary = (await db.execute(price_statistics.summary_statement())).one()
+    median = None
+    if summary[0]:
+        median = price_statistics.median_of((await db.execute(
+            price_statistics.median_statement(db.bind.dialect.name, summary[0])
+        )).scalars().all())
+    return price_statistics.build_statistics(total_products, summary, median)
+
+@app.get("/statistics")
+async def statistics(db: AsyncSession = Depends(get_db)):
+    """Product counts and price statistics, the same figures the bot reports."""
+    # Ключ общий с задачей get_statistics воркера; воркер сбрасывает кэш после записи
+    return await get_cache().aget_or_set(STATISTICS_KEY, lambda: compute_statistics(db))
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit ratio of this API process's response cache."""
+    return get_cache().stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus exposition of request latencies and cache counters."""
+    stats = get_cache().stats()
+    for event in ("local_hits", "redis_hits", "misses", "invalidations"):
+        CACHE_EVENTS.labels(event).set(stats[event])
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/tasks/{task_id}")
+async def task_status(task_id: str):
+    """State of a crawl task; PROGRESS carries done/total."""
+    result = AsyncResult(task_id, app=celery_app)
+    # Клиент result backend синхронный, поэтому запрос уходит в поток
+    state, info = await asyncio.to_thread(lambda: (result.state, result.info))
+    response = {"task_id": task_id, "state": state}
+    if isinstance(info, dict):
+        response["progress"] = {k: info[k] for k in ("done", "total") if k in info}
+    elif isinstance(info, Exception):
+        response["error"] = str(info)
+    return response
+
+class WebsiteIn(BaseModel):
+    title: str
+    url: str
+    xpath: str = ""
+
+class JobIn(BaseModel):
+    websites: List[WebsiteIn] = Field(min_length=1)
+
+async def get_job_or_404(db: AsyncSession, job_id: str) -> CrawlJob:
+    job = await db.get(CrawlJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.post("/jobs", status_code=202)
+async def submit_job(job_in: JobIn, db: AsyncSession = Depends(get_db)):
+    """Create a crawl job and send its rows to the workers in chunks."""
+    # Результат хранится один раз на пару url + xpath, поэтому повторы отбрасываются
+    unique = {(website.url, website.xpath): website.model_dump() for website in job_in.websites}
+    rows = list(unique.values())
+    job = CrawlJob(id=uuid.uuid4().hex, status="running", total=len(rows), done=0, failed=0)
+    db.add(job)
+    await db.commit()
+
+    def dispatch():
+        for start in range(0, len(rows), CHUNK_SIZE):
+            celery_app.send_task(
+                "main.process_websites", args=[rows[start:start + CHUNK_SIZE]],
+                kwargs={"job_id": job.id},
+            )
+
+    await asyncio.to_thread(dispatch)
+    return job_to_dict(job)
+
+@app.get("/jobs/{job_id}")
+async def job_progress(job_id: str, db: AsyncSession = Depends(get_db)):
+    """Counters of a crawl job, updated by workers after every write."""
+    return job_to_dict(await get_job_or_404(db, job_id))
+
+@app.get("/jobs/{job_id}/results")
+async def job_results(
+    job_id: str,
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    failed: Optional[bool] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Per-row results of a job in write order; pass next_after_id back for the next page."""
+    await get_job_or_404(db, job_id)
+    query = (
+        select(CrawlResult)
+        .where(CrawlResult.job_id == job_id, CrawlResult.id > after_id)
+        .order_by(CrawlResult.id)
+        .limit(limit)
+    )
+    if failed is not None:
+        query = query.where(CrawlResult.success.is_(not failed))
+    results = (await db.execute(query)).scalars().all()
+    return {
+        "job_id": job_id,
+        "items": [result_to_dict(r) for r in results],
+        "next_after_id": results[-1].id if len(results) == limit else None,
+        # Пока задание идёт, новые строки появляются после last_id
+        "last_id": results[-1].id if results else after_id,
+    }
+
+@app.get("/jobs/{job_id}/export")
+async def export_job_results(
+    job_id: str,
+    format: ExportFormat = "csv",
+    failed: Optional[bool] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """All results of a job as one file, read from the database in batches."""
+    await get_job_or_404(db, job_id)
+    columns = [CrawlResult.__table__.c[name] for name in RESULT_FIELDS]
+    query = select(*columns).where(CrawlResult.job_id == job_id).order_by(CrawlResult.id)
+    if failed is not None:
+        query = query.where(CrawlResult.success.is_(not failed))
+    return export_response(format, columns, query, f"results_{job_id}")
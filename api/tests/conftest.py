@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# main.py импортируется по имени из src/, общий models.py лежит в корне
+sys.path[:0] = [os.path.join(API_DIR, 'src'), os.path.dirname(API_DIR)]
+# Движок API создаётся при импорте main, поэтому база задаётся заранее
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(), 'api_test.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE_PATH}'
+os.environ.setdefault('CACHE_REDIS_URL', '')
+
+from models import Base  # noqa: E402
+
+
+@pytest.fixture
+def db(monkeypatch):
+    import response_cache
+
+    engine = create_engine(f'sqlite:///{DATABASE_PATH}')
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(response_cache, '_default', None)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
@@ -0,0 +1,60 @@
+import csv
+import io
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from models import CrawlJob, CrawlResult
+
+
+def add_job(db, rows):
+    db.add(CrawlJob(id='j1', total=rows, done=rows))
+    db.flush()
+    db.add_all(CrawlResult(job_id='j1', url=f'http://shop.test/{n}', xpath='//p', title=f'Item {n}',
+                           success=n % 3 != 0, price=Decimal(n) / 4 if n % 3 else None,
+                           error=None if n % 3 else 'HTTP 503', checked_at=datetime(2024, 1, 1))
+               for n in range(1, rows + 1))
+    db.commit()
+
+
+def test_csv_export_has_every_row(client, db, monkeypatch):
+    import main
+
+    # Несколько порций, чтобы проверить склейку потока
+    monkeypatch.setattr(main, 'EXPORT_BATCH_SIZE', 7)
+    add_job(db, 50)
+    response = client.get('/jobs/j1/export', params={'format': 'csv'})
+    assert response.status_code == 200
+    assert response.headers['content-disposition'] == 'attachment; filename="results_j1.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 50
+    assert rows[1]['price'] == '0.50'
+    assert rows[2]['error'] == 'HTTP 503'
+    assert rows[0]['checked_at'] == '2024-01-01T00:00:00'
+
+    failed = client.get('/jobs/j1/export', params={'format': 'csv', 'failed': 'true'})
+    assert len(list(csv.DictReader(io.StringIO(failed.text)))) == 16
+
+
+def test_unknown_job_is_404(client, db):
+    assert client.get('/jobs/missing/export').status_code == 404
+
+
+def test_xlsx_export(client, db):
+    openpyxl = pytest.importorskip('openpyxl')
+    add_job(db, 5)
+    response = client.get('/jobs/j1/export', params={'format': 'xlsx'})
+    sheet = openpyxl.load_workbook(io.BytesIO(response.content), read_only=True).active
+    rows = list(sheet.iter_rows(values_only=True))
+    assert rows[0][:3] == ('id', 'url', 'xpath')
+    assert len(rows) == 6
+
+
+def test_parquet_export_keeps_decimals(client, db):
+    pq = pytest.importorskip('pyarrow.parquet')
+    add_job(db, 20)
+    response = client.get('/jobs/j1/export', params={'format': 'parquet'})
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == 20
+    assert table.column('price').to_pylist()[:3] == [Decimal('0.25'), Decimal('0.50'), None]
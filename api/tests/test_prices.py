@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+from models import PriceObservation, Website
+
+START = datetime(2024, 1, 1)
+
+
+def add_history(db, hours):
+    product = Website(title='Item', url='http://shop.test/item', status='success')
+    db.add(product)
+    db.flush()
+    db.add_all(PriceObservation(product_id=product.id, observed_at=START + timedelta(hours=hour),
+                                price=hour, currency='RUB', status='success')
+               for hour in range(hours))
+    db.commit()
+    return product.id
+
+
+def test_price_history_pages_through_the_whole_range(client, db):
+    product_id = add_history(db, 250)
+    params = {'start': START.isoformat(), 'end': (START + timedelta(days=30)).isoformat(), 'limit': 100}
+    prices = []
+    while True:
+        page = client.get(f'/products/{product_id}/prices', params=params).json()
+        prices += [o['price'] for o in page['observations']]
+        if page['next_after_id'] is None:
+            break
+        params.update(start=page['next_start'], after_id=page['next_after_id'])
+    assert prices == [float(hour) for hour in range(250)]
+
+
+def test_price_history_accepts_aware_datetimes(client, db):
+    product_id = add_history(db, 10)
+    # 03:00+03:00 — это полночь по UTC
+    page = client.get(f'/products/{product_id}/prices', params={
+        'start': '2024-01-01T03:00:00+03:00', 'end': '2024-01-01T05:00:00Z',
+    }).json()
+    assert page['start'] == '2024-01-01T00:00:00'
+    assert [o['price'] for o in page['observations']] == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert page['next_after_id'] is None
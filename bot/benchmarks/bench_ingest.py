@@ -0,0 +1,119 @@
+"""Upload ingestion: pandas round trip versus streaming row iteration.
+
+Usage:
+    python benchmarks/bench_ingest.py [--sizes 1000 10000 100000] [--chunk-size N]
+
+For every size an .xlsx and a .csv file are generated. "pandas" repeats what
+the bot used to do with an upload (read_excel, to_excel, iterrows echo message,
+to_dict); "streaming" reads rows through ingest.py and hands out CHUNK_SIZE
+batches. Reported: time until the first batch could be dispatched, total time
+and peak RSS of a fresh child process.
+"""
+import argparse
+import csv
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+
+def write_files(directory: Path, size: int):
+    from openpyxl import Workbook
+
+    header = ('title', 'url', 'xpath')
+    rows = [
+        (f'Товар {n}', f'https://shop{n % 50}.example/product/{n}', '//*[@id="product-price"]')
+        for n in range(size)
+    ]
+    xlsx_path = directory / f'websites_{size}.xlsx'
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(xlsx_path)
+
+    csv_path = directory / f'websites_{size}.csv'
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return xlsx_path, csv_path
+
+
+def pandas_ingest(path: Path, chunk_size: int):
+    import pandas as pd
+
+    started = time.perf_counter()
+    df = pd.read_excel(path, engine='openpyxl')
+    df.to_excel(path.with_suffix('.copy.xlsx'), index=False, engine='openpyxl')
+    response = ''
+    for _, row in df.iterrows():
+        response += f"Название: {row['title']}\n"
+        response += f"URL: {row['url']}\n"
+        response += f"XPath: {row['xpath']}\n"
+        response += "-" * 30 + "\n"
+    records = df.to_dict('records')
+    first_batch = time.perf_counter() - started
+    batches = [records[i:i + chunk_size] for i in range(0, len(records), chunk_size)]
+    return first_batch, time.perf_counter() - started, sum(map(len, batches))
+
+
+def streaming_ingest(path: Path, chunk_size: int):
+    from ingest import IngestStats, iter_batches, iter_raw_rows, iter_websites
+
+    started = time.perf_counter()
+    first_batch = None
+    rows = 0
+    for batch in iter_batches(iter_websites(iter_raw_rows(str(path)), IngestStats()), chunk_size):
+        if first_batch is None:
+            first_batch = time.perf_counter() - started
+        rows += len(batch)
+    return first_batch, time.perf_counter() - started, rows
+
+
+def run_impl(name, path, chunk_size, queue):
+    first_batch, total, rows = globals()[name](Path(path), chunk_size)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((first_batch, total, rows, peak_kb))
+
+
+def measure(ctx, name, path, chunk_size):
+    # Каждый замер в отдельном процессе, чтобы пик памяти не смешивался
+    queue = ctx.Queue()
+    proc = ctx.Process(target=run_impl, args=(name, str(path), chunk_size, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--chunk-size', type=int, default=200)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    directory = Path(tempfile.mkdtemp())
+    for size in args.sizes:
+        xlsx_path, csv_path = write_files(directory, size)
+        cases = [
+            ('pandas xlsx', 'pandas_ingest', xlsx_path),
+            ('streaming xlsx', 'streaming_ingest', xlsx_path),
+            ('streaming csv', 'streaming_ingest', csv_path),
+        ]
+        for label, name, path in cases:
+            first_batch, total, rows, peak_kb = measure(ctx, name, path, args.chunk_size)
+            print(
+                f"{size:>7} rows | {label:>14}: first batch {first_batch * 1000:9.1f} ms, "
+                f"total {total * 1000:9.1f} ms, peak RSS {peak_kb / 1024:7.1f} MB ({rows} rows)"
+            )
+
+
+if __name__ == '__main__':
+    main()
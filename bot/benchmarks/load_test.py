@@ -0,0 +1,131 @@
+"""Bot responsiveness while many uploads wait for worker results.
+
+Usage:
+    python benchmarks/load_test.py [--uploads 1 10 50 100] [--chunks N] [--crawl-seconds S]
+
+Simulates concurrent uploads whose chunk results become ready at random moments
+and measures how long a /start-style reply waits for the event loop. "blocking"
+waits with AsyncResult.get() inside the coroutine, as the bot used to;
+"polling" follows the job counters with api_client.iter_job_progress and
+sends the results as one document, as the bot does now. Redis, the API and
+Telegram are replaced by fakes.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+os.environ.setdefault('RESULT_POLL_INTERVAL', '0.05')
+
+import api_client  # noqa: E402
+from api_client import iter_job_progress  # noqa: E402
+from handlers import format_job, format_result  # noqa: E402
+
+# Чанки каждого задания; поддельный API считает по ним счётчики
+fake_jobs = {}
+
+
+class FakeResult:
+    """AsyncResult stand-in that becomes ready at a fixed moment."""
+
+    def __init__(self, ready_at: float, rows: int):
+        self.ready_at = ready_at
+        self.rows = rows
+
+    def ready(self) -> bool:
+        return time.monotonic() >= self.ready_at
+
+    def get(self):
+        delay = self.ready_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return [{'success': True, 'title': f'item {n}', 'price': '12 499'}
+                for n in range(self.rows)]
+
+
+async def fake_get_job(job_id: str):
+    chunks = fake_jobs[job_id]
+    ready = [chunk for chunk in chunks if chunk.ready()]
+    return {
+        'job_id': job_id,
+        'status': 'finished' if len(ready) == len(chunks) else 'running',
+        'total': sum(chunk.rows for chunk in chunks),
+        'done': sum(chunk.rows for chunk in ready),
+        'failed': 0,
+    }
+
+
+api_client.get_job = fake_get_job
+
+
+async def send_message(text: str):
+    # Имитация вызова Telegram API
+    await asyncio.sleep(0.001)
+
+
+async def blocking_upload(results):
+    for result in results:
+        for row in result.get():
+            await send_message(format_result(row))
+
+
+async def polling_upload(results):
+    job_id = uuid.uuid4().hex
+    fake_jobs[job_id] = results
+    async for job in iter_job_progress(job_id):
+        await send_message(format_job(job))
+    # Результаты уходят одним документом
+    await send_message('document')
+
+
+async def probe(stop: asyncio.Event, latencies):
+    """Measure how late a reply scheduled every 20 ms actually runs."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        scheduled = loop.time()
+        await asyncio.sleep(0.02)
+        latencies.append(loop.time() - scheduled - 0.02)
+
+
+async def run_scenario(upload, uploads, chunks, crawl_seconds):
+    now = time.monotonic()
+    jobs = [
+        [FakeResult(now + random.uniform(0.1, crawl_seconds), rows=5) for _ in range(chunks)]
+        for _ in range(uploads)
+    ]
+    stop = asyncio.Event()
+    latencies = []
+    probe_task = asyncio.create_task(probe(stop, latencies))
+    await asyncio.gather(*(upload(job) for job in jobs))
+    stop.set()
+    await probe_task
+    return latencies
+
+
+def report(label, uploads, latencies):
+    ordered = sorted(latencies) or [0.0]
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{label:>9} | {uploads:4d} uploads | reply delay p50 "
+          f"{statistics.median(ordered) * 1000:8.1f} ms, p99 {p99 * 1000:8.1f} ms, "
+          f"max {ordered[-1] * 1000:8.1f} ms")
+
+
+async def main(args):
+    for uploads in args.uploads:
+        for label, upload in (('blocking', blocking_upload), ('polling', polling_upload)):
+            latencies = await run_scenario(upload, uploads, args.chunks, args.crawl_seconds)
+            report(label, uploads, latencies)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--uploads', type=int, nargs='+', default=[1, 10, 50, 100])
+    parser.add_argument('--chunks', type=int, default=4)
+    parser.add_argument('--crawl-seconds', type=float, default=2.0)
+    asyncio.run(main(parser.parse_args()))
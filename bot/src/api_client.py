@@ -0,0 +1,130 @@
+"""Read crawl job progress and results from the API instead of the result backend."""
+import asyncio
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiohttp
+
+from tasks import RESULT_POLL_INTERVAL
+
+API_URL = os.getenv('API_URL', 'http://api:8000')
+# Сколько строк результата забирать одним запросом
+RESULTS_PAGE_SIZE = int(os.getenv('RESULTS_PAGE_SIZE', 100))
+# Если новых результатов нет столько секунд, задание считается зависшим
+JOB_STALL_TIMEOUT = float(os.getenv('JOB_STALL_TIMEOUT', 600))
+# Формат файла с результатами: csv, xlsx или parquet
+EXPORT_FORMAT = os.getenv('EXPORT_FORMAT', 'xlsx')
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+class JobStalled(Exception):
+    """No new results arrived within JOB_STALL_TIMEOUT."""
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Shared session for API calls; keeps connections to the API alive."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(base_url=API_URL, timeout=aiohttp.ClientTimeout(total=30))
+    return _session
+
+
+async def close_session():
+    if _session is not None and not _session.closed:
+        await _session.close()
+
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Job counters, or None if no worker has reported on it yet."""
+    async with get_session().get(f'/jobs/{job_id}') as response:
+        if response.status == 404:
+            return None
+        response.raise_for_status()
+        return await response.json()
+
+
+async def get_job_results(job_id: str, after_id: int = 0,
+                          limit: int = RESULTS_PAGE_SIZE) -> Dict[str, Any]:
+    async with get_session().get(
+        f'/jobs/{job_id}/results', params={'after_id': after_id, 'limit': limit}
+    ) as response:
+        if response.status == 404:
+            return {'items': [], 'last_id': after_id}
+        response.raise_for_status()
+        return await response.json()
+
+
+async def iter_job_results(job_id: str) -> AsyncIterator[List[Dict]]:
+    """Yield pages of new results until the job is finished.
+
+    Only the job counters and the rows after the last seen id travel over
+    the wire on each poll.
+    """
+    loop = asyncio.get_running_loop()
+    last_id = 0
+    last_progress = loop.time()
+    while True:
+        page = await get_job_results(job_id, last_id)
+        if page['items']:
+            last_id = page['last_id']
+            last_progress = loop.time()
+            yield page['items']
+            if len(page['items']) == RESULTS_PAGE_SIZE:
+                continue
+        job = await get_job(job_id)
+        if job is not None and job['status'] == 'finished':
+            # Последние строки могли записаться между двумя запросами
+            page = await get_job_results(job_id, last_id)
+            if page['items']:
+                last_id = page['last_id']
+                yield page['items']
+                continue
+            return
+        if loop.time() - last_progress > JOB_STALL_TIMEOUT:
+            raise JobStalled(f"Job {job_id} made no progress for {JOB_STALL_TIMEOUT:.0f}s")
+        await asyncio.sleep(RESULT_POLL_INTERVAL)
+
+
+async def iter_job_progress(job_id: str,
+                            dispatching: Optional[asyncio.Task] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Yield job counters whenever they change, until the job is finished.
+
+    Only the counters are polled; results stay in the database until exported.
+    If dispatching the rows fails, its error is raised at once.
+    """
+    loop = asyncio.get_running_loop()
+    processed = None
+    last_progress = loop.time()
+    while True:
+        if dispatching is not None and dispatching.done() and dispatching.exception() is not None:
+            # Строки не отправлены (например, брокер недоступен): ждать результатов незачем
+            raise dispatching.exception()
+        job = await get_job(job_id)
+        if job is not None and job['done'] + job['failed'] != processed:
+            processed = job['done'] + job['failed']
+            last_progress = loop.time()
+            yield job
+        if job is not None and job['status'] == 'finished':
+            return
+        if dispatching is not None and not dispatching.done():
+            # Пока строки ещё отправляются, отсутствие результатов — не зависание
+            last_progress = loop.time()
+        elif loop.time() - last_progress > JOB_STALL_TIMEOUT:
+            raise JobStalled(f"Job {job_id} made no progress for {JOB_STALL_TIMEOUT:.0f}s")
+        await asyncio.sleep(RESULT_POLL_INTERVAL)
+
+
+async def download_export(job_id: str, destination: str, format: str = EXPORT_FORMAT) -> str:
+    """Save all results of a job as one file; the body is written to disk as it arrives."""
+    async with get_session().get(
+        f'/jobs/{job_id}/export', params={'format': format},
+        # Большой файл может идти дольше общего таймаута сессии
+        timeout=aiohttp.ClientTimeout(total=None, sock_read=60),
+    ) as response:
+        response.raise_for_status()
+        with open(destination, 'wb') as f:
+            async for chunk in response.content.iter_chunked(EXPORT_CHUNK_SIZE):
+                f.write(chunk)
+    return destination
@@ -1,20 +1,64 @@
 from aiogram import Dispatcher, types
 from aiogram.filters import Command
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
-import pandas as pd
-import io
+from aiogram.types import FSInputFile, ReplyKeyboardMarkup, KeyboardButton
 from datetime import datetime
-from celery import Celery
+from decimal import Decimal, InvalidOperation
+import asyncio
 import logging
+import os
+import tempfile
+import time
+import uuid
+
+from ingest import (
+    SUPPORTED_EXTENSIONS, IngestStats, MissingColumnsError, iter_batches, iter_raw_rows, iter_websites,
+)
+import metrics
+from api_client import EXPORT_FORMAT, JobStalled, download_export, get_job, iter_job_progress, iter_job_results
+from tasks import CHUNK_SIZE, celery_app, dispatch_chunk, send_job_total, wait_for_result
+
+# Сколько первых строк файла показывать пользователю перед парсингом
+PREVIEW_ROWS = int(os.getenv('PREVIEW_ROWS', 10))
+# До скольких строк результаты приходят сообщениями; больше — одним файлом
+INLINE_RESULTS_MAX = int(os.getenv('INLINE_RESULTS_MAX', 20))
+
+# Последнее задание каждого чата, для /status без аргументов
+last_jobs = {}
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Celery
-celery_app = Celery('bot',
-                   broker='redis://redis:6379/0',
-                   backend='redis://redis:6379/0')
+def format_result(result) -> str:
+    """Build the per-site message for one parsing result."""
+    if result.get('success', False):
+        price = result.get('price')
+        if price is not None:
+            # Цена приходит числом; форматируем с пробелами между тысячами
+            try:
+                value = Decimal(str(price))
+                pattern = "{:,.0f}" if value == value.to_integral_value() else "{:,.2f}"
+                formatted_price = pattern.format(value).replace(',', ' ')
+                price_text = f"Цена: {formatted_price} ₽"
+            except InvalidOperation:
+                price_text = f"Цена: {result.get('price_raw') or price}"
+        else:
+            price_text = "Цена не найдена"
+        return f"✅ {result.get('title', 'Без названия')}\n{price_text}"
+    return (
+        f"❌ {result.get('title', 'Без названия')}\n"
+        f"Ошибка: {result.get('error', 'Неизвестная ошибка')}"
+    )
+
+def format_job(job) -> str:
+    """Build the progress line of a crawl job."""
+    processed = job['done'] + job['failed']
+    total = job['total'] if job['total'] is not None else '?'
+    state = "✅ завершено" if job['status'] == 'finished' else "⏳ в работе"
+    return (
+        f"Задание {job['job_id']}: {state}\n"
+        f"Обработано {processed} из {total} (ошибок: {job['failed']})"
+    )
 
 def register_handlers(dp: Dispatcher):
     # Create keyboard
@@ -30,15 +74,33 @@ def register_handlers(dp: Dispatcher):
         await message.answer(
             "Привет! Я бот для парсинга цен с веб-сайтов.\n\n"
             "Я могу:\n"
-            "1. Принимать Excel файлы с данными для парсинга\n\n"
+            "1. Принимать Excel и CSV файлы с данными для парсинга\n"
+            "2. Показывать ход парсинга по команде /status\n\n"
             "Используйте кнопку ниже для загрузки файла.",
             reply_markup=keyboard
         )
 
+    @dp.message(Command("status"))
+    async def cmd_status(message: types.Message):
+        parts = (message.text or '').split(maxsplit=1)
+        job_id = parts[1].strip() if len(parts) > 1 else last_jobs.get(message.chat.id)
+        if not job_id:
+            await message.answer("Нет запущенных заданий. Укажите id: /status <job_id>")
+            return
+        try:
+            job = await get_job(job_id)
+        except Exception as e:
+            await message.answer(f"Не удалось получить состояние задания: {str(e)}")
+            return
+        if job is None:
+            await message.answer(f"Задание {job_id} ещё не начато или не найдено")
+            return
+        await message.answer(format_job(job))
+
     @dp.message(lambda message: message.text == "Загрузить файл")
     async def upload_file(message: types.Message):
         await message.answer(
-            "Пожалуйста, отправьте Excel файл (.xlsx, .xls) со следующими колонками:\n"
+            "Пожалуйста, отправьте Excel или CSV файл (.xlsx, .xls, .csv) со следующими колонками:\n"
             "- title: название сайта\n"
             "- url: ссылка на сайт\n"
             "- xpath: путь к элементу с ценой"
@@ -46,42 +108,49 @@ def register_handlers(dp: Dispatcher):
 
     @dp.message(lambda message: message.document is not None)
     async def handle_file(message: types.Message):
-        # Check if file is Excel
-        if not message.document.file_name.endswith(('.xlsx', '.xls')):
-            await message.answer("Пожалуйста, отправьте файл в формате Excel (.xlsx, .xls)")
+        # Check if file is Excel or CSV
+        file_name = message.document.file_name or ''
+        if not file_name.lower().endswith(SUPPORTED_EXTENSIONS):
+            await message.answer("Пожалуйста, отправьте файл в формате Excel или CSV (.xlsx, .xls, .csv)")
+            metrics.UPLOADS.labels('unsupported').inc()
             return
 
+        started = time.perf_counter()
+        filename = None
+        dispatching = None
         try:
-            # Download the file
+            # Each upload gets its own temporary file: the file is read lazily while the job
+            # is dispatched, so two uploads must never share a path
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            with tempfile.NamedTemporaryFile(
+                prefix="websites_", suffix=os.path.splitext(file_name)[1].lower(), delete=False
+            ) as upload:
+                filename = upload.name
             file = await message.bot.get_file(message.document.file_id)
-            file_path = file.file_path
-            downloaded_file = await message.bot.download_file(file_path)
-            file_content = downloaded_file.read()
-            
-            # Read Excel file
-            # Determine Excel engine based on file extension
-            engine = 'openpyxl' if message.document.file_name.endswith('.xlsx') else 'xlrd'
-            df = pd.read_excel(io.BytesIO(file_content), engine=engine)
-            
-            # Check required columns
-            required_columns = ['title', 'url', 'xpath']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
+            await message.bot.download_file(file.file_path, destination=filename)
+
+            # Rows are read, validated and batched lazily; reading happens in a thread
+            ingest_stats = IngestStats()
+            batches = iter_batches(iter_websites(iter_raw_rows(filename), ingest_stats), CHUNK_SIZE)
+            try:
+                first_batch = await asyncio.to_thread(next, batches, None)
+            except MissingColumnsError as e:
                 await message.answer(
-                    f"Ошибка: В файле отсутствуют обязательные колонки: {', '.join(missing_columns)}\n"
+                    f"Ошибка: В файле отсутствуют обязательные колонки: {', '.join(e.missing)}\n"
                     "Требуемые колонки: title, url, xpath"
                 )
+                metrics.UPLOADS.labels('invalid').inc()
+                return
+            if not first_batch:
+                await message.answer(
+                    "В файле нет строк, пригодных для парсинга.\n" + "\n".join(ingest_stats.errors)
+                )
+                metrics.UPLOADS.labels('invalid').inc()
                 return
 
-            # Save file with timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"websites_{timestamp}.xlsx"
-            df.to_excel(filename, index=False, engine='openpyxl')
-
-            # Prepare response message
-            response = "Содержимое файла:\n\n"
-            for _, row in df.iterrows():
+            # Prepare response message: only the first rows, the file can be huge
+            response = "Первые строки файла:\n\n"
+            for row in first_batch[:PREVIEW_ROWS]:
                 response += f"Название: {row['title']}\n"
                 response += f"URL: {row['url']}\n"
                 response += f"XPath: {row['xpath']}\n"
@@ -94,53 +163,90 @@ def register_handlers(dp: Dispatcher):
                 await message.answer(chunk)
 
             await message.answer(
-                f"Файл успешно обработан и сохранен как {filename}\n"
+                f"Файл {file_name} получен\n"
                 "Начинаю парсинг сайтов..."
             )
 
-            # Send websites data to worker
-            websites_data = df.to_dict('records')
-            task = celery_app.send_task('main.process_websites', args=[websites_data])
-            results = task.get()
-
-            # Send results to user
-            for result in results:
-                if result.get('success', False):
-                    price = result.get('price')
-                    if price:
-                        # Format price with spaces for thousands
-                        try:
-                            price_int = int(price.replace(',', '.').replace(' ', ''))
-                            formatted_price = f"{price_int:,}".replace(',', ' ')
-                            price_text = f"Цена: {formatted_price} ₽"
-                        except ValueError:
-                            price_text = f"Цена: {price} ₽"
-                    else:
-                        price_text = "Цена не найдена"
-                    
-                    await message.answer(
-                        f"✅ {result.get('title', 'Без названия')}\n"
-                        f"{price_text}"
-                    )
-                else:
-                    await message.answer(
-                        f"❌ {result.get('title', 'Без названия')}\n"
-                        f"Ошибка: {result.get('error', 'Неизвестная ошибка')}"
+            # Send websites data to worker chunk by chunk while the rest is still being read;
+            # workers write results and progress of the job to the database
+            job_id = uuid.uuid4().hex
+            last_jobs[message.chat.id] = job_id
+
+            async def dispatch():
+                try:
+                    batch = first_batch
+                    while batch:
+                        await asyncio.to_thread(dispatch_chunk, batch, job_id)
+                        batch = await asyncio.to_thread(next, batches, None)
+                finally:
+                    # Файл нужен только пока строки читаются и отправляются
+                    os.remove(filename)
+                await asyncio.to_thread(send_job_total, job_id, ingest_stats.accepted)
+                metrics.DISPATCH_SECONDS.observe(time.perf_counter() - started)
+                metrics.INGEST_ROWS.labels('accepted').inc(ingest_stats.accepted)
+                metrics.INGEST_ROWS.labels('rejected').inc(ingest_stats.rejected)
+
+            dispatching = asyncio.create_task(dispatch())
+            progress = await message.answer(f"Задание {job_id} запущено. Ход парсинга: /status")
+
+            # Poll only the job counters while workers store results; polling does
+            # not block the bot for other chats
+            job = None
+            try:
+                async for job in iter_job_progress(job_id, dispatching):
+                    if format_job(job) != progress.text:
+                        progress = await progress.edit_text(format_job(job))
+            except JobStalled as e:
+                await message.answer(f"⚠️ {str(e)}. Ход задания можно проверить командой /status")
+            await dispatching
+
+            finished = job is not None and job['status'] == 'finished'
+            if finished and job['total'] <= INLINE_RESULTS_MAX:
+                async for results in iter_job_results(job_id):
+                    for result in results:
+                        await message.answer(format_result(result))
+            elif job is not None:
+                # Одним документом вместо сообщения на каждую строку: лимиты Telegram;
+                # у зависшего задания в файл попадает то, что успели записать
+                # Файл свой у каждого задания, пользователь видит имя с датой
+                fd, export_path = tempfile.mkstemp(prefix=f"results_{job_id}_", suffix=f".{EXPORT_FORMAT}")
+                os.close(fd)
+                try:
+                    await download_export(job_id, export_path)
+                    await message.answer_document(
+                        FSInputFile(export_path, filename=f"results_{timestamp}.{EXPORT_FORMAT}"),
+                        caption=f"Результаты задания {job_id}\nУспешно: {job['done']}, ошибок: {job['failed']}",
                     )
+                finally:
+                    os.remove(export_path)
+            metrics.JOB_SECONDS.observe(time.perf_counter() - started)
+            metrics.UPLOADS.labels('processed').inc()
+
+            summary = f"Обработано строк: {ingest_stats.accepted}, пропущено: {ingest_stats.rejected}"
+            if ingest_stats.errors:
+                summary += "\n" + "\n".join(ingest_stats.errors)
+            await message.answer(summary)
 
             # Получаем обновленную статистику после парсинга
             stats_task = celery_app.send_task('main.get_statistics')
-            stats = stats_task.get(timeout=10)
+            stats = await wait_for_result(stats_task, timeout=10)
             
             if stats:
                 await message.answer(
                     "📊 Обновленная статистика после парсинга:\n\n"
                     f"Всего товаров: {stats.get('total_products', 0)}\n"
                     f"Товаров с ценами: {stats.get('products_with_price', 0)}\n"
-                    f"Средняя цена: {stats.get('average_price', '0.00')} ₽"
+                    f"Средняя цена: {stats.get('average_price', '0.00')} ₽\n"
+                    f"Медианная цена: {stats.get('median_price') or '—'} ₽\n"
+                    f"Мин. / макс. цена: {stats.get('min_price') or '—'} / {stats.get('max_price') or '—'} ₽"
                 )
             
             await message.answer("Парсинг завершен!")
 
         except Exception as e:
-            await message.answer(f"Произошла ошибка при обработке файла: {str(e)}") 
\ No newline at end of file
+            metrics.UPLOADS.labels('error').inc()
+            await message.answer(f"Произошла ошибка при обработке файла: {str(e)}")
+        finally:
+            # Если отправка не началась, файл удаляем здесь; иначе его удалит dispatch()
+            if dispatching is None and filename is not None and os.path.exists(filename):
+                os.remove(filename)
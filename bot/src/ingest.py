@@ -0,0 +1,143 @@
+"""Row-by-row reading of uploaded spreadsheets.
+
+Rows are read lazily (read-only openpyxl for .xlsx, the csv module for .csv),
+validated one at a time and grouped into batches, so a large upload never has
+to be held in memory as a whole.
+"""
+import csv
+import os
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+REQUIRED_COLUMNS = ('title', 'url', 'xpath')
+SUPPORTED_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+# Сколько отклонённых строк перечислять в ответе пользователю
+MAX_REPORTED_ERRORS = int(os.getenv('MAX_REPORTED_ERRORS', 10))
+
+
+class MissingColumnsError(ValueError):
+    """The header row lacks some of the required columns."""
+
+    def __init__(self, missing: List[str]):
+        super().__init__(f"missing columns: {', '.join(missing)}")
+        self.missing = missing
+
+
+@dataclass
+class IngestStats:
+    """Counters of one upload."""
+    accepted: int = 0
+    rejected: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def reject(self, line: int, reason: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"строка {line}: {reason}")
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _xlsx_rows(path: str) -> Iterator[Tuple]:
+    from openpyxl import load_workbook
+
+    # read_only отдаёт строки по мере разбора XML листа, не строя весь лист в памяти
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _xls_rows(path: str) -> Iterator[Tuple]:
+    import xlrd
+
+    # Старый формат ограничен 65 536 строками, on_demand загружает только нужный лист
+    book = xlrd.open_workbook(path, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        for index in range(sheet.nrows):
+            yield tuple(sheet.row_values(index))
+    finally:
+        book.release_resources()
+
+
+def _csv_rows(path: str) -> Iterator[Tuple]:
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        for row in csv.reader(f, dialect):
+            yield tuple(row)
+
+
+def iter_raw_rows(path: str) -> Iterator[Tuple]:
+    """Yield the rows of the first sheet (or of a CSV file) as tuples."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.xlsx':
+        return _xlsx_rows(path)
+    if extension == '.xls':
+        return _xls_rows(path)
+    if extension == '.csv':
+        return _csv_rows(path)
+    raise ValueError(f"Unsupported file type: {extension}")
+
+
+def validate_row(row: Dict[str, str]) -> Optional[str]:
+    """Return the reason a row cannot be crawled, or None if it is fine."""
+    if not row['url']:
+        return 'пустой URL'
+    if not row['url'].startswith(('http://', 'https://')):
+        return f"некорректный URL {row['url'][:100]}"
+    if not row['title']:
+        return 'пустое название'
+    return None
+
+
+def iter_websites(rows: Iterable[Tuple], stats: IngestStats) -> Iterator[Dict[str, str]]:
+    """Map raw rows to title/url/xpath dicts, skipping blank, invalid and repeated ones."""
+    rows = iter(rows)
+    header = [_cell(name).lower() for name in next(rows, ())]
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    if missing:
+        raise MissingColumnsError(missing)
+    positions = {name: header.index(name) for name in REQUIRED_COLUMNS}
+    # Результат задания хранится один раз на пару url + xpath, повтор дал бы лишнюю строку в total
+    seen = set()
+
+    for line, raw in enumerate(rows, start=2):
+        if not any(value not in (None, '') for value in raw):
+            continue
+        row = {
+            name: _cell(raw[index]) if index < len(raw) else ''
+            for name, index in positions.items()
+        }
+        reason = validate_row(row)
+        if not reason and (row['url'], row['xpath']) in seen:
+            reason = 'повтор строки с теми же url и xpath'
+        if reason:
+            stats.reject(line, reason)
+            continue
+        seen.add((row['url'], row['xpath']))
+        stats.accepted += 1
+        yield row
+
+
+def iter_batches(items: Iterable, size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most `size` items."""
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
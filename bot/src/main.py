@@ -5,6 +5,8 @@ from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 import os
 
+import metrics
+from api_client import close_session
 from handlers import register_handlers
 
 load_dotenv()
@@ -25,7 +27,11 @@ dp = Dispatcher()
 register_handlers(dp)
 
 async def main():
-    await dp.start_polling(bot)
+    metrics.start_server()
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await close_session()
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
@@ -0,0 +1,22 @@
+"""Prometheus metrics of file uploads handled by the bot."""
+import os
+
+from prometheus_client import Counter, Histogram, start_http_server
+
+BOT_METRICS_PORT = int(os.getenv('BOT_METRICS_PORT', 9101))
+
+UPLOADS = Counter('bot_uploads_total', 'Uploaded files by outcome', ['outcome'])
+INGEST_ROWS = Counter('bot_ingest_rows_total', 'Rows read from uploaded files', ['status'])
+DISPATCH_SECONDS = Histogram(
+    'bot_dispatch_seconds', 'Time to read an uploaded file and send all of its chunks',
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+JOB_SECONDS = Histogram(
+    'bot_job_seconds', 'Time from upload until the last result was delivered',
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+
+def start_server(port: int = BOT_METRICS_PORT):
+    if port > 0:
+        start_http_server(port)
@@ -0,0 +1,39 @@
+import asyncio
+import os
+from typing import Any, Optional
+
+from celery import Celery
+from celery.result import AsyncResult
+
+# Initialize Celery
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+celery_app = Celery('bot', broker=REDIS_URL, backend=REDIS_URL)
+
+# Размер порции строк, которую обрабатывает одна задача воркера
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 200))
+# Как часто опрашивать result backend, секунды
+RESULT_POLL_INTERVAL = float(os.getenv('RESULT_POLL_INTERVAL', 1.0))
+
+def dispatch_chunk(rows, job_id: Optional[str] = None) -> AsyncResult:
+    """Send one chunk of rows to a worker as soon as it has been read."""
+    kwargs = {'job_id': job_id} if job_id is not None else {}
+    return celery_app.send_task('main.process_websites', args=[rows], kwargs=kwargs)
+
+def send_job_total(job_id: str, total: int) -> AsyncResult:
+    """Tell the workers how many rows the job has once all chunks are sent."""
+    return celery_app.send_task('main.set_job_total', args=[job_id, total])
+
+async def wait_until_ready(task: AsyncResult, timeout: Optional[float] = None):
+    """Poll the result backend without blocking the bot's event loop."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if timeout is not None else None
+    # Запросы к Redis короткие, но синхронные, поэтому уходят в поток
+    while not await asyncio.to_thread(task.ready):
+        if deadline is not None and loop.time() >= deadline:
+            raise asyncio.TimeoutError(f"Task {task.id} is not ready after {timeout}s")
+        await asyncio.sleep(RESULT_POLL_INTERVAL)
+
+async def wait_for_result(task: AsyncResult, timeout: Optional[float] = None) -> Any:
+    """Wait for a task without blocking the event loop and return its result."""
+    await wait_until_ready(task, timeout)
+    return await asyncio.to_thread(task.get)
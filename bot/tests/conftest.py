@@ -0,0 +1,8 @@
+import os
+import sys
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Модули бота импортируются по имени из src/
+sys.path.insert(0, os.path.join(BOT_DIR, 'src'))
+os.environ.setdefault('RESULT_POLL_INTERVAL', '0.01')
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+import api_client
+
+
+def test_progress_stops_when_dispatch_fails(monkeypatch):
+    polls = []
+
+    async def fake_get_job(job_id):
+        polls.append(job_id)
+        return None
+
+    async def dispatch():
+        await asyncio.sleep(0.02)
+        raise ConnectionError('broker is down')
+
+    async def follow():
+        dispatching = asyncio.create_task(dispatch())
+        return [job async for job in api_client.iter_job_progress('job', dispatching)]
+
+    monkeypatch.setattr(api_client, 'get_job', fake_get_job)
+    monkeypatch.setattr(api_client, 'JOB_STALL_TIMEOUT', 60)
+    with pytest.raises(ConnectionError, match='broker is down'):
+        asyncio.run(asyncio.wait_for(follow(), timeout=5))
+    assert polls
+
+
+def test_progress_yields_changes_until_finished(monkeypatch):
+    states = iter([
+        {'done': 0, 'failed': 0, 'status': 'running'},
+        {'done': 0, 'failed': 0, 'status': 'running'},
+        {'done': 2, 'failed': 1, 'status': 'running'},
+        {'done': 3, 'failed': 1, 'status': 'finished'},
+    ])
+
+    async def fake_get_job(job_id):
+        return next(states)
+
+    async def follow():
+        return [job async for job in api_client.iter_job_progress('job')]
+
+    monkeypatch.setattr(api_client, 'get_job', fake_get_job)
+    jobs = asyncio.run(follow())
+    assert [job['done'] + job['failed'] for job in jobs] == [0, 3, 4]
@@ -0,0 +1,76 @@
+import pytest
+
+import ingest
+from ingest import IngestStats, MissingColumnsError
+
+
+def websites(rows):
+    stats = IngestStats()
+    return list(ingest.iter_websites(rows, stats)), stats
+
+
+def test_rows_are_validated_and_repeats_rejected():
+    rows = [
+        ('Title', 'URL', 'XPath'),
+        ('A', 'https://shop.test/a', '//p'),
+        (None, None, None),
+        ('B', 'ftp://shop.test/b', '//p'),
+        ('A again', 'https://shop.test/a', '//p'),
+        ('A span', 'https://shop.test/a', '//span'),
+        ('', 'https://shop.test/c', '//p'),
+        ('Short', 'https://shop.test/d'),
+    ]
+    accepted, stats = websites(rows)
+    assert [(row['url'], row['xpath']) for row in accepted] == [
+        ('https://shop.test/a', '//p'),
+        ('https://shop.test/a', '//span'),
+        ('https://shop.test/d', ''),
+    ]
+    assert (stats.accepted, stats.rejected) == (3, 3)
+    assert stats.errors == [
+        'строка 4: некорректный URL ftp://shop.test/b',
+        'строка 5: повтор строки с теми же url и xpath',
+        'строка 7: пустое название',
+    ]
+
+
+def test_missing_columns():
+    with pytest.raises(MissingColumnsError) as error:
+        websites([('title', 'link')])
+    assert error.value.missing == ['url', 'xpath']
+
+
+def test_reported_errors_are_capped(monkeypatch):
+    monkeypatch.setattr(ingest, 'MAX_REPORTED_ERRORS', 2)
+    rows = [('title', 'url', 'xpath')] + [('x', 'bad', '//p')] * 5
+    accepted, stats = websites(rows)
+    assert accepted == []
+    assert (stats.rejected, len(stats.errors)) == (5, 2)
+
+
+def test_csv_with_semicolons(tmp_path):
+    path = tmp_path / 'sites.csv'
+    path.write_text('\ufefftitle;url;xpath\nЧайник;https://shop.test/1;//b\n', encoding='utf-8')
+    accepted, _ = websites(ingest.iter_raw_rows(str(path)))
+    assert accepted == [{'title': 'Чайник', 'url': 'https://shop.test/1', 'xpath': '//b'}]
+
+
+def test_xlsx_numbers_are_read_as_text(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    path = tmp_path / 'sites.xlsx'
+    workbook = openpyxl.Workbook()
+    workbook.active.append(['title', 'url', 'xpath'])
+    workbook.active.append([42.0, 'https://shop.test/42', '//i'])
+    workbook.save(path)
+    accepted, _ = websites(ingest.iter_raw_rows(str(path)))
+    assert accepted == [{'title': '42', 'url': 'https://shop.test/42', 'xpath': '//i'}]
+
+
+def test_unsupported_extension():
+    with pytest.raises(ValueError):
+        ingest.iter_raw_rows('sites.txt')
+
+
+def test_batches():
+    assert list(ingest.iter_batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(ingest.iter_batches([], 2)) == []
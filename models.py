@@ -1,19 +1,124 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, ForeignKey, Index, Integer, Numeric, String
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
 Base = declarative_base()
 
+
+def upsert_insert(table, dialect_name: str):
+    """INSERT into table with the ON CONFLICT clauses of the session's database."""
+    insert = postgresql.insert if dialect_name == 'postgresql' else sqlite.insert
+    return insert(table)
+
+
+# Единая схема для воркера и API: один товар на пару url + xpath
 class Website(Base):
     __tablename__ = 'websites'
+    __table_args__ = (
+        Index('uq_websites_url_xpath', 'url', 'xpath', unique=True),
+    )
 
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
-    url = Column(String, nullable=False)
-    xpath = Column(String, nullable=False)
-    price = Column(Float, nullable=True)
+    url = Column(String, nullable=False, index=True)
+    xpath = Column(String, nullable=False, default='')
+    description = Column(String)
+    keywords = Column(String)
+    status = Column(String)
+    price = Column(Numeric(14, 2), nullable=True, index=True)  # Цена числом, разобрана при извлечении
+    price_raw = Column(String, nullable=True)  # Цена в том виде, в каком найдена на странице
+    currency = Column(String(3), nullable=True)
     last_checked = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     def __repr__(self):
-        return f"<Website(title='{self.title}', url='{self.url}', price={self.price})>" 
\ No newline at end of file
+        return f"<Website(title='{self.title}', url='{self.url}', price={self.price})>"
+
+
+# История цен: одно наблюдение на товар за каждую проверку
+class PriceObservation(Base):
+    __tablename__ = 'price_observations'
+    __table_args__ = (
+        Index('ix_price_observations_product_observed', 'product_id', 'observed_at'),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True)
+    product_id = Column(Integer, ForeignKey('websites.id', ondelete='CASCADE'), nullable=False)
+    observed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    price = Column(Numeric(14, 2), nullable=True)
+    currency = Column(String(3), nullable=True)
+    status = Column(String)
+
+    def __repr__(self):
+        return f"<PriceObservation(product_id={self.product_id}, observed_at={self.observed_at}, price={self.price})>"
+
+
+# Валидаторы последней загрузки страницы для условных GET-запросов
+class PageValidator(Base):
+    __tablename__ = 'page_validators'
+
+    url = Column(String, primary_key=True)
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    content_hash = Column(String(64), nullable=True)  # sha256 тела ответа
+    checked_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<PageValidator(url='{self.url}', etag={self.etag})>"
+
+
+# Очередь повторных проверок: когда и как часто перепроверять товар
+class CrawlSchedule(Base):
+    __tablename__ = 'crawl_schedule'
+
+    product_id = Column(Integer, ForeignKey('websites.id', ondelete='CASCADE'), primary_key=True)
+    next_check_at = Column(DateTime, nullable=False, index=True)
+    interval_seconds = Column(Integer, nullable=False)
+    unchanged_checks = Column(Integer, nullable=False, default=0)
+    last_price = Column(Numeric(14, 2), nullable=True)
+
+    def __repr__(self):
+        return f"<CrawlSchedule(product_id={self.product_id}, next_check_at={self.next_check_at})>"
+
+
+# Задание на парсинг: счётчики обновляются воркерами после каждой записи
+class CrawlJob(Base):
+    __tablename__ = 'crawl_jobs'
+
+    id = Column(String(32), primary_key=True)  # uuid4().hex, выдаётся при отправке
+    status = Column(String, nullable=False, default='running')
+    total = Column(Integer, nullable=True)  # Неизвестно, пока строки ещё отправляются
+    done = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<CrawlJob(id='{self.id}', done={self.done}, failed={self.failed}, total={self.total})>"
+
+
+# Результат одной строки задания; читается постранично по id.
+# Повторно доставленная задача не добавляет вторую строку для той же пары url + xpath
+class CrawlResult(Base):
+    __tablename__ = 'crawl_results'
+    __table_args__ = (
+        Index('ix_crawl_results_job_id_id', 'job_id', 'id'),
+        Index('uq_crawl_results_job_url_xpath', 'job_id', 'url', 'xpath', unique=True),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True)
+    job_id = Column(String(32), ForeignKey('crawl_jobs.id', ondelete='CASCADE'), nullable=False)
+    url = Column(String, nullable=False)
+    xpath = Column(String, nullable=False, default='')
+    title = Column(String)
+    success = Column(Boolean, nullable=False)
+    price = Column(Numeric(14, 2), nullable=True)
+    price_raw = Column(String, nullable=True)
+    currency = Column(String(3), nullable=True)
+    error = Column(String, nullable=True)
+    checked_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<CrawlResult(job_id='{self.job_id}', url='{self.url}', success={self.success})>"
@@ -0,0 +1,60 @@
+"""Price statistics statements shared by the worker and the API.
+
+Both services cache the result under the same "statistics" key, so the
+figures and their formatting are built here once. The statements run
+unchanged on a sync Session and on an AsyncSession.
+"""
+from typing import Dict, Optional, Sequence
+
+from sqlalchemy import func, select
+
+from models import Website
+
+PRICED = (Website.status == 'success', Website.price.isnot(None))
+
+
+def total_statement():
+    return select(func.count(Website.id))
+
+
+def summary_statement():
+    """Count, average, min and max of the current prices."""
+    return select(
+        func.count(Website.id),
+        func.avg(Website.price),
+        func.min(Website.price),
+        func.max(Website.price),
+    ).where(*PRICED)
+
+
+def median_statement(dialect_name: str, count: int):
+    """Values whose mean is the median price of `count` priced products."""
+    if dialect_name == 'postgresql':
+        return select(func.percentile_cont(0.5).within_group(Website.price)).where(*PRICED)
+    # Без percentile_cont берём середину упорядоченного индекса
+    return (
+        select(Website.price).where(*PRICED).order_by(Website.price)
+        .offset((count - 1) // 2).limit(2 - count % 2)
+    )
+
+
+def median_of(values: Sequence) -> Optional[float]:
+    values = [value for value in values if value is not None]
+    return sum(values) / len(values) if values else None
+
+
+def format_price(value) -> Optional[str]:
+    return f"{float(value):,.2f}" if value is not None else None
+
+
+def build_statistics(total_products: int, summary, median) -> Dict:
+    """Statistics in the shape the bot and the API report."""
+    products_with_price, avg_price, min_price, max_price = summary
+    return {
+        'total_products': total_products,
+        'products_with_price': products_with_price,
+        'average_price': format_price(avg_price),
+        'min_price': format_price(min_price),
+        'max_price': format_price(max_price),
+        'median_price': format_price(median),
+    }
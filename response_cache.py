@@ -0,0 +1,297 @@
+"""Read cache shared by the worker and the API.
+
+Two tiers: an in-process TTL/LRU dictionary answers repeated reads without any
+I/O, and an optional Redis hash shares computed values between processes.
+Writers call invalidate() after committing with the keys their write made
+stale, which drops them from the local tier and the Redis hash, so every
+process recomputes them on its next miss. Each invalidation also bumps a
+generation counter, and a value computed across an invalidation is not
+stored. Other processes may serve a local entry for up to CACHE_LOCAL_TTL
+seconds after an invalidation.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL = float(os.getenv('CACHE_TTL', 300))
+CACHE_LOCAL_TTL = float(os.getenv('CACHE_LOCAL_TTL', 5))
+CACHE_MAXSIZE = int(os.getenv('CACHE_MAXSIZE', 1024))
+# Пустое значение отключает общий уровень в Redis
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', '')
+# Сколько секунд не обращаться к Redis после ошибки соединения
+REDIS_RETRY_AFTER = 30.0
+
+MISSING = object()
+
+STATISTICS_KEY = 'statistics'
+
+
+def product_key(product_id: int) -> str:
+    return f'product:{product_id}'
+
+
+def price_key(product_id: int) -> str:
+    return f'product:{product_id}:price'
+
+
+def product_keys(product_ids: Iterable[int]) -> List[str]:
+    """Every cached read a write to these products makes stale, statistics included."""
+    keys = [STATISTICS_KEY]
+    for product_id in product_ids:
+        keys += [product_key(product_id), price_key(product_id)]
+    return keys
+
+
+class LazyRedis:
+    """Redis client created on first use that is left alone for REDIS_RETRY_AFTER seconds after an error.
+
+    An empty URL or a missing redis package switches the tier off for good.
+    With use_asyncio the client is redis.asyncio and acall() is used instead of call().
+    """
+
+    def __init__(self, url: str, name: str, use_asyncio: bool = False):
+        self.url = url
+        self.name = name
+        self.use_asyncio = use_asyncio
+        self._redis = None
+        self._down_until = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    def client(self):
+        """The client, or None while the tier is off or backing off after an error."""
+        if not self.url or time.monotonic() < self._down_until:
+            return None
+        if self._redis is None:
+            try:
+                if self.use_asyncio:
+                    import redis.asyncio as redis
+                else:
+                    import redis
+            except ImportError:
+                logger.warning(f"redis is not installed, {self.name} is disabled")
+                self.url = ''
+                return None
+            self._redis = redis.Redis.from_url(self.url, socket_timeout=1, socket_connect_timeout=1)
+        return self._redis
+
+    def mark_down(self, error: Exception):
+        logger.warning(f"{self.name} unavailable: {str(error)}")
+        self._down_until = time.monotonic() + REDIS_RETRY_AFTER
+
+    def call(self, method: str, *args, **kwargs) -> Any:
+        client = self.client()
+        if client is None:
+            return None
+        try:
+            return getattr(client, method)(*args, **kwargs)
+        except Exception as e:
+            self.mark_down(e)
+            return None
+
+    async def acall(self, method: str, *args, **kwargs) -> Any:
+        client = self.client()
+        if client is None:
+            return None
+        try:
+            return await getattr(client, method)(*args, **kwargs)
+        except Exception as e:
+            self.mark_down(e)
+            return None
+
+
+class TTLCache:
+    """Thread-safe LRU dictionary whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = CACHE_MAXSIZE, ttl: float = CACHE_LOCAL_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ResponseCache:
+    """Local TTL/LRU tier in front of an optional Redis tier, with hit counters.
+
+    Values must be JSON-serialisable when Redis is enabled.
+    """
+
+    def __init__(self, redis_url: str = CACHE_REDIS_URL, ttl: float = CACHE_TTL,
+                 local_ttl: float = CACHE_LOCAL_TTL, maxsize: int = CACHE_MAXSIZE,
+                 namespace: str = 'response_cache'):
+        self.local = TTLCache(maxsize, min(local_ttl, ttl))
+        self.ttl = ttl
+        self.redis = LazyRedis(redis_url, 'Cache Redis tier')
+        self.namespace = namespace
+        self.generation_key = f'{namespace}:generation'
+        # Растёт при каждой инвалидации в этом процессе
+        self.generation = 0
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _get_shared(self, key: str) -> Any:
+        raw = self.redis.call('hget', self.namespace, key)
+        if raw is None:
+            return MISSING
+        entry = json.loads(raw)
+        if entry['expires_at'] <= time.time():
+            return MISSING
+        return entry['value']
+
+    def _set_shared(self, key: str, value: Any, generation: Any = MISSING):
+        """Store a value in Redis; with a generation, only if no invalidation happened since."""
+        if not self.redis.enabled:
+            return
+        entry = json.dumps({'expires_at': time.time() + self.ttl, 'value': value})
+
+        def store(pipe):
+            # WATCH на счётчике: инвалидация между проверкой и записью отменит транзакцию
+            if generation is not MISSING and pipe.get(self.generation_key) != generation:
+                return
+            pipe.multi()
+            pipe.hset(self.namespace, key, entry)
+            pipe.expire(self.namespace, int(self.ttl) + 1)
+
+        self.redis.call('transaction', store, self.generation_key)
+
+    def _shared_generation(self) -> Any:
+        return self.redis.call('get', self.generation_key) if self.redis.enabled else None
+
+    def _lookup_local(self, key: str) -> Any:
+        value = self.local.get(key)
+        if value is not MISSING:
+            self.local_hits += 1
+        return value
+
+    def _lookup_shared(self, key: str) -> Any:
+        value = self._get_shared(key)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.redis_hits += 1
+            self.local.set(key, value)
+        return value
+
+    def get(self, key: str) -> Any:
+        """Cached value for key, or MISSING."""
+        value = self._lookup_local(key)
+        if value is MISSING:
+            value = self._lookup_shared(key)
+        return value
+
+    def set(self, key: str, value: Any):
+        self.local.set(key, value)
+        self._set_shared(key, value)
+
+    def get_or_set(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Cached value, or compute() stored unless the key was invalidated meanwhile."""
+        value = self._lookup_local(key)
+        if value is not MISSING:
+            return value
+        generation, shared_generation = self.generation, self._shared_generation()
+        value = self._lookup_shared(key)
+        if value is MISSING:
+            value = compute()
+            if self.generation == generation:
+                self.local.set(key, value)
+                self._set_shared(key, value, shared_generation)
+        return value
+
+    async def aget_or_set(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant: the Redis client is synchronous, so its calls go to a thread."""
+        value = self._lookup_local(key)
+        if value is not MISSING:
+            return value
+        generation, shared_generation = self.generation, None
+        if self.redis.enabled:
+            shared_generation, value = await asyncio.to_thread(
+                lambda: (self._shared_generation(), self._lookup_shared(key))
+            )
+        else:
+            value = self._lookup_shared(key)
+        if value is MISSING:
+            value = await compute()
+            if self.generation == generation:
+                self.local.set(key, value)
+                if self.redis.enabled:
+                    await asyncio.to_thread(self._set_shared, key, value, shared_generation)
+        return value
+
+    def invalidate(self, keys: Optional[Iterable[str]] = None):
+        """Drop the given keys, or every cached value; call after committing new data."""
+        self.invalidations += 1
+        self.generation += 1
+        if keys is None:
+            self.local.clear()
+            self.redis.call('delete', self.namespace)
+        else:
+            keys = list(keys)
+            for key in keys:
+                self.local.delete(key)
+            if keys:
+                self.redis.call('hdel', self.namespace, *keys)
+        self.redis.call('incr', self.generation_key)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.local_hits + self.redis_hits
+        total = hits + self.misses
+        return {
+            'local_hits': self.local_hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'local_entries': len(self.local),
+            'hit_ratio': round(hits / total, 3) if total else 0.0,
+        }
+
+
+_default: Optional[ResponseCache] = None
+
+
+def get_cache() -> ResponseCache:
+    """Process-wide cache configured from the CACHE_* environment variables."""
+    global _default
+    if _default is None:
+        _default = ResponseCache()
+    return _default
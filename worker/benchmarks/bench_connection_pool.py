@@ -0,0 +1,79 @@
+"""Latency of repeated tasks hitting the same host: session per task vs shared pool.
+
+Usage:
+    python benchmarks/bench_connection_pool.py [--tasks N] [--requests-per-task M]
+
+Each "task" fetches M pages from the local fixture server, addressed by the
+hostname 'localhost' so name resolution is part of the measurement.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import http_client  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+
+async def fetch_task(session: aiohttp.ClientSession, urls):
+    started = time.perf_counter()
+    for url in urls:
+        async with session.get(url) as response:
+            await response.read()
+    return time.perf_counter() - started
+
+
+async def per_task_sessions(urls, tasks):
+    timings = []
+    for _ in range(tasks):
+        started = time.perf_counter()
+        async with aiohttp.ClientSession() as session:
+            await fetch_task(session, urls)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def shared_session(urls, tasks):
+    session = http_client.create_session()
+    try:
+        return [await fetch_task(session, urls) for _ in range(tasks)]
+    finally:
+        await session.close()
+
+
+def report(label, timings):
+    ordered = sorted(timings)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{label:>18}: mean {statistics.mean(timings) * 1000:7.2f} ms/task, "
+          f"p50 {statistics.median(timings) * 1000:7.2f} ms, p99 {p99 * 1000:7.2f} ms")
+
+
+async def run(args):
+    server = FixtureServer(page_size=args.page_size)
+    await server.start(host='127.0.0.1')
+    base_url = f'http://localhost:{server.port}'
+    urls = server.urls(base_url, args.requests_per_task)
+    try:
+        report('session per task', await per_task_sessions(urls, args.tasks))
+        report('shared pool', await shared_session(urls, args.tasks))
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=200)
+    parser.add_argument('--requests-per-task', type=int, default=5)
+    parser.add_argument('--page-size', type=int, default=20 * 1024)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+"""End-to-end crawl benchmark: fetch → extract → persist against local stand-ins.
+
+Usage:
+    python benchmarks/bench_crawl.py [--rows N] [--hosts H] [--page-sizes BYTES ...]
+                                     [--pages-dir DIR --xpath XPATH]
+                                     [--latency SEC] [--jitter SEC] [--error-rate R] [--js-every K]
+                                     [--passes P] [--database-url URL]
+                                     [--save-baseline FILE] [--baseline FILE]
+                                     [--tolerance T] [--p99-tolerance T]
+
+Runs process_websites on N rows spread over H local hosts (127.0.0.1 … 127.0.0.H,
+Linux loopback), served by the fixture server from its own thread. The first
+pass is a cold crawl; later passes see unchanged pages. Each pass reports
+pages/s and p50/p99 of every stage recorded in worker metrics (quantiles are
+interpolated from the histogram buckets, like histogram_quantile does); the
+run ends with the peak RSS of the worker and its parse processes.
+
+With --js-every K every K-th page sets its price from a script and the
+fixture hosts are opted in to rendering (needs the worker's "render" extra
+and `playwright install chromium`); each pass then also reports how many
+rows went to the browser, how often that found the price, and render latency.
+
+--save-baseline stores the report as JSON; --baseline compares against one
+and exits with status 1 if any figure is worse by more than --tolerance
+(--p99-tolerance for tail latencies, which are only checked for stages with
+at least MIN_P99_SAMPLES observations).
+Defaults to a temporary SQLite file; a PostgreSQL URL should point to a
+scratch database, its tables are dropped and recreated.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # общий models.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fixture_server import FIXTURE_XPATH, FixtureServer, load_recorded_pages  # noqa: E402
+
+# Histogram name in worker metrics, label that splits it into stages, stage prefix
+STAGE_HISTOGRAMS = (
+    ('FETCH_PHASE_SECONDS', 'phase', 'fetch'),
+    ('PARSE_SECONDS', None, 'parse'),
+    ('EXTRACT_SECONDS', 'strategy', 'extract'),
+    ('DB_WRITE_SECONDS', 'step', 'db'),
+    ('RENDER_SECONDS', None, 'render'),
+)
+# На меньшей выборке p99 — это просто самое медленное наблюдение
+MIN_P99_SAMPLES = 100
+
+
+class ServerThread:
+    """Fixture server on its own event loop, so serving pages does not share the crawler's loop."""
+
+    def __init__(self, server: FixtureServer):
+        self.server = server
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def start(self, hosts: int) -> List[str]:
+        self._thread.start()
+        base_urls = [self._call(self.server.start('127.0.0.1'))]
+        for n in range(2, hosts + 1):
+            base_urls.append(self._call(self.server.add_host(f'127.0.0.{n}')))
+        return base_urls
+
+    def stop(self):
+        self._call(self.server.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+def histogram_buckets(histogram, group_label: Optional[str]) -> Dict[str, Dict[float, float]]:
+    """Cumulative bucket counts of a histogram per stage, summed over the other labels."""
+    stages: Dict[str, Dict[float, float]] = {}
+    for family in histogram.collect():
+        for sample in family.samples:
+            if not sample.name.endswith('_bucket'):
+                continue
+            stage = sample.labels.get(group_label, '') if group_label else ''
+            le = float(sample.labels['le'])
+            buckets = stages.setdefault(stage, {})
+            buckets[le] = buckets.get(le, 0.0) + sample.value
+    return stages
+
+
+def snapshot(metrics) -> Dict[str, Dict[float, float]]:
+    result = {}
+    for attribute, group_label, prefix in STAGE_HISTOGRAMS:
+        for stage, buckets in histogram_buckets(getattr(metrics, attribute), group_label).items():
+            result[f'{prefix}.{stage}' if stage else prefix] = buckets
+    return result
+
+
+def quantile(q: float, buckets: List[Tuple[float, float]]) -> float:
+    """Linear interpolation inside the bucket holding the q-th observation."""
+    total = buckets[-1][1]
+    rank = q * total
+    lower, below = 0.0, 0.0
+    for upper, count in buckets:
+        if count >= rank:
+            if upper == float('inf'):
+                return lower
+            if count == below:
+                return upper
+            return lower + (upper - lower) * (rank - below) / (count - below)
+        lower, below = upper, count
+    return lower
+
+
+def stage_report(before, after) -> Dict[str, Dict[str, float]]:
+    report = {}
+    for stage, buckets in sorted(after.items()):
+        previous = before.get(stage, {})
+        delta = sorted((le, count - previous.get(le, 0.0)) for le, count in buckets.items())
+        if not delta or delta[-1][1] <= 0:
+            continue
+        report[stage] = {
+            'count': int(delta[-1][1]),
+            'p50_ms': round(quantile(0.5, delta) * 1000, 3),
+            'p99_ms': round(quantile(0.99, delta) * 1000, 3),
+        }
+    return report
+
+
+def counter_values(counter, label: str) -> Dict[str, float]:
+    values = {}
+    for family in counter.collect():
+        for sample in family.samples:
+            if sample.name.endswith('_total'):
+                values[sample.labels[label]] = sample.value
+    return values
+
+
+def render_report(before: Dict[str, float], after: Dict[str, float], rows: int) -> Dict[str, float]:
+    outcomes = {outcome: after.get(outcome, 0) - before.get(outcome, 0)
+                for outcome in ('found', 'not_found', 'error')}
+    rendered = sum(outcomes.values())
+    return {
+        'rendered': int(rendered),
+        'hit_rate': round(outcomes['found'] / rendered, 3) if rendered else 0.0,
+        'share': round(rendered / rows, 3) if rows else 0.0,
+        'errors': int(outcomes['error']),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss в килобайтах на Linux; для дочерних — максимум по процессам пула
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round((own + children) / 1024, 1)
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float, p99_tolerance: float) -> List[str]:
+    """Print current figures next to the baseline; return the regressions."""
+    regressions = []
+
+    def check(label: str, current: float, previous: float, higher_is_better: bool = False,
+              limit: Optional[float] = tolerance):
+        if not previous:
+            return
+        change = (current - previous) / previous
+        worse = -change if higher_is_better else change
+        flag = '  REGRESSION' if limit is not None and worse > limit else ''
+        print(f"  {label:<34} {previous:12.3f} → {current:12.3f}  ({change:+7.1%}){flag}")
+        if flag:
+            regressions.append(label)
+
+    if report['config'] != baseline.get('config'):
+        print("  warning: the baseline was recorded with a different configuration")
+    for name, current in report['passes'].items():
+        previous = baseline.get('passes', {}).get(name)
+        if previous is None:
+            continue
+        check(f'{name} pages/s', current['pages_per_second'], previous['pages_per_second'],
+              higher_is_better=True)
+        for stage, figures in current['stages'].items():
+            old = previous['stages'].get(stage)
+            if old is not None:
+                check(f'{name} {stage} p50 ms', figures['p50_ms'], old['p50_ms'])
+                enough = min(figures['count'], old['count']) >= MIN_P99_SAMPLES
+                check(f'{name} {stage} p99 ms', figures['p99_ms'], old['p99_ms'],
+                      limit=p99_tolerance if enough else None)
+    check('peak RSS MB', report['peak_rss_mb'], baseline.get('peak_rss_mb', 0))
+    return regressions
+
+
+def build_rows(base_urls: List[str], rows: int, xpath: str) -> List[Dict]:
+    # Строки раскладываются по хостам по кругу, номер страницы у каждой свой
+    return [
+        {'url': f'{base_urls[n % len(base_urls)]}/page/{n}', 'title': f'Товар {n}', 'xpath': xpath}
+        for n in range(rows)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--hosts', type=int, default=8)
+    parser.add_argument('--page-sizes', type=int, nargs='+', default=[20 * 1024, 100 * 1024, 400 * 1024])
+    parser.add_argument('--pages-dir', help='serve recorded *.html pages instead of synthetic ones')
+    parser.add_argument('--xpath', default=FIXTURE_XPATH, help='price XPath of the served pages')
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--jitter', type=float, default=0.03)
+    parser.add_argument('--error-rate', type=float, default=0.01)
+    parser.add_argument('--js-every', type=int, default=0,
+                        help='every K-th page gets its price from JavaScript')
+    parser.add_argument('--passes', type=int, default=2)
+    parser.add_argument('--database-url',
+                        default=f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench_crawl.db'}")
+    parser.add_argument('--save-baseline', type=Path)
+    parser.add_argument('--baseline', type=Path)
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    parser.add_argument('--p99-tolerance', type=float, default=0.5)
+    args = parser.parse_args()
+
+    # main читает настройки при импорте; ограничение частоты запросов к хосту здесь только мешает
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('CRAWL_PER_HOST_RPS', '0')
+    os.environ.setdefault('WORKER_METRICS_PORT', '0')
+    if args.js_every:
+        os.environ.setdefault('RENDER_DOMAINS', ','.join(f'127.0.0.{n}' for n in range(1, args.hosts + 1)))
+    import http_client  # noqa: E402
+    import main as worker  # noqa: E402
+    import metrics  # noqa: E402
+    import render  # noqa: E402
+    from models import Base  # noqa: E402
+
+    Base.metadata.drop_all(worker.engine)
+    Base.metadata.create_all(worker.engine)
+
+    pages = load_recorded_pages(args.pages_dir) if args.pages_dir else None
+    server = FixtureServer(page_size=args.page_sizes, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate, pages=pages, js_every=args.js_every)
+    server_thread = ServerThread(server)
+    rows = build_rows(server_thread.start(args.hosts), args.rows, args.xpath)
+
+    config = {
+        'rows': args.rows, 'hosts': args.hosts, 'page_sizes': args.page_sizes,
+        'pages_dir': args.pages_dir, 'latency': args.latency, 'jitter': args.jitter,
+        'error_rate': args.error_rate, 'js_every': args.js_every, 'database': worker.engine.dialect.name,
+        'parse_executor': worker.PARSE_EXECUTOR, 'parse_workers': worker.PARSE_WORKERS,
+        'max_concurrency': worker.CRAWL_MAX_CONCURRENCY,
+        'per_host_concurrency': worker.CRAWL_PER_HOST_CONCURRENCY,
+    }
+    print(f"Database: {worker.engine.url.render_as_string(hide_password=True)}")
+    print(f"Config: {json.dumps(config, ensure_ascii=False)}")
+
+    report = {'config': config, 'passes': {}}
+    try:
+        for number in range(args.passes):
+            name = 'cold' if number == 0 else f'warm{number}'
+            before = snapshot(metrics)
+            renders_before = counter_values(metrics.RENDER_RESULTS, 'outcome')
+            started = time.perf_counter()
+            summaries = worker.process_websites(rows)
+            elapsed = time.perf_counter() - started
+            failed = sum(1 for summary in summaries if not summary.get('success'))
+            stages = stage_report(before, snapshot(metrics))
+            report['passes'][name] = {
+                'seconds': round(elapsed, 3),
+                'pages_per_second': round(len(rows) / elapsed, 1),
+                'failed': failed,
+                'stages': stages,
+            }
+            print(f"\n{name}: {len(rows)} rows in {elapsed:.2f}s, "
+                  f"{len(rows) / elapsed:.1f} pages/s, {failed} failed")
+            if args.js_every:
+                rendering = render_report(renders_before, counter_values(metrics.RENDER_RESULTS, 'outcome'),
+                                          len(rows))
+                report['passes'][name]['render'] = rendering
+                print(f"  rendered {rendering['rendered']} rows ({rendering['share']:.1%} of rows), "
+                      f"price found in {rendering['hit_rate']:.1%}, {rendering['errors']} errors")
+            for stage, figures in stages.items():
+                print(f"  {stage:<22} n={figures['count']:>6}  p50 {figures['p50_ms']:9.2f} ms  "
+                      f"p99 {figures['p99_ms']:9.2f} ms")
+    finally:
+        server_thread.stop()
+        if render.is_running():
+            http_client.run(render.close_pool())
+        http_client.run(http_client.close_session())
+    report['peak_rss_mb'] = peak_rss_mb()
+    print(f"\nServed {server.requests} requests, {server.errors} injected errors, "
+          f"{server.bytes_sent / 1024 / 1024:.1f} MB; peak RSS {report['peak_rss_mb']} MB")
+
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.baseline:
+        print(f"\nCompared with {args.baseline} (tolerance {args.tolerance:.0%}, "
+              f"p99 {args.p99_tolerance:.0%}):")
+        regressions = compare(report, json.loads(args.baseline.read_text()), args.tolerance,
+                              args.p99_tolerance)
+        if regressions:
+            print(f"{len(regressions)} figure(s) regressed")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
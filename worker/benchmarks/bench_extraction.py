@@ -0,0 +1,81 @@
+"""Compare the single-parse lxml extractor with the old BeautifulSoup extractors.
+
+Usage:
+    python benchmarks/bench_extraction.py [--fixtures DIR] [--repeat N]
+
+DIR should contain saved product pages (*.html). Without it, synthetic pages of
+1, 2 and 3 MB are generated. For each implementation the script reports CPU time
+per page and the peak RSS of a fresh child process that parsed the whole corpus.
+"""
+import argparse
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fixture_server import FIXTURE_XPATH, synthetic_page  # noqa: E402
+
+IMPLEMENTATIONS = {
+    'legacy (bs4 x4)': 'legacy_extract',
+    'single-parse lxml': 'extraction',
+}
+
+DEFAULT_XPATH = FIXTURE_XPATH
+
+
+def load_corpus(fixtures_dir):
+    if fixtures_dir:
+        pages = [p.read_text(encoding='utf-8', errors='replace')
+                 for p in sorted(Path(fixtures_dir).glob('*.html'))]
+        if not pages:
+            raise SystemExit(f"No *.html fixtures found in {fixtures_dir}")
+        return pages
+    return [synthetic_page(mb * 1024 * 1024) for mb in (1, 2, 3)]
+
+
+def run_impl(module_name, pages, xpath, repeat, queue):
+    module = __import__(module_name)
+    timings = []
+    for _ in range(repeat):
+        for html in pages:
+            started = time.process_time()
+            module.extract_page(html, xpath)
+            timings.append(time.process_time() - started)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((timings, peak_kb))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures', help='directory with saved *.html pages')
+    parser.add_argument('--xpath', default=DEFAULT_XPATH)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.fixtures)
+    total_mb = sum(len(p) for p in pages) / 1024 / 1024
+    print(f"Corpus: {len(pages)} pages, {total_mb:.1f} MB, repeat={args.repeat}")
+
+    ctx = multiprocessing.get_context('spawn')
+    for label, module_name in IMPLEMENTATIONS.items():
+        # Каждая реализация в отдельном процессе, чтобы пик памяти не смешивался
+        queue = ctx.Queue()
+        proc = ctx.Process(target=run_impl,
+                           args=(module_name, pages, args.xpath, args.repeat, queue))
+        proc.start()
+        timings, peak_kb = queue.get()
+        proc.join()
+        print(
+            f"{label:>20}: mean {statistics.mean(timings) * 1000:8.1f} ms/page, "
+            f"median {statistics.median(timings) * 1000:8.1f} ms/page, "
+            f"peak RSS {peak_kb / 1024:7.1f} MB"
+        )
+
+
+if __name__ == '__main__':
+    main()
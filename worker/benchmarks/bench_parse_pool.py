@@ -0,0 +1,66 @@
+"""Crawl throughput with 1, 2, 4 and 8 parse workers against a local HTTP stand-in.
+
+Usage:
+    python benchmarks/bench_parse_pool.py [--pages N] [--page-size BYTES]
+                                          [--latency SEC] [--executor process|thread]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # общий models.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# main создаёт таблицы при импорте, поэтому подставляем локальную SQLite
+os.environ.setdefault(
+    'DATABASE_URL', f"sqlite:///{Path(tempfile.gettempdir()) / 'bench_worker.db'}"
+)
+
+import http_client  # noqa: E402
+import main  # noqa: E402
+from fixture_server import FIXTURE_XPATH, FixtureServer  # noqa: E402
+from scheduler import CrawlScheduler  # noqa: E402
+
+
+def unlimited_scheduler() -> CrawlScheduler:
+    # Все страницы отдаёт один локальный хост, лимиты на хост здесь не нужны
+    return CrawlScheduler(max_concurrency=100, per_host_concurrency=100, per_host_rps=0)
+
+
+async def run(args):
+    server = FixtureServer(page_size=args.page_size, latency=args.latency)
+    base_url = await server.start()
+    rows = [{'url': url, 'title': f'item {n}', 'xpath': FIXTURE_XPATH}
+            for n, url in enumerate(server.urls(base_url, args.pages))]
+    try:
+        for workers in (1, 2, 4, 8):
+            main.configure_parse_executor(args.executor, workers)
+            # Прогрев: запуск процессов пула не входит в замер
+            await main.fetch_all(rows[:workers], unlimited_scheduler())
+            started = time.perf_counter()
+            results = await main.fetch_all(rows, unlimited_scheduler())
+            elapsed = time.perf_counter() - started
+            ok = sum(1 for r in results if r['success'] and r['price'])
+            print(f"{workers} parse workers: {len(rows) / elapsed:8.1f} pages/s "
+                  f"({elapsed:.2f}s, {ok}/{len(rows)} prices)")
+    finally:
+        await http_client.close_session()
+        await server.stop()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--page-size', type=int, default=1024 * 1024)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--executor', choices=('process', 'thread'), default='process')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,100 @@
+"""Statistics latency as the websites table grows: Python scan, SQL aggregates, cache hit.
+
+Usage:
+    python benchmarks/bench_statistics.py [--database-url URL] [--sizes 10000 100000 1000000]
+                                          [--legacy-max N]
+
+The table is dropped and refilled for every size.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # общий models.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models import Base, Website  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+from storage import collect_statistics  # noqa: E402
+
+
+def legacy_statistics(db):
+    """Previous get_statistics: load every row and parse prices in Python."""
+    prices = []
+    all_websites = db.query(Website).all()
+    for site in all_websites:
+        if site.status == 'success' and site.price_raw:
+            price_str = site.price_raw.replace(' ', '').replace(',', '.')
+            price_str = ''.join(c for c in price_str if c.isdigit() or c == '.')
+            if price_str:
+                prices.append(float(price_str))
+    avg = sum(prices) / len(prices) if prices else None
+    return {'total_products': len(all_websites), 'products_with_price': len(prices),
+            'average_price': f"{avg:,.2f}" if avg is not None else None}
+
+
+def fill(engine, size, batch=10000):
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    rng = random.Random(size)
+    with engine.begin() as conn:
+        for start in range(0, size, batch):
+            rows = []
+            for n in range(start, min(size, start + batch)):
+                value = rng.randint(100, 200000)
+                rows.append({
+                    'url': f'https://shop{n % 50}.example/product/{n}',
+                    'xpath': '//*[@id="price"]', 'title': f'Товар {n}',
+                    'status': 'success' if n % 10 else 'error: HTTP 404',
+                    'price_raw': f'{value:,} ₽'.replace(',', ' '), 'price': value,
+                })
+            conn.execute(insert(Website), rows)
+
+
+def timed(Session, func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        db = Session()
+        try:
+            started = time.perf_counter()
+            func(db)
+            elapsed = time.perf_counter() - started
+        finally:
+            db.close()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url',
+                        default=f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench_stats.db'}")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--legacy-max', type=int, default=100000,
+                        help='skip the Python scan above this many rows')
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    Session = sessionmaker(bind=engine)
+    for size in args.sizes:
+        fill(engine, size)
+        sql_time = timed(Session, collect_statistics)
+        # Повторные запросы между записями обслуживает локальный уровень кэша
+        cache = ResponseCache(redis_url='')
+        cached_time = timed(Session, lambda db: cache.get_or_set('statistics', lambda: collect_statistics(db)))
+        if size <= args.legacy_max:
+            legacy = f"{timed(Session, legacy_statistics, repeat=1) * 1000:10.1f} ms"
+        else:
+            legacy = '   skipped'
+        print(f"{size:>8} rows | python scan {legacy} | SQL aggregates {sql_time * 1000:8.1f} ms"
+              f" | cached {cached_time * 1e6:6.1f} us")
+
+
+if __name__ == '__main__':
+    main()
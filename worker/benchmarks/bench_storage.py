@@ -0,0 +1,99 @@
+"""Rows/s of the per-row ORM loop versus the batched upsert in storage.save_results.
+
+Usage:
+    python benchmarks/bench_storage.py [--database-url URL] [--sizes 1000 10000 100000]
+                                       [--legacy-max N]
+
+Defaults to a temporary SQLite file; pass a PostgreSQL URL to measure against
+a local server (the websites table there is dropped and recreated).
+"""
+import argparse
+import sys
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # общий models.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models import Base, Website  # noqa: E402
+from storage import result_to_row, save_results  # noqa: E402
+
+
+def make_results(count: int, run: int):
+    return [
+        {
+            'url': f'https://shop{n % 50}.example/product/{n}',
+            'xpath': '//*[@id="price"]',
+            'title': f'Товар {n}',
+            'description': 'Описание товара',
+            'keywords': 'товар, цена',
+            'status': 'success',
+            'success': True,
+            'price': Decimal(1000 + n + run),
+            'price_raw': f'{1000 + n + run} ₽',
+            'currency': 'RUB',
+        }
+        for n in range(count)
+    ]
+
+
+def legacy_save(db, results):
+    """Old access pattern: one SELECT per result, then an ORM add or update."""
+    for result in results:
+        row = result_to_row(result, datetime.utcnow())
+        existing = db.query(Website).filter(
+            Website.url == row['url'], Website.xpath == row['xpath']
+        ).first()
+        if existing:
+            for column, value in row.items():
+                setattr(existing, column, value)
+        else:
+            db.add(Website(**row))
+
+
+def measure(Session, save, results):
+    db = Session()
+    try:
+        started = time.perf_counter()
+        save(db, results)
+        db.commit()
+        return len(results) / (time.perf_counter() - started)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url',
+                        default=f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench_storage.db'}")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--legacy-max', type=int, default=10000,
+                        help='skip the per-row loop above this many rows')
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    print(f"Database: {engine.url.render_as_string(hide_password=True)}")
+
+    for size in args.sizes:
+        for label, save in (('per-row ORM', legacy_save), ('bulk upsert', save_results)):
+            if save is legacy_save and size > args.legacy_max:
+                print(f"{size:>7} rows | {label:>12} | skipped (--legacy-max)")
+                continue
+            Base.metadata.drop_all(engine)
+            Base.metadata.create_all(engine)
+            # Первый проход вставляет строки, второй обновляет уже существующие
+            insert_rate = measure(Session, save, make_results(size, run=0))
+            update_rate = measure(Session, save, make_results(size, run=1))
+            print(f"{size:>7} rows | {label:>12} | insert {insert_rate:10.0f} rows/s | "
+                  f"update {update_rate:10.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
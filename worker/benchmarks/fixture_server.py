@@ -0,0 +1,124 @@
+"""Local HTTP stand-in for retailer sites used by the benchmarks.
+
+Serves product pages at /page/<n> so crawls can be measured offline: either
+synthetic pages or HTML files recorded from real shops, with configurable
+latency, page sizes and a share of failing responses.
+"""
+import asyncio
+import random
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+from aiohttp import web
+
+FIXTURE_XPATH = '//*[@id="product-price"]'
+
+
+def synthetic_page(size_bytes: int, price: str = '12 499', js_price: bool = False) -> str:
+    """Build a product page padded with inline scripts and markup noise.
+
+    With js_price the price element is empty in the HTML and filled in by a
+    script, as on shops that render prices on the client.
+    """
+    head = (
+        '<html><head><title>Товар</title>'
+        '<meta name="description" content="Описание товара">'
+        '<meta name="keywords" content="товар, цена">'
+    )
+    script = '<script>var data = "' + 'x' * 4000 + '";</script>'
+    item = '<div class="item"><span>Позиция 1 234</span><a href="#">ссылка</a></div>'
+    body = ['</head><body>']
+    size = len(head)
+    while size < size_bytes:
+        chunk = script + item * 20
+        body.append(chunk)
+        size += len(chunk)
+    if js_price:
+        body.append(
+            '<div id="product-price"></div><script>setTimeout(function () {'
+            f'document.getElementById("product-price").textContent = "{price} ₽";'
+            '}, 50);</script></body></html>'
+        )
+    else:
+        body.append(f'<div id="product-price">{price} ₽</div></body></html>')
+    return head + ''.join(body)
+
+
+def load_recorded_pages(directory: Union[str, Path]) -> List[bytes]:
+    """Read saved *.html pages; they are served as-is, in name order."""
+    pages = [path.read_bytes() for path in sorted(Path(directory).glob('*.html'))]
+    if not pages:
+        raise FileNotFoundError(f"No *.html pages in {directory}")
+    return pages
+
+
+class FixtureServer:
+    """aiohttp app serving product pages with a configurable delay and error rate.
+
+    Page n is pages[n % len(pages)], so a list of sizes or recorded pages is
+    spread evenly over the URLs. error_rate of the requests get error_status;
+    the choice comes from a seeded generator so runs are comparable. With
+    js_every, every js_every-th page gets its price from a script.
+    """
+
+    def __init__(self, page_size: Union[int, Sequence[int]] = 512 * 1024, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 503,
+                 pages: Optional[List[bytes]] = None, seed: int = 0, js_every: int = 0):
+        sizes = [page_size] if isinstance(page_size, int) else list(page_size)
+        self.pages = pages or [
+            synthetic_page(size, price=f'{12499 + n:,}'.replace(',', ' ')).encode('utf-8')
+            for n, size in enumerate(sizes)
+        ]
+        self.js_pages = [
+            synthetic_page(size, price=f'{12499 + n:,}'.replace(',', ' '), js_price=True).encode('utf-8')
+            for n, size in enumerate(sizes)
+        ] if js_every else []
+        self.js_every = js_every
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self._runner = None
+        self.port = None
+
+    async def handle_page(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=self.error_status, text='fixture error')
+        try:
+            n = int(request.match_info['n'])
+        except ValueError:
+            n = 0
+        pages = self.js_pages if self.js_every and n % self.js_every == 0 else self.pages
+        page = pages[n % len(pages)]
+        self.bytes_sent += len(page)
+        return web.Response(body=page, content_type='text/html', charset='utf-8')
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get('/page/{n}', self.handle_page)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        return await self.add_host(host, port)
+
+    async def add_host(self, host: str, port: int = 0) -> str:
+        """Listen on one more address, e.g. 127.0.0.2, so the crawler sees another host."""
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return f'http://{host}:{self.port}'
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def urls(self, base_url: str, count: int, offset: int = 0):
+        return [f'{base_url}/page/{n}' for n in range(offset, offset + count)]
@@ -0,0 +1,93 @@
+"""Reference copy of the BeautifulSoup extractors used before the single-parse pipeline.
+
+Kept only so the benchmarks can compare against the old behaviour.
+"""
+import logging
+import re
+
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+def extract_title(html):
+    """Extract title from HTML."""
+    soup = BeautifulSoup(html, 'lxml')
+    if soup.title:
+        return soup.title.string
+    return ""
+
+def extract_description(html):
+    """Extract description from HTML."""
+    soup = BeautifulSoup(html, 'lxml')
+    meta_desc = soup.find('meta', {'name': 'description'})
+    if meta_desc and 'content' in meta_desc.attrs:
+        return meta_desc['content']
+    return ""
+
+def extract_keywords(html):
+    """Extract keywords from HTML."""
+    soup = BeautifulSoup(html, 'lxml')
+    meta_keywords = soup.find('meta', {'name': 'keywords'})
+    if meta_keywords and 'content' in meta_keywords.attrs:
+        return meta_keywords['content']
+    return ""
+
+def extract_price(html, xpath):
+    """Extract price from HTML using XPath."""
+    try:
+        soup = BeautifulSoup(html, 'lxml')
+        
+        # Handle XPath format
+        if xpath.startswith('//*[@id="'):
+            # Extract ID from XPath
+            id_match = re.search(r'@id="([^"]+)"', xpath)
+            if id_match:
+                element_id = id_match.group(1)
+                element = soup.find(id=element_id)
+                if element:
+                    # Try to find price in the element
+                    price_text = element.text.strip()
+                    # Look for price with currency symbol
+                    price_match = re.search(r'(\d+(?:\s*\d+)*(?:,\d+)?(?:\.\d+)?)\s*₽', price_text)
+                    if price_match:
+                        # Clean up the price (remove spaces)
+                        price = price_match.group(1).replace(' ', '')
+                        return price
+        
+        # Fallback: try to find any price-like text with currency symbol
+        price_elements = soup.find_all(text=re.compile(r'\d+(?:\s*\d+)*(?:,\d+)?(?:\.\d+)?\s*₽'))
+        if price_elements:
+            for price_text in price_elements:
+                price_match = re.search(r'(\d+(?:\s*\d+)*(?:,\d+)?(?:\.\d+)?)\s*₽', price_text.strip())
+                if price_match:
+                    # Clean up the price (remove spaces)
+                    price = price_match.group(1).replace(' ', '')
+                    return price
+        
+        # If no price with currency symbol found, try to find any number that looks like a price
+        price_elements = soup.find_all(text=re.compile(r'\d+(?:\s*\d+)*(?:,\d+)?(?:\.\d+)?'))
+        if price_elements:
+            for price_text in price_elements:
+                # Check if the text is in a price-like context
+                parent = price_text.parent
+                if parent and ('price' in parent.get('class', []) or 'price' in parent.get('id', '')):
+                    price_match = re.search(r'(\d+(?:\s*\d+)*(?:,\d+)?(?:\.\d+)?)', price_text.strip())
+                    if price_match:
+                        # Clean up the price (remove spaces)
+                        price = price_match.group(1).replace('', '')
+                        return price
+        
+        return None
+    except Exception as e:
+        logger.error(f"Error extracting price: {str(e)}")
+        return None
+
+
+def extract_page(html, xpath):
+    """Old per-field extraction: one BeautifulSoup parse per field."""
+    return {
+        'title': extract_title(html),
+        'description': extract_description(html),
+        'keywords': extract_keywords(html),
+        'price': extract_price(html, xpath),
+    }
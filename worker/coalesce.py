@@ -0,0 +1,226 @@
+"""URL grouping and request coalescing.
+
+Rows of a task are grouped by normalized URL, so a page listed several times
+with different XPaths is downloaded and parsed once. Downloads that still
+overlap, between concurrent tasks, are coalesced at two levels:
+
+- within a worker process, a task that needs a page another task is already
+  downloading waits for that download instead of starting its own;
+- across processes and machines, downloaded pages are kept in Redis for
+  PAGE_CACHE_TTL seconds. The worker that starts a download takes a short
+  lock, so the others wait for the page to appear instead of downloading it
+  as well.
+
+An early-stopped body is only reused by rows whose elements it contains.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+import zlib
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+import download
+from download import Body
+from response_cache import LazyRedis
+
+logger = logging.getLogger(__name__)
+
+# Пустое значение отключает общий кэш страниц, остаётся объединение внутри процесса
+PAGE_CACHE_REDIS_URL = os.getenv('PAGE_CACHE_REDIS_URL', '')
+PAGE_CACHE_TTL = int(os.getenv('PAGE_CACHE_TTL', 60))
+# Дольше ждать чужую загрузку не имеет смысла: её ограничивает тот же таймаут
+PAGE_CACHE_LOCK_TIMEOUT = float(os.getenv('PAGE_CACHE_LOCK_TIMEOUT', 60))
+PAGE_CACHE_MAX_BYTES = int(os.getenv('PAGE_CACHE_MAX_BYTES', 1024 * 1024))
+PAGE_CACHE_POLL_INTERVAL = 0.1
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Результат загрузки: тело, текст ошибки и статус (304 или статус ошибки)
+FetchOutcome = Tuple[Optional[Body], Optional[str], Optional[object]]
+
+
+def normalize_url(url: str) -> str:
+    """Key under which equal URLs meet: scheme and host lowercased, default port and fragment dropped."""
+    try:
+        parts = urlsplit(url.strip())
+        host = (parts.hostname or '').lower()
+        port = parts.port
+    except ValueError:
+        return url
+    if not host:
+        return url
+    scheme = parts.scheme.lower()
+    netloc = host if port is None or DEFAULT_PORTS.get(scheme) == port else f'{host}:{port}'
+    if parts.username or parts.password:
+        netloc = f"{parts.netloc.rsplit('@', 1)[0]}@{netloc}"
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+def group_rows(websites_data: Sequence[Dict]) -> List[List[Dict]]:
+    """Rows grouped by normalized URL, in order of first appearance."""
+    groups: Dict[str, List[Dict]] = {}
+    for website in websites_data:
+        groups.setdefault(normalize_url(website.get('url', '')), []).append(website)
+    return list(groups.values())
+
+
+@dataclass
+class CoalesceStats:
+    """How many downloads one crawl avoided, and why."""
+    rows: int = 0
+    downloads: int = 0
+    duplicate_rows: int = 0  # та же страница в другой строке задачи
+    in_flight: int = 0       # дождались загрузки другой задачи этого процесса
+    shared: int = 0          # взяли страницу из общего кэша
+
+    @property
+    def saved(self) -> int:
+        return self.duplicate_rows + self.in_flight + self.shared
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            'rows': self.rows,
+            'downloads': self.downloads,
+            'duplicate_rows': self.duplicate_rows,
+            'in_flight': self.in_flight,
+            'shared': self.shared,
+            'saved': self.saved,
+        }
+
+
+class PageCoalescer:
+    """In-flight downloads of this process plus the optional Redis page cache.
+
+    Lives on the worker's event loop; the Redis client is the asyncio one.
+    """
+
+    def __init__(self, redis_url: str = PAGE_CACHE_REDIS_URL, ttl: int = PAGE_CACHE_TTL,
+                 lock_timeout: float = PAGE_CACHE_LOCK_TIMEOUT,
+                 max_bytes: int = PAGE_CACHE_MAX_BYTES):
+        self.redis = LazyRedis(redis_url, 'Page cache Redis', use_asyncio=True)
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.max_bytes = max_bytes
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def _keys(key: str) -> Tuple[str, str]:
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return f'page:{digest}', f'page:{digest}:lock'
+
+    async def lookup(self, url: str, selectors: Sequence[str]) -> Optional[Body]:
+        """A recently downloaded copy of the page that has what the selectors need."""
+        if not self.redis.enabled:
+            return None
+        entry = await self.redis.acall('hgetall', self._keys(normalize_url(url))[0])
+        if not entry:
+            return None
+        body = Body(
+            data=zlib.decompress(entry[b'data']),
+            encoding=entry[b'encoding'].decode(),
+            stopped=entry.get(b'stopped', b'').decode() or None,
+            etag=entry.get(b'etag', b'').decode() or None,
+            last_modified=entry.get(b'last_modified', b'').decode() or None,
+        )
+        return body if download.covers(body, selectors) else None
+
+    async def publish(self, url: str, body: Body):
+        """Share a downloaded page with other workers for PAGE_CACHE_TTL seconds."""
+        if not self.redis.enabled or self.ttl <= 0:
+            return
+        data = zlib.compress(body.data, 1)
+        if len(data) > self.max_bytes:
+            return
+        key = self._keys(normalize_url(url))[0]
+        client = self.redis.client()
+        if client is None:
+            return
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping={
+                    'data': data,
+                    'encoding': body.encoding,
+                    'stopped': body.stopped or '',
+                    'etag': body.etag or '',
+                    'last_modified': body.last_modified or '',
+                })
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            self.redis.mark_down(e)
+
+    async def _wait_for_other_worker(self, url: str, selectors: Sequence[str],
+                                     lock_key: str) -> Optional[Body]:
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(PAGE_CACHE_POLL_INTERVAL)
+            body = await self.lookup(url, selectors)
+            if body is not None:
+                return body
+            if not await self.redis.acall('exists', lock_key):
+                # Загрузка закончилась, но страницы нет: ошибка или неподходящее тело
+                return None
+        return None
+
+    async def fetch(self, url: str, selectors: Sequence[str],
+                    request: Callable[[], Awaitable[FetchOutcome]],
+                    stats: Optional[CoalesceStats] = None) -> FetchOutcome:
+        """Run request() unless another task or worker is already downloading the page."""
+        stats = stats if stats is not None else CoalesceStats()
+        key = normalize_url(url)
+        waiting = self._in_flight.get(key)
+        if waiting is not None:
+            body, error, status = await asyncio.shield(waiting)
+            if body is not None and download.covers(body, selectors):
+                stats.in_flight += 1
+                return body, error, status
+
+        lock_key = self._keys(key)[1]
+        locked = False
+        if self.redis.enabled:
+            locked = bool(await self.redis.acall('set', lock_key, uuid.uuid4().hex, nx=True,
+                                                 px=int(self.lock_timeout * 1000)))
+            # None бывает и при ошибке Redis, тогда клиент уже отключён и ждать некого
+            if not locked and self.redis.client() is not None:
+                body = await self._wait_for_other_worker(url, selectors, lock_key)
+                if body is not None:
+                    stats.shared += 1
+                    return body, None, 200
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight.setdefault(key, future)
+        try:
+            stats.downloads += 1
+            outcome = await request()
+            if outcome[0] is not None:
+                await self.publish(url, outcome[0])
+            if not future.done():
+                future.set_result(outcome)
+            return outcome
+        except BaseException as e:
+            if not future.done():
+                future.set_result((None, str(e), None))
+            raise
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+            if locked:
+                await self.redis.acall('delete', lock_key)
+
+
+_coalescer: Optional[PageCoalescer] = None
+_pid: Optional[int] = None
+
+
+def get_coalescer() -> PageCoalescer:
+    """Process-wide coalescer; a forked child gets its own."""
+    global _coalescer, _pid
+    if _coalescer is None or _pid != os.getpid():
+        _coalescer = PageCoalescer()
+        _pid = os.getpid()
+    return _coalescer
@@ -0,0 +1,172 @@
+"""Streaming page download with a size cap and early termination.
+
+The body is read chunk by chunk instead of being buffered whole. Reading
+stops at MAX_BODY_BYTES, or, for selectors that address an element by id,
+once the end of <head> (title and meta tags) and the element itself have
+arrived, plus EARLY_STOP_MARGIN bytes for the element's content. The cut
+point depends only on the content, not on chunk boundaries, so content
+hashes of the same page stay comparable between runs.
+
+The encoding is taken from a BOM, the Content-Type header or a <meta> tag,
+in that order; bytes are decoded in the parse pool, not on the event loop.
+"""
+import codecs
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+import aiohttp
+
+from extraction import ID_PATH_RE
+
+MAX_BODY_BYTES = int(os.getenv('MAX_BODY_BYTES', 5 * 1024 * 1024))
+# Сколько байт дочитать после найденного элемента; 0 отключает раннюю остановку
+EARLY_STOP_MARGIN = int(os.getenv('EARLY_STOP_MARGIN', 16384))
+DOWNLOAD_CHUNK_SIZE = int(os.getenv('DOWNLOAD_CHUNK_SIZE', 65536))
+# Кодировка страниц, которые не объявили свою и не являются корректным UTF-8
+FALLBACK_CHARSET = os.getenv('FALLBACK_CHARSET', 'cp1251')
+
+# Meta-теги ищутся, как в браузерах, только в начале документа
+CHARSET_SNIFF_BYTES = 4096
+# Совпадение может начаться в предыдущем фрагменте
+SCAN_OVERLAP = 1024
+
+HTML_CONTENT_TYPES = ('text/', 'application/xhtml', 'application/xml')
+HEAD_END_RE = re.compile(rb'</head\s*>|<body[\s>]', re.IGNORECASE)
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([A-Za-z0-9_.:-]+)', re.IGNORECASE)
+ID_CALL_RE = re.compile(r'^id\((["\'])([^"\']+)\1\)')
+CSS_ID_RE = re.compile(r'^#([A-Za-z_][\w-]*)(?=$|[\s>+~.:\[])')
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+
+@dataclass
+class Body:
+    """Downloaded bytes, their encoding, validators and why reading stopped early, if it did."""
+    data: bytes
+    encoding: str
+    stopped: Optional[str] = None  # 'size_cap' или 'early_stop'
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+def is_html(content_type: Optional[str]) -> bool:
+    """Whether a Content-Type header can carry a product page; a missing header is accepted."""
+    if not content_type:
+        return True
+    return content_type.split(';', 1)[0].strip().lower().startswith(HTML_CONTENT_TYPES)
+
+
+@lru_cache(maxsize=1024)
+def stop_pattern(selector: str) -> Optional[re.Pattern]:
+    """Byte pattern of the start tag of the element a selector addresses by id, if it does."""
+    if EARLY_STOP_MARGIN <= 0 or not selector:
+        return None
+    match = ID_PATH_RE.match(selector) or ID_CALL_RE.match(selector)
+    element_id = match.group(2) if match else None
+    if element_id is None:
+        match = CSS_ID_RE.match(selector)
+        element_id = match.group(1) if match else None
+    if element_id is None:
+        return None
+    return re.compile(
+        rb'<[A-Za-z][^<>]{0,512}?\sid\s*=\s*["\']?' + re.escape(element_id.encode('utf-8'))
+        + rb'(?:["\'\s/>])'
+    )
+
+
+def stop_patterns(selectors: Sequence[str]) -> Optional[List[re.Pattern]]:
+    """Patterns of every selector, or None if any of them needs the whole page."""
+    patterns = [stop_pattern(selector) for selector in selectors]
+    if not patterns or any(pattern is None for pattern in patterns):
+        return None
+    return patterns
+
+
+def covers(body: Body, selectors: Sequence[str], margin: int = EARLY_STOP_MARGIN) -> bool:
+    """Whether a body read for other selectors also holds everything these need."""
+    if body.stopped != 'early_stop':
+        # Целиком прочитанное или обрезанное по лимиту тело одинаково для всех
+        return True
+    patterns = stop_patterns(selectors)
+    if patterns is None or HEAD_END_RE.search(body.data) is None:
+        return False
+    for pattern in patterns:
+        match = pattern.search(body.data)
+        if match is None or match.end() + margin > len(body.data):
+            return False
+    return True
+
+
+def _codec_name(label) -> Optional[str]:
+    if isinstance(label, bytes):
+        label = label.decode('ascii', errors='ignore')
+    try:
+        return codecs.lookup(label.strip()).name
+    except (LookupError, AttributeError):
+        return None
+
+
+def detect_charset(data: bytes, header_charset: Optional[str] = None) -> str:
+    """Encoding of a page: BOM, then the header, then <meta charset>, then a UTF-8 check."""
+    for bom, name in BOMS:
+        if data.startswith(bom):
+            return name
+    if header_charset:
+        name = _codec_name(header_charset)
+        if name:
+            return name
+    match = META_CHARSET_RE.search(data, 0, CHARSET_SNIFF_BYTES)
+    if match:
+        name = _codec_name(match.group(1))
+        if name:
+            return name
+    try:
+        # Обрезанный документ может заканчиваться на середине символа
+        codecs.getincrementaldecoder('utf-8')().decode(data, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return FALLBACK_CHARSET
+
+
+async def read_body(response: aiohttp.ClientResponse, selectors: Sequence[str] = (),
+                    max_bytes: int = MAX_BODY_BYTES, margin: int = EARLY_STOP_MARGIN) -> Body:
+    """Read a response body up to max_bytes, stopping early once every selector's element is in.
+
+    A response that is not read to the end cannot go back to the pool: aiohttp
+    closes its connection on release.
+    """
+    buffer = bytearray()
+    patterns = stop_patterns(selectors) if margin > 0 else None
+    target_ends: List[Optional[int]] = [None] * len(patterns or ())
+    head_end = None
+    stopped = None
+    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+        scan_from = max(0, len(buffer) - SCAN_OVERLAP)
+        buffer += chunk
+        if patterns is not None:
+            if head_end is None:
+                match = HEAD_END_RE.search(buffer, scan_from)
+                head_end = match.end() if match else None
+            for n, pattern in enumerate(patterns):
+                if target_ends[n] is None:
+                    match = pattern.search(buffer, scan_from)
+                    target_ends[n] = match.end() if match else None
+            if head_end is not None and None not in target_ends:
+                cut = max(max(target_ends) + margin, head_end)
+                if cut <= min(len(buffer), max_bytes):
+                    del buffer[cut:]
+                    stopped = 'early_stop'
+                    break
+        if len(buffer) > max_bytes:
+            del buffer[max_bytes:]
+            stopped = 'size_cap'
+            break
+    data = bytes(buffer)
+    return Body(data, detect_charset(data, response.charset), stopped,
+                etag=response.headers.get('ETag'), last_modified=response.headers.get('Last-Modified'))
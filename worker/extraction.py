@@ -0,0 +1,303 @@
+import logging
+import os
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from lxml import etree, html as lxml_html
+
+try:
+    from cssselect import GenericTranslator, SelectorError
+except ImportError:  # CSS-селекторы необязательны
+    GenericTranslator = None
+    SelectorError = ValueError
+
+logger = logging.getLogger(__name__)
+
+# Distinct user selectors kept compiled, and how many nodes the heuristic may visit
+XPATH_CACHE_SIZE = int(os.getenv('XPATH_CACHE_SIZE', 1024))
+HEURISTIC_MAX_NODES = int(os.getenv('HEURISTIC_MAX_NODES', 20000))
+# Колонка price — NUMERIC(14, 2): больше 12 цифр до запятой — это артикул или штрихкод, не цена
+PRICE_LIMIT = Decimal(10) ** 12
+
+# Число с необязательными разделителями тысяч и дробной частью. Группы тысяч — ровно по три
+# цифры, так что разбор однозначен и длинный ряд цифр не даёт экспоненциального перебора;
+# соседние группы цифр (артикул '1234 5678') ценой не считаются
+THOUSANDS_SEPARATOR = '[ \u00a0\u202f\u2009]'
+PRICE_NUMBER = (
+    rf'(?<!\d)(?<!\d{THOUSANDS_SEPARATOR})'
+    rf'(?:\d{{1,3}}(?:{THOUSANDS_SEPARATOR}\d{{3}})+|\d+)(?:[.,]\d+)?'
+    rf'(?!\d|{THOUSANDS_SEPARATOR}\d)'
+)
+PRICE_WITH_CURRENCY_RE = re.compile(rf'({PRICE_NUMBER})\s*₽')
+PRICE_NUMBER_RE = re.compile(rf'({PRICE_NUMBER})')
+WHITESPACE_RE = re.compile(r'\s+')
+
+CURRENCY_SIGNS = {'₽': 'RUB', 'руб': 'RUB'}
+
+EMPTY_FIELDS = {
+    'title': "", 'description': "", 'keywords': "",
+    'price': None, 'price_raw': None, 'currency': None,
+}
+
+TITLE_XPATH = etree.XPath('//title[1]/text()')
+DESCRIPTION_XPATH = etree.XPath('//meta[@name="description"][1]/@content')
+KEYWORDS_XPATH = etree.XPath('//meta[@name="keywords"][1]/@content')
+# //*[@id="x"]... сводится к id("x")..., который libxml2 ищет по хэш-таблице
+ID_PATH_RE = re.compile(r'^//\*\[@id=(["\'])([^"\']+)\1\](.*)$')
+ID_ATTR_RE = re.compile(r'@id\s*=\s*["\']([^"\']+)["\']')
+ID_LOOKUP = etree.XPath('id($id)')
+SKIP_TAGS = {'script', 'style', 'noscript'}
+
+# Strategies in the order they are tried
+STRATEGIES = ('xpath', 'css', 'id', 'heuristic')
+
+
+def parse_document(html: str) -> Optional[etree._Element]:
+    """Parse HTML into an lxml tree once per page."""
+    if not html:
+        return None
+    try:
+        return lxml_html.document_fromstring(html)
+    except ValueError:
+        # lxml отказывается разбирать str с XML-декларацией кодировки
+        return lxml_html.document_fromstring(
+            html.encode('utf-8'), parser=lxml_html.HTMLParser(encoding='utf-8')
+        )
+    except etree.ParserError:
+        return None
+
+
+def _match_price(text: str, pattern: re.Pattern) -> Optional[str]:
+    match = pattern.search(text.strip())
+    if match:
+        return WHITESPACE_RE.sub(' ', match.group(0)).strip()
+    return None
+
+
+def _node_text(node) -> str:
+    if isinstance(node, etree._Element):
+        return node.text_content()
+    return str(node)
+
+
+def _first(values) -> str:
+    return str(values[0]) if values else ""
+
+
+def _is_xpath(expr: str) -> bool:
+    # '.price' — класс CSS, а не XPath: относительными считаем только './', '..' и '.'
+    return expr.startswith(('/', '(', './', '..', 'id(')) or expr == '.' or '::' in expr
+
+
+@lru_cache(maxsize=XPATH_CACHE_SIZE)
+def compile_selector(expr: str) -> Tuple[Optional[str], Optional[etree.XPath]]:
+    """Compile a user-supplied XPath or CSS selector once per distinct expression.
+
+    Returns the strategy name ('xpath' or 'css') and the compiled expression,
+    or (None, None) when the selector cannot be compiled.
+    """
+    error = None
+    if _is_xpath(expr):
+        match = ID_PATH_RE.match(expr)
+        try:
+            return 'xpath', etree.XPath(f'id("{match.group(2)}"){match.group(3)}' if match else expr)
+        except etree.XPathSyntaxError as e:
+            # Похожее на XPath выражение может оказаться CSS-селектором
+            error = e
+    if GenericTranslator is not None:
+        try:
+            return 'css', etree.XPath(GenericTranslator().css_to_xpath(expr))
+        except (etree.XPathSyntaxError, SelectorError) as e:
+            error = error or e
+    if error is not None:
+        logger.warning(f"Invalid selector '{expr}': {str(error)}")
+    return None, None
+
+
+def _price_from_nodes(nodes) -> Optional[str]:
+    if not isinstance(nodes, list):
+        nodes = [nodes]
+    for node in nodes:
+        text = _node_text(node)
+        price = ((_match_price(text, PRICE_WITH_CURRENCY_RE) if '₽' in text else None)
+                 or _match_price(text, PRICE_NUMBER_RE))
+        if price:
+            return price
+    return None
+
+
+def _is_price_container(element) -> bool:
+    return ('price' in (element.get('class') or '').split()
+            or 'price' in (element.get('id') or ''))
+
+
+def _heuristic_price(tree: etree._Element) -> Optional[str]:
+    """Bounded scan: first text with a currency sign, else a number inside a price element."""
+    fallback = None
+    for visited, element in enumerate(tree.iter()):
+        if visited >= HEURISTIC_MAX_NODES:
+            break
+        tag = element.tag
+        if not isinstance(tag, str):
+            continue
+        own_text = element.text if tag not in SKIP_TAGS else None
+        for text in (own_text, element.tail):
+            if text and '₽' in text:
+                price = _match_price(text, PRICE_WITH_CURRENCY_RE)
+                if price:
+                    return price
+        if fallback is None and own_text and _is_price_container(element):
+            fallback = _match_price(own_text, PRICE_NUMBER_RE)
+    return fallback
+
+
+def find_price(tree: etree._Element, xpath: str) -> Tuple[Optional[str], Optional[str], Dict[str, float]]:
+    """Try the price strategies in order.
+
+    Returns the raw price text, the strategy that found it and the time
+    spent in every strategy that was tried.
+    """
+    timings: Dict[str, float] = {}
+    if tree is None:
+        return None, None, timings
+
+    # 1. Выражение пользователя: XPath или CSS, скомпилированное один раз
+    if xpath:
+        started = time.perf_counter()
+        strategy, compiled = compile_selector(xpath)
+        price = None
+        if compiled is not None:
+            try:
+                price = _price_from_nodes(compiled(tree))
+            except etree.XPathError as e:
+                logger.warning(f"Error evaluating '{xpath}': {str(e)}")
+            timings[strategy] = time.perf_counter() - started
+            if price:
+                return price, strategy, timings
+
+        # 2. Быстрый поиск по id, упомянутому в выражении
+        id_match = ID_ATTR_RE.search(xpath)
+        if id_match:
+            started = time.perf_counter()
+            price = _price_from_nodes(ID_LOOKUP(tree, id=id_match.group(1)))
+            timings['id'] = time.perf_counter() - started
+            if price:
+                return price, 'id', timings
+
+    # 3. Ограниченный эвристический поиск по документу
+    started = time.perf_counter()
+    price = _heuristic_price(tree)
+    timings['heuristic'] = time.perf_counter() - started
+    return price, ('heuristic' if price else None), timings
+
+
+def extract_price(tree: etree._Element, xpath: str) -> Optional[str]:
+    """Extract the raw price text (e.g. '12 499 ₽') from a parsed document using XPath."""
+    return find_price(tree, xpath)[0]
+
+
+@dataclass
+class StrategyStats:
+    """Attempts, hits and time spent per price strategy."""
+    attempts: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    hits: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    seconds: Dict[str, float] = field(default_factory=lambda: defaultdict(float))
+
+    def record(self, strategy: Optional[str], timings: Dict[str, float]):
+        for name, elapsed in timings.items():
+            self.attempts[name] += 1
+            self.seconds[name] += elapsed
+        if strategy:
+            self.hits[strategy] += 1
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {
+                'attempts': self.attempts[name],
+                'hits': self.hits[name],
+                'avg_ms': round(self.seconds[name] / self.attempts[name] * 1000, 3),
+            }
+            for name in STRATEGIES if self.attempts.get(name)
+        }
+
+
+def parse_price(price) -> Optional[Decimal]:
+    """Convert an extracted price string such as '12 499,90' into a Decimal."""
+    if price is None:
+        return None
+    # Пробелы убираем, запятую считаем десятичным разделителем
+    text = str(price).replace(' ', '').replace(',', '.')
+    text = ''.join(c for c in text if c.isdigit() or c == '.')
+    if not text:
+        return None
+    try:
+        value = Decimal(text)
+    except InvalidOperation:
+        logger.error(f"Error converting price '{price}' to number")
+        return None
+    if value >= PRICE_LIMIT:
+        logger.warning(f"Discarding price '{price}': too large to be a price")
+        return None
+    return value
+
+
+def detect_currency(price_raw: Optional[str]) -> Optional[str]:
+    """Return the ISO code of the currency mentioned in the price text."""
+    if not price_raw:
+        return None
+    lowered = price_raw.lower()
+    for sign, code in CURRENCY_SIGNS.items():
+        if sign in lowered:
+            return code
+    return None
+
+
+def extract_fields(tree: Optional[etree._Element], xpath: str) -> Dict:
+    """Run every field extractor over one parsed tree."""
+    if tree is None:
+        return dict(EMPTY_FIELDS)
+    price_raw, strategy, timings = find_price(tree, xpath)
+    return {
+        'title': _first(TITLE_XPATH(tree)),
+        'description': _first(DESCRIPTION_XPATH(tree)),
+        'keywords': _first(KEYWORDS_XPATH(tree)),
+        # Цена разбирается один раз здесь, дальше хранится и агрегируется числом
+        'price': parse_price(price_raw),
+        'price_raw': price_raw,
+        'currency': detect_currency(price_raw),
+        'price_strategy': strategy,
+        'strategy_timings': timings,
+    }
+
+
+def extract_page_fields(html: Union[str, bytes], xpaths: Sequence[str],
+                        encoding: str = 'utf-8') -> List[Dict]:
+    """Parse the page once and extract the fields for every XPath, in order.
+
+    Raw bytes are decoded here, in the parse pool, with undecodable bytes replaced.
+    """
+    try:
+        if isinstance(html, bytes):
+            html = html.decode(encoding, errors='replace')
+        tree = parse_document(html)
+    except Exception as e:
+        logger.error(f"Error parsing page: {str(e)}")
+        return [dict(EMPTY_FIELDS) for _ in xpaths]
+    results = []
+    for xpath in xpaths:
+        try:
+            results.append(extract_fields(tree, xpath))
+        except Exception as e:
+            logger.error(f"Error extracting page data: {str(e)}")
+            results.append(dict(EMPTY_FIELDS))
+    return results
+
+
+def extract_page(html: Union[str, bytes], xpath: str, encoding: str = 'utf-8') -> Dict:
+    """Parse the page once and extract title, description, keywords and price."""
+    return extract_page_fields(html, [xpath], encoding)[0]
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Awaitable, Optional, TypeVar
+
+import aiohttp
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Connection pool settings shared by every task of the worker process
+HTTP_LIMIT = int(os.getenv('HTTP_LIMIT', 200))
+HTTP_LIMIT_PER_HOST = int(os.getenv('HTTP_LIMIT_PER_HOST', 8))
+HTTP_DNS_TTL = int(os.getenv('HTTP_DNS_TTL', 300))
+HTTP_KEEPALIVE = float(os.getenv('HTTP_KEEPALIVE', 30))
+HTTP_TIMEOUT_TOTAL = float(os.getenv('HTTP_TIMEOUT_TOTAL', 60))
+HTTP_TIMEOUT_CONNECT = float(os.getenv('HTTP_TIMEOUT_CONNECT', 10))
+HTTP_TIMEOUT_READ = float(os.getenv('HTTP_TIMEOUT_READ', 30))
+
+_lock = threading.Lock()
+_pid: Optional[int] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Return the process-wide event loop, starting its thread on first use."""
+    global _pid, _loop, _session
+    with _lock:
+        # После fork поток цикла событий в дочернем процессе не существует
+        if _loop is None or _pid != os.getpid():
+            _pid = os.getpid()
+            _session = None
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='http-loop', daemon=True).start()
+        return _loop
+
+
+def run(coro: Awaitable[T]) -> T:
+    """Run a coroutine on the worker's long-lived loop and wait for the result."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+def create_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_LIMIT,
+        limit_per_host=HTTP_LIMIT_PER_HOST,
+        ttl_dns_cache=HTTP_DNS_TTL,
+        keepalive_timeout=HTTP_KEEPALIVE,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=HTTP_TIMEOUT_TOTAL,
+        connect=HTTP_TIMEOUT_CONNECT,
+        sock_read=HTTP_TIMEOUT_READ,
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                 trace_configs=[metrics.trace_config()])
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Return the shared client session; must be awaited on the worker loop."""
+    global _session
+    if _session is None or _session.closed:
+        _session = create_session()
+    return _session
+
+
+async def close_session():
+    """Close the shared client session (awaited on the loop that created it)."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def shutdown():
+    """Close the shared session and stop the loop thread."""
+    global _loop
+    if _loop is None or _pid != os.getpid():
+        return
+    try:
+        run(close_session())
+    except Exception as e:
+        logger.error(f"Error closing HTTP session: {str(e)}")
+    _loop.call_soon_threadsafe(_loop.stop)
+    _loop = None
@@ -0,0 +1,89 @@
+"""Crawl job bookkeeping.
+
+A job is identified by an id chosen by whoever dispatches it. Workers add
+their results to crawl_results and bump the job counters in the same
+transaction, so progress can be read from the database instead of the
+Celery result backend. A row is stored once per (job, url, xpath) and only
+newly stored rows are counted, so a chunk redelivered after a worker died
+does not count the rows it had already committed a second time.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from models import CrawlJob, CrawlResult, upsert_insert
+
+logger = logging.getLogger(__name__)
+
+RESULT_FIELDS = ('url', 'xpath', 'title', 'success', 'price', 'price_raw', 'currency', 'error')
+
+
+def _bump(db: Session, job_id: str, now: datetime, total: Optional[int] = None,
+          done: int = 0, failed: int = 0):
+    """Create the job row if needed and add to its counters atomically."""
+    stmt = upsert_insert(CrawlJob, db.get_bind().dialect.name).values(
+        id=job_id, status='running', total=total, done=done, failed=failed,
+        created_at=now, updated_at=now,
+    )
+    set_ = {
+        'done': CrawlJob.done + stmt.excluded.done,
+        'failed': CrawlJob.failed + stmt.excluded.failed,
+        'updated_at': stmt.excluded.updated_at,
+    }
+    if total is not None:
+        set_['total'] = stmt.excluded.total
+    db.execute(stmt.on_conflict_do_update(index_elements=['id'], set_=set_))
+    # Задание завершено, когда обработаны все отправленные строки
+    db.execute(
+        update(CrawlJob)
+        .where(
+            CrawlJob.id == job_id,
+            CrawlJob.status != 'finished',
+            CrawlJob.total.isnot(None),
+            CrawlJob.done + CrawlJob.failed >= CrawlJob.total,
+        )
+        .values(status='finished', finished_at=now)
+    )
+
+
+def record_results(db: Session, job_id: str, results: Iterable[Dict]):
+    """Store per-row results of a job and count the newly stored ones as done or failed."""
+    now = datetime.utcnow()
+    rows: Dict[Tuple[str, str], Dict] = {}
+    for result in results:
+        row = {name: result.get(name) for name in RESULT_FIELDS}
+        row['url'] = row['url'] or ''
+        row['xpath'] = row['xpath'] or ''
+        row['success'] = bool(row['success'])
+        row['job_id'] = job_id
+        row['checked_at'] = now
+        rows[(row['url'], row['xpath'])] = row
+    if not rows:
+        return
+    stmt = (
+        upsert_insert(CrawlResult, db.get_bind().dialect.name)
+        .on_conflict_do_nothing(index_elements=['job_id', 'url', 'xpath'])
+        .returning(CrawlResult.success)
+    )
+    # Строка задания должна существовать раньше ссылающихся на неё результатов
+    _bump(db, job_id, now)
+    # Уже записанные при прошлой доставке строки не возвращаются и не считаются
+    inserted = db.execute(stmt, list(rows.values())).scalars().all()
+    if not inserted:
+        return
+    failed = sum(1 for success in inserted if not success)
+    _bump(db, job_id, now, done=len(inserted) - failed, failed=failed)
+
+
+def record_lost(db: Session, job_id: str, count: int):
+    """Count rows that a crashed task could not process as failed."""
+    if count > 0:
+        _bump(db, job_id, datetime.utcnow(), failed=count)
+
+
+def set_total(db: Session, job_id: str, total: int):
+    """Record how many rows were sent once the dispatcher knows it."""
+    _bump(db, job_id, datetime.utcnow(), total=total)
@@ -1,16 +1,38 @@
 from celery import Celery
-from sqlalchemy import create_engine, Column, Integer, String
+from celery.signals import celeryd_init, worker_process_shutdown, worker_ready
+from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
 import aiohttp
 import asyncio
-from typing import Dict, List
+import atexit
+import itertools
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
 import logging
 import os
+import time
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
-import re
-from datetime import datetime
+
+import download
+import http_client
+import jobs
+import metrics
+import migrations
+import recrawl
+import render
+import retry
+from coalesce import CoalesceStats, FetchOutcome, get_coalescer, group_rows
+from extraction import StrategyStats, extract_page_fields
+from models import Base
+from pipeline import run_pipeline
+from render import RenderStats
+from response_cache import STATISTICS_KEY, get_cache, product_keys
+from page_cache import CachedPage, ChangeStats, content_hash, load_cache, save_validators
+from retry import CircuitBreaker
+from scheduler import CrawlScheduler, HostLimiter, host_of
+from storage import collect_statistics, save_results
 
 # Load environment variables
 load_dotenv()
@@ -20,241 +42,495 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Create Celery app
-celery_app = Celery('tasks', broker='redis://redis:6379/0', backend='redis://redis:6379/0')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+celery_app = Celery('tasks', broker=REDIS_URL, backend=REDIS_URL)
+celery_app.conf.update(
+    # Порция подтверждается только после обработки: при падении воркера её заберёт другой
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    # Celery beat periodically hands due products to the workers
+    beat_schedule={
+        'dispatch-due-products': {
+            'task': 'main.dispatch_due_products',
+            'schedule': recrawl.RECRAWL_TICK_SECONDS,
+        },
+    },
+)
 
 # Database configuration
 DATABASE_URL = os.getenv('DATABASE_URL', 'postgresql://postgres:postgres@db:5432/postgres')
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-# Website model
-class Website(Base):
-    __tablename__ = "websites"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    row_id = Column(String, unique=True, index=True)  # Уникальный идентификатор строки из файла
-    url = Column(String, index=True)
-    title = Column(String)
-    description = Column(String)
-    keywords = Column(String)
-    status = Column(String)
-    price = Column(String)  # Добавляем поле для хранения цены
-
-# Создаем таблицу, если она не существует
-Base.metadata.create_all(bind=engine)
-
-def extract_title(html):
-    """Extract title from HTML."""
-    soup = BeautifulSoup(html, 'lxml')
-    if soup.title:
-        return soup.title.string
-    return ""
-
-def extract_description(html):
-    """Extract description from HTML."""
-    soup = BeautifulSoup(html, 'lxml')
-    meta_desc = soup.find('meta', {'name': 'description'})
-    if meta_desc and 'content' in meta_desc.attrs:
-        return meta_desc['content']
-    return ""
-
-def extract_keywords(html):
-    """Extract keywords from HTML."""
-    soup = BeautifulSoup(html, 'lxml')
-    meta_keywords = soup.find('meta', {'name': 'keywords'})
-    if meta_keywords and 'content' in meta_keywords.attrs:
-        return meta_keywords['content']
-    return ""
-
-def extract_price(html, xpath):
-    """Extract price from HTML using XPath."""
-    try:
-        soup = BeautifulSoup(html, 'lxml')
-        
-        # Handle XPath format
-        if xpath.startswith('//*[@id="'):
-            # Extract ID from XPath
-            id_match = re.search(r'@id="([^"]+)"', xpath)
-            if id_match:
-                element_id = id_match.group(1)
-                element = soup.find(id=element_id)
-                if element:
-                    # Try to find price in the element
-                    price_text = element.text.strip()
-                    # Look for price with currency symbol
-                    price_match = re.search(r'(\d+(?:\s*\d+)*(?:,\d+)?(?:\.\d+)?)\s*₽', price_text)
-                    if price_match:
-                        # Clean up the price (remove spaces)
-                        price = price_match.group(1).replace(' ', '')
-                        return price
-        
-        # Fallback: try to find any price-like text with currency symbol
-        price_elements = soup.find_all(text=re.compile(r'\d+(?:\s*\d+)*(?:,\d+)?(?:\.\d+)?\s*₽'))
-        if price_elements:
-            for price_text in price_elements:
-                price_match = re.search(r'(\d+(?:\s*\d+)*(?:,\d+)?(?:\.\d+)?)\s*₽', price_text.strip())
-                if price_match:
-                    # Clean up the price (remove spaces)
-                    price = price_match.group(1).replace(' ', '')
-                    return price
-        
-        # If no price with currency symbol found, try to find any number that looks like a price
-        price_elements = soup.find_all(text=re.compile(r'\d+(?:\s*\d+)*(?:,\d+)?(?:\.\d+)?'))
-        if price_elements:
-            for price_text in price_elements:
-                # Check if the text is in a price-like context
-                parent = price_text.parent
-                if parent and ('price' in parent.get('class', []) or 'price' in parent.get('id', '')):
-                    price_match = re.search(r'(\d+(?:\s*\d+)*(?:,\d+)?(?:\.\d+)?)', price_text.strip())
-                    if price_match:
-                        # Clean up the price (remove spaces)
-                        price = price_match.group(1).replace('', '')
-                        return price
-        
-        return None
-    except Exception as e:
-        logger.error(f"Error extracting price: {str(e)}")
-        return None
-
-async def fetch_website_data(session: aiohttp.ClientSession, website_data: Dict) -> Dict:
-    """Fetch website data asynchronously."""
-    url = website_data.get('url', '')
-    title = website_data.get('title', '')
-    xpath = website_data.get('xpath', '')
-    
+# Создаем таблицы, если их нет, и обновляем схему старых баз; воркеры и beat делают это по очереди
+migrations.upgrade(engine, Base.metadata)
+
+# Parsing pool configuration: "process" or "thread"
+PARSE_EXECUTOR = os.getenv('PARSE_EXECUTOR', 'process')
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', os.cpu_count() or 1))
+
+_parse_executor: Optional[Executor] = None
+
+# Crawl limits: concurrency of one task, per-host concurrency and requests per second (0 = no limit)
+CRAWL_MAX_CONCURRENCY = int(os.getenv('CRAWL_MAX_CONCURRENCY', 100))
+CRAWL_PER_HOST_CONCURRENCY = int(os.getenv('CRAWL_PER_HOST_CONCURRENCY', 4))
+CRAWL_PER_HOST_RPS = float(os.getenv('CRAWL_PER_HOST_RPS', 2))
+# Лимиты хоста общие для всех задач процесса: порции одной загрузки не умножают нагрузку на сайт
+host_limiter = HostLimiter(CRAWL_PER_HOST_CONCURRENCY, CRAWL_PER_HOST_RPS)
+# Состояние хостов общее для всех задач процесса: мёртвый домен отсекается сразу
+host_breaker = CircuitBreaker()
+
+def configure_parse_executor(kind: str = PARSE_EXECUTOR, workers: int = PARSE_WORKERS) -> Executor:
+    """(Re)create the pool used for CPU-bound HTML parsing."""
+    global _parse_executor
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=True)
+    if kind == 'process' and multiprocessing.current_process().daemon:
+        # Дочерние процессы prefork-пула Celery не могут порождать процессы
+        logger.warning("Process pool is unavailable in a daemonic worker process, "
+                       "falling back to threads; run Celery with --pool=solo or --pool=threads")
+        kind = 'thread'
+    if kind == 'process':
+        _parse_executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        _parse_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='parse')
+    return _parse_executor
+
+def get_parse_executor() -> Executor:
+    """Return the worker-wide parsing pool, creating it on first use."""
+    if _parse_executor is None:
+        configure_parse_executor()
+    return _parse_executor
+
+async def parse_in_pool(*args):
+    """Run extract_page_fields in the parsing pool, replacing the pool if a child process died.
+
+    A child killed mid-parse (e.g. out of memory on a huge page) breaks the
+    whole ProcessPoolExecutor; the page is retried once in a fresh pool.
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        executor = get_parse_executor()
+        try:
+            return await loop.run_in_executor(executor, extract_page_fields, *args)
+        except BrokenProcessPool:
+            # Пул пересоздаёт только первая заметившая поломку корутина
+            if _parse_executor is executor:
+                logger.warning("Parse pool is broken, a child process died; recreating it")
+                configure_parse_executor()
+            if attempt:
+                raise
+
+@worker_process_shutdown.connect
+def _close_http_client(**kwargs):
+    if render.is_running():
+        http_client.run(render.close_pool())
+    http_client.shutdown()
+    metrics.mark_process_dead(os.getpid())
+
+@celeryd_init.connect
+def _reset_metrics(**kwargs):
+    metrics.reset_multiprocess_dir()
+
+@worker_ready.connect
+def _start_metrics_server(**kwargs):
+    metrics.start_server()
+
+@atexit.register
+def _shutdown_parse_executor():
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=False, cancel_futures=True)
+
+# Поля результата, которые задача возвращает через result backend
+RETURNED_FIELDS = ('url', 'title', 'success', 'price', 'price_raw', 'currency', 'error')
+
+def _success_result(url: str, xpath: str, title: str, fields: Dict) -> Dict:
+    return {
+        'url': url,
+        'xpath': xpath,
+        'title': title or fields['title'],
+        'description': fields['description'],
+        'keywords': fields['keywords'],
+        'status': 'success',
+        'success': True,
+        'price': fields['price'],
+        'price_raw': fields['price_raw'],
+        'currency': fields['currency']
+    }
+
+def _error_result(url: str, xpath: str, title: str, error: str, status: Optional[str] = None) -> Dict:
+    return {
+        'url': url,
+        'xpath': xpath,
+        'title': title,
+        'status': status or f'error: {error}',
+        'success': False,
+        'error': error
+    }
+
+async def _request_page(session: aiohttp.ClientSession, url: str, headers: Dict[str, str],
+                        selectors: Sequence[str], breaker: CircuitBreaker) -> FetchOutcome:
+    """Download a page, retrying transient failures with backoff.
+
+    Returns the body, or (None, None, 304) if the page has not changed, or
+    (None, error, status) if it could not be downloaded.
+    """
+    host = host_of(url)
+    for attempt in itertools.count():
+        if not breaker.allow(host):
+            # Хост недоступен: строка уйдёт на перепроверку по расписанию
+            return None, 'host circuit open', 'deferred: circuit open'
+        retry_after = None
+        # Пробный запрос после паузы должен разрешиться в любом случае, иначе хост закрыт навсегда
+        probe = breaker.is_probing(host)
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304 and headers:
+                    breaker.record_success(host)
+                    return None, None, 304
+                if response.status == 200:
+                    content_type = response.headers.get('Content-Type')
+                    if not download.is_html(content_type):
+                        # Ссылка ведёт на файл, а не на страницу: тело не скачиваем
+                        breaker.record_success(host)
+                        return None, f'unsupported content type {content_type}', None
+                    download_started = time.perf_counter()
+                    body = await download.read_body(response, selectors)
+                    metrics.FETCH_PHASE_SECONDS.labels('download', metrics.host_label(host)).observe(
+                        time.perf_counter() - download_started
+                    )
+                    metrics.DOWNLOAD_BYTES.inc(len(body.data))
+                    if body.stopped:
+                        metrics.DOWNLOAD_STOPS.labels(body.stopped).inc()
+                    breaker.record_success(host)
+                    return body, None, 200
+                error = f'HTTP {response.status}'
+                if not retry.is_retryable_status(response.status):
+                    # Хост отвечает, просто страницы нет или доступ закрыт
+                    breaker.record_success(host)
+                    return None, error, None
+                retry_after = retry.parse_retry_after(response.headers.get('Retry-After'))
+                breaker.record_failure(host)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            if not retry.is_retryable_error(e):
+                # Хост ответил (TLS, неверный URL и т.п.): это не признак его перегрузки
+                breaker.record_success(host)
+                logger.error(f"Error fetching {url}: {error}")
+                return None, error, None
+            breaker.record_failure(host)
+        finally:
+            if probe and breaker.is_probing(host):
+                # Запрос отменён: хост так и не ответил
+                breaker.release_probe(host)
+
+        delay = retry.backoff_delay(attempt, retry_after)
+        if attempt >= retry.RETRY_ATTEMPTS or delay is None:
+            logger.error(f"Error fetching {url}: {error} (attempt {attempt + 1})")
+            return None, error, None
+        breaker.record_retry(host)
+        metrics.FETCH_RETRIES.labels(metrics.host_label(host)).inc()
+        await asyncio.sleep(delay)
+
+async def fetch_page(session: aiohttp.ClientSession, rows: List[Dict],
+                     cached: Optional[CachedPage] = None,
+                     stats: Optional[ChangeStats] = None,
+                     strategies: Optional[StrategyStats] = None,
+                     breaker: Optional[CircuitBreaker] = None,
+                     coalescing: Optional[CoalesceStats] = None,
+                     rendering: Optional[RenderStats] = None) -> List[Dict]:
+    """Fetch one page for rows that share its URL and extract every row's XPath from it.
+
+    Unchanged pages are not parsed again, a page another task or worker is
+    downloading right now is awaited rather than downloaded twice, and
+    transient failures are retried with backoff. On hosts opted in to
+    rendering, rows whose price is not in the HTML go to the browser; such
+    pages are always parsed, since their HTML can stay the same while the
+    price changes.
+    """
+    url = rows[0].get('url', '')
+    stats = stats if stats is not None else ChangeStats()
+    breaker = breaker if breaker is not None else host_breaker
+    coalescing = coalescing if coalescing is not None else CoalesceStats()
+    rendering = rendering if rendering is not None else RenderStats()
+    coalescer = get_coalescer()
+    renderable = render.opted_in(host_of(url))
+    xpaths = [row.get('xpath', '') for row in rows]
+    # Значения можно переиспользовать, только если эта пара url + xpath уже разбиралась
+    previous = [cached.fields.get(xpath) if cached is not None else None for xpath in xpaths]
+    coalescing.rows += len(rows)
+    coalescing.duplicate_rows += len(rows) - 1
+
+    body = await coalescer.lookup(url, xpaths)
+    if body is not None:
+        coalescing.shared += 1
+    elif None in previous or renderable:
+        # Тело понадобится в любом случае: ту же загрузку могут ждать другие задачи
+        body, error, status = await coalescer.fetch(
+            url, xpaths, lambda: _request_page(session, url, {}, xpaths, breaker), coalescing,
+        )
+    else:
+        coalescing.downloads += 1
+        body, error, status = await _request_page(session, url, cached.headers(), xpaths, breaker)
+        if body is not None:
+            await coalescer.publish(url, body)
+
+    results: List[Dict] = [None] * len(rows)
+    if body is None:
+        if status == 304:
+            stats.not_modified += len(rows)
+            for n, row in enumerate(rows):
+                results[n] = _success_result(row.get('url', ''), xpaths[n], row.get('title', ''), previous[n])
+                results[n].update(etag=cached.etag, last_modified=cached.last_modified,
+                                  content_hash=cached.content_hash, unchanged=True)
+            return results
+        return [_error_result(row.get('url', ''), xpaths[n], row.get('title', ''), error, status=status)
+                for n, row in enumerate(rows)]
+
+    body_hash = content_hash(body.data)
+    validators = {'etag': body.etag, 'last_modified': body.last_modified, 'content_hash': body_hash}
+    to_parse = []
+    for n, row in enumerate(rows):
+        if previous[n] is not None and body_hash == cached.content_hash and not renderable:
+            stats.same_hash += 1
+            results[n] = _success_result(row.get('url', ''), xpaths[n], row.get('title', ''), previous[n])
+            results[n].update(validators, unchanged=True)
+            continue
+        if previous[n] is not None:
+            stats.changed += 1
+        else:
+            stats.uncached += 1
+        to_parse.append(n)
+
+    if to_parse:
+        # Документ декодируется и разбирается один раз для всех полей, вне event loop
+        try:
+            with metrics.PARSE_SECONDS.time():
+                parsed = await parse_in_pool(body.data, [xpaths[n] for n in to_parse], body.encoding)
+        except BrokenProcessPool:
+            logger.error(f"Error parsing {url}: parse process died twice")
+            for n in to_parse:
+                results[n] = _error_result(rows[n].get('url', ''), xpaths[n], rows[n].get('title', ''),
+                                           'parse process died')
+            return results
+        for n, fields in zip(to_parse, parsed):
+            timings = fields.get('strategy_timings', {})
+            for strategy, elapsed in timings.items():
+                metrics.EXTRACT_SECONDS.labels(strategy).observe(elapsed)
+            if strategies is not None:
+                strategies.record(fields.get('price_strategy'), timings)
+            results[n] = _success_result(rows[n].get('url', ''), xpaths[n], rows[n].get('title', ''), fields)
+            results[n].update(validators, unchanged=False)
+
+    missing = [n for n in to_parse if results[n]['price'] is None] if renderable else []
+    if renderable:
+        rendering.static_hits += len(to_parse) - len(missing)
+    if missing:
+        html = await render.render_page(url, [xpaths[n] for n in missing], rendering)
+        parsed = []
+        if html is not None:
+            try:
+                parsed = await parse_in_pool(html, [xpaths[n] for n in missing])
+            except BrokenProcessPool:
+                # Статически разобранные результаты остаются
+                logger.error(f"Error parsing rendered {url}: parse process died twice")
+        for n, fields in zip(missing, parsed):
+            found = fields['price'] is not None
+            rendering.found += found
+            metrics.RENDER_RESULTS.labels('found' if found else 'not_found').inc()
+            if found:
+                row = rows[n]
+                results[n] = _success_result(row.get('url', ''), xpaths[n], row.get('title', ''), fields)
+                results[n].update(validators, unchanged=False, rendered=True)
+    return results
+
+async def fetch_website_data(session: aiohttp.ClientSession, website_data: Dict,
+                             cached: Optional[CachedPage] = None,
+                             stats: Optional[ChangeStats] = None,
+                             strategies: Optional[StrategyStats] = None,
+                             breaker: Optional[CircuitBreaker] = None) -> Dict:
+    """Fetch a single row; see fetch_page."""
+    return (await fetch_page(session, [website_data], cached, stats, strategies, breaker))[0]
+
+def _outcome(result: Dict) -> str:
+    if result.get('success'):
+        return 'unchanged' if result.get('unchanged') else 'success'
+    status = result.get('status') or ''
+    if status.startswith('deferred'):
+        return 'deferred'
+    return 'http_error' if status.startswith('error: HTTP') else 'error'
+
+async def fetch_all(websites_data: List[Dict], scheduler: Optional[CrawlScheduler] = None,
+                    cache: Optional[Dict[str, CachedPage]] = None,
+                    stats: Optional[ChangeStats] = None,
+                    strategies: Optional[StrategyStats] = None,
+                    on_result: Optional[Callable[[Dict], Awaitable[None]]] = None,
+                    coalescing: Optional[CoalesceStats] = None,
+                    rendering: Optional[RenderStats] = None) -> List[Dict]:
+    """Download websites under the crawl limits while parsing runs in the pool.
+
+    With on_result every result is handed over as soon as it is ready instead
+    of being collected into the returned list.
+    """
+    if scheduler is None:
+        scheduler = CrawlScheduler(CRAWL_MAX_CONCURRENCY, limiter=host_limiter)
+    cache = cache or {}
+    stats = stats if stats is not None else ChangeStats()
+    # Пул соединений общий для всех задач процесса: keep-alive и DNS-кэш переживают задачу
+    session = await http_client.get_session()
+
+    async def handle(rows: List[Dict]) -> Optional[List[Dict]]:
+        results = await fetch_page(
+            session, rows, cache.get(rows[0].get('url', '')), stats, strategies,
+            coalescing=coalescing, rendering=rendering,
+        )
+        for result in results:
+            metrics.FETCH_RESULTS.labels(_outcome(result)).inc()
+            if on_result is not None:
+                await on_result(result)
+        return None if on_result is not None else results
+
+    # Строки с одним и тем же адресом обслуживает одна загрузка страницы
+    groups = await scheduler.run(
+        group_rows(websites_data), handle, key=lambda rows: host_of(rows[0].get('url', '')),
+    )
+    return [result for results in groups if results for result in results]
+
+def compact_result(result: Dict) -> Dict:
+    """Keep only the fields the bot shows; the rest is already in the database."""
+    return {name: result[name] for name in RETURNED_FIELDS if name in result}
+
+@celery_app.task(bind=True)
+def process_websites(self, websites_data: List[Dict], job_id: Optional[str] = None):
+    """Process a list of websites and store results in the database as they arrive.
+
+    Without a job_id results are returned in completion order, reduced to
+    RETURNED_FIELDS. With one they are written to crawl_results and only the
+    chunk counters are returned.
+    """
+    # Create database session
+    db = SessionLocal()
+    total = len(websites_data)
+    summaries: List[Dict] = []
+    counters = {'done': 0, 'failed': 0}
+    started = time.perf_counter()
+    metrics.TASK_ROWS.inc(total)
     try:
-        async with session.get(url) as response:
-            if response.status == 200:
-                html = await response.text()
-                price = extract_price(html, xpath)
-                
-                return {
-                    'url': url,
-                    'title': title,
-                    'description': extract_description(html),
-                    'keywords': extract_keywords(html),
-                    'status': 'success',
-                    'success': True,
-                    'price': price
-                }
-            return {
-                'url': url,
-                'title': title,
-                'status': f'error: HTTP {response.status}',
-                'success': False,
-                'error': f'HTTP {response.status}'
-            }
+        # Validators and last values let unchanged pages skip download and parsing
+        cache = load_cache(db, (website.get('url', '') for website in websites_data))
+        change_stats = ChangeStats()
+        strategy_stats = StrategyStats()
+        coalesce_stats = CoalesceStats()
+        render_stats = RenderStats()
+        scheduler = CrawlScheduler(CRAWL_MAX_CONCURRENCY, limiter=host_limiter)
+        # persist() работает в потоке конвейера, где self.request задачи не виден
+        request = self.request
+        store_progress = bool(request.id) and job_id is None and not request.ignore_result
+
+        def persist(results: List[Dict]):
+            # Store results in database: batched upsert keyed on url + xpath
+            with metrics.DB_WRITE_SECONDS.labels('products').time():
+                product_ids = save_results(db, results)
+            with metrics.DB_WRITE_SECONDS.labels('validators').time():
+                save_validators(db, results)
+            if job_id is not None:
+                # Результаты задания и его счётчики фиксируются той же транзакцией
+                with metrics.DB_WRITE_SECONDS.labels('jobs').time():
+                    jobs.record_results(db, job_id, results)
+            with metrics.DB_WRITE_SECONDS.labels('commit').time():
+                db.commit()
+            # Устарели статистика и закэшированные карточки записанных товаров, остальное — нет
+            get_cache().invalidate(product_keys(product_ids))
+            for result in results:
+                counters['done' if result.get('success') else 'failed'] += 1
+            if job_id is None:
+                summaries.extend(compact_result(result) for result in results)
+            # Ход задания хранится в crawl_jobs; результат плановой проверки никто не читает
+            if store_progress:
+                self.update_state(task_id=request.id, state='PROGRESS', meta={
+                    'done': counters['done'] + counters['failed'], 'total': total,
+                })
+
+        # Fetch, parse and persist run concurrently, connected by a bounded queue
+        http_client.run(run_pipeline(
+            lambda put: fetch_all(websites_data, scheduler, cache, change_stats, strategy_stats,
+                                  on_result=put, coalescing=coalesce_stats, rendering=render_stats),
+            persist,
+        ))
+        for host, host_counters in scheduler.stats().items():
+            logger.info(f"Host {host}: {host_counters}")
+        logger.info(f"Change detection: {change_stats.as_dict()}")
+        logger.info(f"Price strategies: {strategy_stats.as_dict()}")
+        logger.info(f"Fetch coalescing: {coalesce_stats.as_dict()}")
+        for reason in ('duplicate_rows', 'in_flight', 'shared'):
+            metrics.FETCHES_SAVED.labels(reason).inc(getattr(coalesce_stats, reason))
+        if render_stats.rendered or render_stats.static_hits:
+            logger.info(f"Rendering: {render_stats.as_dict()}")
+        logger.info(f"Retries and circuit breaker: {host_breaker.summary()}")
+
+        if job_id is not None:
+            return {'job_id': job_id, **counters}
+        return summaries
     except Exception as e:
-        logger.error(f"Error fetching {url}: {str(e)}")
-        return {
-            'url': url,
-            'title': title,
-            'status': f'error: {str(e)}',
-            'success': False,
-            'error': str(e)
-        }
+        logger.error(f"Error processing websites: {str(e)}")
+        if job_id is not None:
+            # Необработанные строки засчитываются как ошибки, иначе задание не завершится
+            db.rollback()
+            lost = total - counters['done'] - counters['failed']
+            jobs.record_lost(db, job_id, lost)
+            db.commit()
+            return {'job_id': job_id, 'done': counters['done'], 'failed': counters['failed'] + lost,
+                    'error': str(e)}
+        return [{'success': False, 'error': str(e)}]
+    finally:
+        db.close()
+        metrics.TASK_SECONDS.observe(time.perf_counter() - started)
 
 @celery_app.task
-def process_websites(websites_data: List[Dict]) -> List[Dict]:
-    """Process a list of websites and store results in the database."""
+def set_job_total(job_id: str, total: int):
+    """Record the number of rows sent for a job once dispatching is over."""
+    db = SessionLocal()
     try:
-        # Create database session
-        db = SessionLocal()
-        
-        # Create aiohttp session
-        async def process_urls():
-            async with aiohttp.ClientSession() as session:
-                tasks = [fetch_website_data(session, website) for website in websites_data]
-                results = await asyncio.gather(*tasks)
-                return results
-        
-        # Run async processing
-        results = asyncio.run(process_urls())
-        
-        # Store results in database
-        for i, result in enumerate(results):
-            # Generate a unique identifier for the row
-            row_id = f"row_{i}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-            
-            # Check if website already exists
-            existing_website = db.query(Website).filter(Website.row_id == row_id).first()
-            
-            if existing_website:
-                # Update existing website
-                existing_website.title = result['title']
-                existing_website.description = result.get('description', '')
-                existing_website.keywords = result.get('keywords', '')
-                existing_website.status = result['status']
-                existing_website.price = result.get('price', '')
-                logger.info(f"Updated existing product: {result['title']}")
-            else:
-                # Create new website
-                website = Website(
-                    row_id=row_id,  # Use row_id as unique identifier
-                    url=result['url'],
-                    title=result['title'],
-                    description=result.get('description', ''),
-                    keywords=result.get('keywords', ''),
-                    status=result['status'],
-                    price=result.get('price', '')
-                )
-                db.add(website)
-                logger.info(f"Added new product: {result['title']}")
-        
+        jobs.set_total(db, job_id, total)
         db.commit()
+    finally:
         db.close()
-        
-        return results
-    except Exception as e:
-        logger.error(f"Error processing websites: {str(e)}")
-        return [{'success': False, 'error': str(e)}]
 
 @celery_app.task
-def get_statistics():
-    """Get statistics about parsed websites."""
+def dispatch_due_products(max_batches: int = 10) -> int:
+    """Send products whose next check is due to process_websites in chunks."""
+    dispatched = 0
     db = SessionLocal()
     try:
-        # Get all websites
-        all_websites = db.query(Website).all()
-        
-        # Count total products (each website is a product)
-        total_products = len(all_websites)
-        
-        # Count successful products and collect prices
-        successful_products = []
-        prices = []
-        
-        for site in all_websites:
-            if site.status == 'success':
-                successful_products.append(site)
-                # Получаем цену напрямую из поля price
-                if site.price:
-                    try:
-                        # Очищаем строку цены от пробелов и заменяем запятую на точку
-                        price_str = site.price.replace(' ', '').replace(',', '.')
-                        # Удаляем символ рубля и любые другие нечисловые символы
-                        price_str = ''.join(c for c in price_str if c.isdigit() or c == '.')
-                        if price_str:
-                            price = float(price_str)
-                            prices.append(price)
-                    except (ValueError, TypeError) as e:
-                        logger.error(f"Error converting price '{site.price}' to float: {str(e)}")
-                        continue
-        
-        products_with_price = len(prices)  # Считаем только те товары, у которых удалось получить цену
-        
-        # Вычисляем среднюю арифметическую цену только если есть товары с ценами
-        if products_with_price > 0:
-            avg_price = sum(prices) / products_with_price
-            avg_price_str = f"{avg_price:,.2f}"
-        else:
-            avg_price_str = None
-        
-        return {
-            'total_products': total_products,
-            'products_with_price': products_with_price,
-            'average_price': avg_price_str
-        }
+        for _ in range(max_batches):
+            due = recrawl.claim_due(db)
+            db.commit()
+            if not due:
+                break
+            for start in range(0, len(due), recrawl.RECRAWL_CHUNK_SIZE):
+                # Итог перепроверки никто не читает: результаты уже в базе
+                process_websites.apply_async(
+                    args=[due[start:start + recrawl.RECRAWL_CHUNK_SIZE]], ignore_result=True,
+                )
+            dispatched += len(due)
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+    if dispatched:
+        logger.info(f"Dispatched {dispatched} products for re-crawl")
+    return dispatched
+
+@celery_app.task
+def get_statistics():
+    """Get statistics about parsed websites, cached until the next write."""
+    def compute():
+        db = SessionLocal()
+        try:
+            # Count, average, min/max and median are computed by the database
+            return collect_statistics(db)
+        finally:
+            db.close()
+
+    cache = get_cache()
+    statistics = cache.get_or_set(STATISTICS_KEY, compute)
+    logger.info(f"Response cache: {cache.stats()}")
+    return statistics
@@ -0,0 +1,146 @@
+"""Prometheus metrics of the crawl pipeline.
+
+Network phases (DNS, connect, time to first byte, download) come from an
+aiohttp TraceConfig attached to the shared session; parse, extraction and
+database timings are observed by main.py around each stage. Under the
+prefork pool every child writes to PROMETHEUS_MULTIPROC_DIR and the parent
+process serves the merged values on WORKER_METRICS_PORT.
+"""
+import asyncio
+import logging
+import os
+import shutil
+from pathlib import Path
+from types import SimpleNamespace
+
+import aiohttp
+from prometheus_client import CollectorRegistry, Counter, Histogram, start_http_server
+from prometheus_client import multiprocess
+
+logger = logging.getLogger(__name__)
+
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', 9100))
+# Метка host даёт разбивку по хостам; при десятках тысяч доменов её лучше выключить
+METRICS_PER_HOST = os.getenv('METRICS_PER_HOST', 'true').lower() == 'true'
+
+NETWORK_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CPU_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+FETCH_PHASE_SECONDS = Histogram(
+    'crawler_fetch_phase_seconds', 'Time spent in each network phase of a page fetch',
+    ['phase', 'host'], buckets=NETWORK_BUCKETS,
+)
+FETCH_RESULTS = Counter(
+    'crawler_fetch_results_total', 'Fetched rows by outcome', ['outcome'],
+)
+FETCH_RETRIES = Counter(
+    'crawler_fetch_retries_total', 'Retried fetch attempts', ['host'],
+)
+DOWNLOAD_BYTES = Counter('crawler_download_bytes_total', 'Body bytes read from product pages')
+DOWNLOAD_STOPS = Counter(
+    'crawler_download_stops_total', 'Downloads cut short, by reason (size_cap, early_stop)', ['reason'],
+)
+FETCHES_SAVED = Counter(
+    'crawler_fetches_saved_total', 'Page downloads avoided by grouping and coalescing, by reason', ['reason'],
+)
+RENDER_SECONDS = Histogram(
+    'crawler_render_seconds', 'Time to render a page in the headless browser',
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60),
+)
+RENDER_RESULTS = Counter(
+    'crawler_render_results_total', 'Rendered pages by outcome (found, not_found, error)', ['outcome'],
+)
+PARSE_SECONDS = Histogram(
+    'crawler_parse_seconds', 'Wall time of parsing and extraction in the parse pool, including queueing',
+    buckets=CPU_BUCKETS,
+)
+EXTRACT_SECONDS = Histogram(
+    'crawler_extract_seconds', 'Time spent in each price extraction strategy', ['strategy'],
+    buckets=CPU_BUCKETS,
+)
+DB_WRITE_SECONDS = Histogram(
+    'crawler_db_write_seconds', 'Time spent writing one pipeline batch, by step', ['step'],
+    buckets=CPU_BUCKETS + (10, 30),
+)
+TASK_SECONDS = Histogram(
+    'crawler_task_seconds', 'Duration of process_websites tasks',
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+TASK_ROWS = Counter('crawler_task_rows_total', 'Rows received by process_websites')
+
+
+def host_label(host: str) -> str:
+    return host if METRICS_PER_HOST else ''
+
+
+def _now() -> float:
+    return asyncio.get_running_loop().time()
+
+
+async def _on_request_start(session, ctx: SimpleNamespace, params):
+    ctx.started = _now()
+    ctx.host = host_label(params.url.host or '')
+
+
+async def _on_dns_start(session, ctx: SimpleNamespace, params):
+    ctx.dns_started = _now()
+
+
+async def _on_dns_end(session, ctx: SimpleNamespace, params):
+    FETCH_PHASE_SECONDS.labels('dns', ctx.host).observe(_now() - ctx.dns_started)
+
+
+async def _on_connection_start(session, ctx: SimpleNamespace, params):
+    ctx.connect_started = _now()
+
+
+async def _on_connection_end(session, ctx: SimpleNamespace, params):
+    # Включает DNS и TLS-рукопожатие; переиспользованные соединения сюда не попадают
+    FETCH_PHASE_SECONDS.labels('connect', ctx.host).observe(_now() - ctx.connect_started)
+
+
+async def _on_request_end(session, ctx: SimpleNamespace, params):
+    # Заголовки ответа получены: время до первого байта от начала запроса
+    FETCH_PHASE_SECONDS.labels('ttfb', ctx.host).observe(_now() - ctx.started)
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    """TraceConfig that records DNS, connect and time-to-first-byte per host."""
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(_on_request_start)
+    config.on_dns_resolvehost_start.append(_on_dns_start)
+    config.on_dns_resolvehost_end.append(_on_dns_end)
+    config.on_connection_create_start.append(_on_connection_start)
+    config.on_connection_create_end.append(_on_connection_end)
+    config.on_request_end.append(_on_request_end)
+    return config
+
+
+def _multiproc_dir() -> str:
+    return os.getenv('PROMETHEUS_MULTIPROC_DIR', '')
+
+
+def reset_multiprocess_dir():
+    """Remove values left by a previous run; call in the parent before forking."""
+    directory = _multiproc_dir()
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        Path(directory).mkdir(parents=True, exist_ok=True)
+
+
+def start_server(port: int = WORKER_METRICS_PORT):
+    """Serve /metrics, merging the values of every pool process when multiprocess mode is on."""
+    if port <= 0:
+        return
+    if _multiproc_dir():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        start_http_server(port, registry=registry)
+    else:
+        start_http_server(port)
+    logger.info(f"Metrics are served on :{port}/metrics")
+
+
+def mark_process_dead(pid: int):
+    if _multiproc_dir():
+        multiprocess.mark_process_dead(pid)
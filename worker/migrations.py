@@ -0,0 +1,174 @@
+"""Idempotent schema upgrades for databases created by older worker versions.
+
+create_all() only creates missing tables, so columns and indexes added to
+existing tables are applied here. Every step inspects the live schema first
+and can safely run on each worker start. Workers and beat start at the same
+time, so on PostgreSQL the whole upgrade runs under an advisory lock.
+"""
+import logging
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.engine import Engine
+
+from extraction import parse_price
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_advisory_lock, общий для всех процессов, меняющих схему
+SCHEMA_LOCK_KEY = 7_246_001
+
+
+def _columns(engine: Engine, table: str):
+    return {column['name'] for column in inspect(engine).get_columns(table)}
+
+
+def websites_identity(engine: Engine):
+    """Replace the synthetic row_id with a unique (url, xpath) product identity."""
+    columns = _columns(engine, 'websites')
+    if 'row_id' not in columns:
+        return
+    logger.info("Migrating websites: row_id -> unique (url, xpath)")
+    with engine.begin() as conn:
+        if 'xpath' not in columns:
+            conn.execute(text("ALTER TABLE websites ADD COLUMN xpath VARCHAR NOT NULL DEFAULT ''"))
+        # Старые строки — журнал запусков; оставляем последнюю запись на каждый товар
+        conn.execute(text(
+            "DELETE FROM websites WHERE id NOT IN "
+            "(SELECT MAX(id) FROM websites GROUP BY url, xpath)"
+        ))
+        conn.execute(text("DROP INDEX IF EXISTS ix_websites_row_id"))
+        conn.execute(text("ALTER TABLE websites DROP COLUMN row_id"))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_websites_url_xpath ON websites (url, xpath)"
+        ))
+
+
+def websites_price_value(engine: Engine, batch_size: int = 5000):
+    """Add the numeric price_value column and backfill it from the price strings."""
+    columns = _columns(engine, 'websites')
+    if 'price_value' in columns or 'price_raw' in columns:
+        return
+    logger.info("Migrating websites: adding numeric price_value")
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE websites ADD COLUMN price_value NUMERIC(14, 2)"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_websites_price_value ON websites (price_value)"
+        ))
+        if engine.dialect.name == 'postgresql':
+            # Одним UPDATE в базе: та же очистка, что и в parse_price
+            conn.execute(text(
+                "UPDATE websites SET price_value = cleaned::numeric FROM ("
+                "  SELECT id, regexp_replace(replace(replace(price, ' ', ''), ',', '.'),"
+                "                            '[^0-9.]', '', 'g') AS cleaned"
+                "  FROM websites WHERE price IS NOT NULL"
+                ") AS parsed "
+                "WHERE websites.id = parsed.id AND parsed.cleaned ~ '^[0-9]+(\\.[0-9]+)?$'"
+                # Как и parse_price, не переносим числа, которые не помещаются в NUMERIC(14, 2)
+                "  AND length(split_part(ltrim(parsed.cleaned, '0'), '.', 1)) <= 12"
+            ))
+            return
+        last_id = 0
+        while True:
+            rows = conn.execute(text(
+                "SELECT id, price FROM websites WHERE id > :last_id AND price IS NOT NULL "
+                "ORDER BY id LIMIT :limit"
+            ), {'last_id': last_id, 'limit': batch_size}).fetchall()
+            if not rows:
+                break
+            updates = [
+                {'id': row.id, 'value': float(value)}
+                for row in rows if (value := parse_price(row.price)) is not None
+            ]
+            if updates:
+                conn.execute(
+                    text("UPDATE websites SET price_value = :value WHERE id = :id"), updates
+                )
+            last_id = rows[-1].id
+
+
+def websites_canonical_price(engine: Engine):
+    """Switch to the shared schema: numeric price, raw price text and currency."""
+    columns = _columns(engine, 'websites')
+    if 'price_raw' in columns:
+        return
+    logger.info("Migrating websites: price -> price_raw, price_value -> price, currency")
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS ix_websites_price_value"))
+        conn.execute(text("ALTER TABLE websites RENAME COLUMN price TO price_raw"))
+        conn.execute(text("ALTER TABLE websites RENAME COLUMN price_value TO price"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_websites_price ON websites (price)"))
+        conn.execute(text("ALTER TABLE websites ADD COLUMN currency VARCHAR(3)"))
+        # Старый парсер находил только цены в рублях
+        conn.execute(text("UPDATE websites SET currency = 'RUB' WHERE price IS NOT NULL"))
+        for column, ddl in (('last_checked', 'TIMESTAMP'), ('created_at', 'TIMESTAMP')):
+            if column not in columns:
+                conn.execute(text(f"ALTER TABLE websites ADD COLUMN {column} {ddl}"))
+
+
+def crawl_results_unique(engine: Engine):
+    """Store each (url, xpath) of a job once, so redelivered chunks are not counted twice."""
+    indexes = {index['name'] for index in inspect(engine).get_indexes('crawl_results')}
+    if 'uq_crawl_results_job_url_xpath' in indexes:
+        return
+    logger.info("Migrating crawl_results: unique (job_id, url, xpath)")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "DELETE FROM crawl_results WHERE id NOT IN "
+            "(SELECT MIN(id) FROM crawl_results GROUP BY job_id, url, xpath)"
+        ))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_crawl_results_job_url_xpath "
+            "ON crawl_results (job_id, url, xpath)"
+        ))
+
+
+MIGRATIONS = [
+    websites_identity,
+    websites_price_value,
+    websites_canonical_price,
+    crawl_results_unique,
+]
+
+
+@contextmanager
+def schema_lock(engine: Engine) -> Iterator[None]:
+    """Let one process at a time change the schema; a no-op outside PostgreSQL."""
+    if engine.dialect.name != 'postgresql':
+        yield
+        return
+    with engine.connect() as conn:
+        # Блокировка уровня сессии: переживает commit и держится, пока открыто соединение
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': SCHEMA_LOCK_KEY})
+        conn.commit()
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': SCHEMA_LOCK_KEY})
+            conn.commit()
+
+
+def upgrade(engine: Engine, metadata: Optional[MetaData] = None):
+    """Create missing tables of metadata, then apply every pending schema upgrade in order.
+
+    A process that waited for the lock finds the work done: every step checks
+    the schema again.
+    """
+    with schema_lock(engine):
+        if metadata is not None:
+            metadata.create_all(bind=engine)
+        for migration in MIGRATIONS:
+            migration(engine)
+
+
+if __name__ == '__main__':
+    import os
+
+    from sqlalchemy import create_engine
+
+    from models import Base
+
+    logging.basicConfig(level=logging.INFO)
+    upgrade(create_engine(os.getenv('DATABASE_URL', 'postgresql://postgres:postgres@db:5432/postgres')),
+            Base.metadata)
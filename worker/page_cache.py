@@ -0,0 +1,120 @@
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import PageValidator, Website, upsert_insert
+
+logger = logging.getLogger(__name__)
+
+# Поля товара, которые переиспользуются, если страница не изменилась
+REUSED_FIELDS = ('title', 'description', 'keywords', 'price', 'price_raw', 'currency')
+
+LOOKUP_BATCH_SIZE = 1000
+
+
+@dataclass
+class CachedPage:
+    """Validators of the last download of a URL and the values extracted from it."""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+    fields: Dict[str, Dict] = field(default_factory=dict)  # xpath -> extracted values
+
+    def headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+@dataclass
+class ChangeStats:
+    """Hit/miss counters of change detection for one crawl."""
+    not_modified: int = 0   # 304, тело не скачивалось
+    same_hash: int = 0      # 200, но хэш совпал, разбор пропущен
+    changed: int = 0        # 200, страница изменилась
+    uncached: int = 0       # нет сохранённых значений для этой пары url + xpath
+
+    @property
+    def hits(self) -> int:
+        return self.not_modified + self.same_hash
+
+    @property
+    def misses(self) -> int:
+        return self.changed + self.uncached
+
+    def as_dict(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            'not_modified': self.not_modified,
+            'same_hash': self.same_hash,
+            'changed': self.changed,
+            'uncached': self.uncached,
+            'hit_ratio': round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def _batches(values: List[str]):
+    for start in range(0, len(values), LOOKUP_BATCH_SIZE):
+        yield values[start:start + LOOKUP_BATCH_SIZE]
+
+
+def load_cache(db: Session, urls: Iterable[str]) -> Dict[str, CachedPage]:
+    """Load validators and last successful values for the given URLs."""
+    urls = sorted({url for url in urls if url})
+    cache: Dict[str, CachedPage] = {}
+    for batch in _batches(urls):
+        for validator in db.execute(
+            select(PageValidator).where(PageValidator.url.in_(batch))
+        ).scalars():
+            cache[validator.url] = CachedPage(
+                etag=validator.etag,
+                last_modified=validator.last_modified,
+                content_hash=validator.content_hash,
+            )
+        rows = db.execute(
+            select(Website).where(Website.url.in_(batch), Website.status == 'success')
+        ).scalars()
+        for website in rows:
+            cached = cache.get(website.url)
+            if cached is not None:
+                cached.fields[website.xpath] = {
+                    name: getattr(website, name) for name in REUSED_FIELDS
+                }
+    return cache
+
+
+def save_validators(db: Session, results: Iterable[Dict]):
+    """Upsert ETag, Last-Modified and content hash of successfully fetched pages."""
+    checked_at = datetime.utcnow()
+    rows = {}
+    for result in results:
+        if result.get('success') and result.get('content_hash'):
+            rows[result['url']] = {
+                'url': result['url'],
+                'etag': result.get('etag'),
+                'last_modified': result.get('last_modified'),
+                'content_hash': result['content_hash'],
+                'checked_at': checked_at,
+            }
+    if not rows:
+        return
+    stmt = upsert_insert(PageValidator, db.get_bind().dialect.name)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['url'],
+        set_={c: stmt.excluded[c] for c in ('etag', 'last_modified', 'content_hash', 'checked_at')},
+    )
+    values = list(rows.values())
+    for start in range(0, len(values), LOOKUP_BATCH_SIZE):
+        db.execute(stmt, values[start:start + LOOKUP_BATCH_SIZE])
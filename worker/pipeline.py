@@ -0,0 +1,67 @@
+"""Bounded fetch → persist pipeline.
+
+Fetch coroutines hand finished results to a bounded asyncio.Queue; a single
+consumer drains it in small batches and passes each batch to a blocking sink
+(the database writer) in a thread. When the sink falls behind, the queue fills
+up and fetchers wait on put(), so the number of results held in memory depends
+on PIPELINE_QUEUE_SIZE rather than on the number of URLs in the task.
+"""
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, List
+
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 50))
+# Сколько результатов записывать одной транзакцией
+PIPELINE_FLUSH_SIZE = int(os.getenv('PIPELINE_FLUSH_SIZE', 50))
+
+_DONE = object()
+
+Put = Callable[[Any], Awaitable[None]]
+
+
+async def run_pipeline(produce: Callable[[Put], Awaitable[Any]],
+                       sink: Callable[[List[Any]], None],
+                       queue_size: int = PIPELINE_QUEUE_SIZE,
+                       flush_size: int = PIPELINE_FLUSH_SIZE):
+    """Run `produce(put)` while `sink` consumes what it puts, in batches.
+
+    A batch is whatever is already waiting in the queue (at most flush_size
+    items), so results are written as soon as they arrive and never wait for
+    a slow URL. An exception in the sink stops the producer and is re-raised.
+    An exception in the producer is re-raised once the sink has written what
+    was already queued, so the sink is never left running in its thread.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+
+    async def consume():
+        finished = False
+        while not finished:
+            batch = [await queue.get()]
+            while len(batch) < flush_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            if batch[-1] is _DONE:
+                batch.pop()
+                finished = True
+            if batch:
+                # Запись в базу синхронная, поэтому уходит в поток
+                await asyncio.to_thread(sink, batch)
+
+    producer = asyncio.create_task(produce(queue.put))
+    consumer = asyncio.create_task(consume())
+    await asyncio.wait({producer, consumer}, return_when=asyncio.FIRST_COMPLETED)
+
+    if consumer.done():
+        # Потребитель завершается раньше производителя только с ошибкой
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+        consumer.result()
+    # Потребителя не отменяем: его поток нельзя прервать посреди записи в базу,
+    # а после ошибки вызывающий код откатывает ту же сессию
+    stop = asyncio.ensure_future(queue.put(_DONE))
+    await asyncio.wait({stop, consumer}, return_when=asyncio.FIRST_COMPLETED)
+    if not stop.done():
+        # Потребитель упал при полной очереди: метку конца читать уже некому
+        stop.cancel()
+    await asyncio.gather(consumer, return_exceptions=True)
+    producer.result()
+    consumer.result()
@@ -0,0 +1,126 @@
+"""Adaptive re-crawl schedule.
+
+Every stored product gets a crawl_schedule row. The interval halves when the
+price changes and grows by RECRAWL_BACKOFF while it stays the same, so volatile
+products are checked often and stable ones rarely.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from models import CrawlSchedule, Website, upsert_insert
+
+logger = logging.getLogger(__name__)
+
+RECRAWL_DEFAULT_INTERVAL = int(os.getenv('RECRAWL_DEFAULT_INTERVAL', 24 * 3600))
+RECRAWL_MIN_INTERVAL = int(os.getenv('RECRAWL_MIN_INTERVAL', 3600))
+RECRAWL_MAX_INTERVAL = int(os.getenv('RECRAWL_MAX_INTERVAL', 14 * 24 * 3600))
+RECRAWL_BACKOFF = float(os.getenv('RECRAWL_BACKOFF', 1.5))
+# Сколько товаров забирает один проход диспетчера и по сколько строк в задаче
+RECRAWL_BATCH_SIZE = int(os.getenv('RECRAWL_BATCH_SIZE', 1000))
+RECRAWL_CHUNK_SIZE = int(os.getenv('RECRAWL_CHUNK_SIZE', 200))
+RECRAWL_TICK_SECONDS = float(os.getenv('RECRAWL_TICK_SECONDS', 60))
+
+LOOKUP_BATCH_SIZE = 1000
+
+# (product_id, price, success)
+Checked = Tuple[int, Optional[Decimal], bool]
+
+
+def next_interval(interval: int, changed: bool) -> int:
+    """Shorten the interval after a price change, stretch it otherwise."""
+    if changed:
+        interval = interval / 2
+    else:
+        interval = interval * RECRAWL_BACKOFF
+    return int(min(RECRAWL_MAX_INTERVAL, max(RECRAWL_MIN_INTERVAL, interval)))
+
+
+def _price_changed(old: Optional[Decimal], new: Optional[Decimal]) -> bool:
+    if old is None or new is None:
+        return old is not new
+    return Decimal(old) != Decimal(new)
+
+
+def reschedule(db: Session, checked: List[Checked], now: Optional[datetime] = None):
+    """Update the schedule of products that were just crawled."""
+    if not checked:
+        return
+    now = now or datetime.utcnow()
+    ids = [product_id for product_id, _, _ in checked]
+    existing: Dict[int, CrawlSchedule] = {}
+    for start in range(0, len(ids), LOOKUP_BATCH_SIZE):
+        for row in db.execute(
+            select(CrawlSchedule).where(CrawlSchedule.product_id.in_(ids[start:start + LOOKUP_BATCH_SIZE]))
+        ).scalars():
+            existing[row.product_id] = row
+
+    rows = []
+    for product_id, price, success in checked:
+        current = existing.get(product_id)
+        if current is None:
+            interval, unchanged, last_price = RECRAWL_DEFAULT_INTERVAL, 0, price
+        elif not success:
+            # Ошибку не считаем изменением цены, но перепроверяем пораньше
+            interval, unchanged, last_price = (
+                current.interval_seconds, current.unchanged_checks, current.last_price
+            )
+        else:
+            changed = _price_changed(current.last_price, price)
+            interval = next_interval(current.interval_seconds, changed)
+            unchanged = 0 if changed else current.unchanged_checks + 1
+            last_price = price
+        delay = interval if success else min(interval, RECRAWL_MIN_INTERVAL)
+        rows.append({
+            'product_id': product_id,
+            'next_check_at': now + timedelta(seconds=delay),
+            'interval_seconds': interval,
+            'unchanged_checks': unchanged,
+            'last_price': last_price,
+        })
+
+    stmt = upsert_insert(CrawlSchedule, db.get_bind().dialect.name)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['product_id'],
+        set_={c: stmt.excluded[c] for c in
+              ('next_check_at', 'interval_seconds', 'unchanged_checks', 'last_price')},
+    )
+    for start in range(0, len(rows), LOOKUP_BATCH_SIZE):
+        db.execute(stmt, rows[start:start + LOOKUP_BATCH_SIZE])
+
+
+def claim_due(db: Session, limit: int = RECRAWL_BATCH_SIZE,
+              now: Optional[datetime] = None) -> List[Dict]:
+    """Take up to `limit` due products and push their next check one interval ahead.
+
+    On PostgreSQL concurrent dispatchers skip rows already locked by each other.
+    """
+    now = now or datetime.utcnow()
+    query = (
+        select(CrawlSchedule.product_id, CrawlSchedule.interval_seconds)
+        .where(CrawlSchedule.next_check_at <= now)
+        .order_by(CrawlSchedule.next_check_at)
+        .limit(limit)
+    )
+    if db.get_bind().dialect.name == 'postgresql':
+        query = query.with_for_update(skip_locked=True)
+    due = db.execute(query).all()
+    if not due:
+        return []
+
+    # Пока товар в работе, он не должен попасть в следующую выборку
+    db.execute(
+        update(CrawlSchedule),
+        [{'product_id': product_id, 'next_check_at': now + timedelta(seconds=interval)}
+         for product_id, interval in due],
+    )
+    ids = [product_id for product_id, _ in due]
+    websites = db.execute(
+        select(Website.url, Website.xpath, Website.title).where(Website.id.in_(ids))
+    ).all()
+    return [{'url': url, 'xpath': xpath, 'title': title} for url, xpath, title in websites]
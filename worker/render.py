@@ -0,0 +1,229 @@
+"""Optional headless-browser rendering for pages whose price is set by JavaScript.
+
+A page goes to the browser only when static extraction found no price and its
+host has opted in through RENDER_DOMAINS. Each worker process keeps one
+Chromium with up to RENDER_CONCURRENCY reusable contexts; images, fonts,
+media and stylesheets are not loaded. Playwright is an optional dependency
+(the worker's "render" extra): without it, or with RENDER_DOMAINS empty,
+this tier is off.
+"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import metrics
+from extraction import compile_selector
+
+try:
+    from playwright.async_api import Error as PlaywrightError, async_playwright
+except ImportError:  # браузерный рендеринг не установлен
+    async_playwright = None
+    PlaywrightError = Exception
+
+logger = logging.getLogger(__name__)
+
+# Хосты через запятую; поддомены включаются вместе с доменом, '*' — все хосты
+RENDER_DOMAINS = os.getenv('RENDER_DOMAINS', '')
+RENDER_CONCURRENCY = int(os.getenv('RENDER_CONCURRENCY', 2))
+RENDER_TIMEOUT = float(os.getenv('RENDER_TIMEOUT', 20))
+RENDER_BLOCKED_RESOURCES = os.getenv('RENDER_BLOCKED_RESOURCES', 'image,media,font,stylesheet')
+# Контекст пересоздаётся после стольких страниц, чтобы не копилась память браузера
+RENDER_CONTEXT_MAX_PAGES = int(os.getenv('RENDER_CONTEXT_MAX_PAGES', 100))
+# Сколько секунд не пытаться снова запустить браузер после неудачного запуска
+RENDER_RETRY_AFTER = 60.0
+
+# Ждём, пока в элементе цены появится хотя бы одна цифра
+PRICE_READY_JS = """
+([selector, isXpath]) => {
+    const node = isXpath
+        ? document.evaluate(selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue
+        : document.querySelector(selector);
+    return !!node && /\\d/.test(node.textContent || '');
+}
+"""
+
+
+def _split(value: str) -> List[str]:
+    return [item.strip().lower() for item in value.split(',') if item.strip()]
+
+
+def opted_in(host: str, domains: Sequence[str] = tuple(_split(RENDER_DOMAINS))) -> bool:
+    """Whether pages of host may be rendered."""
+    if async_playwright is None or not host:
+        return False
+    return any(domain == '*' or host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+@dataclass
+class RenderStats:
+    """How often one crawl needed the browser and how often it helped."""
+    static_hits: int = 0   # цена найдена без браузера на включённых хостах
+    rendered: int = 0
+    found: int = 0         # браузер нашёл цену, которой не было в HTML
+    errors: int = 0
+    seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        attempts = self.static_hits + self.rendered
+        return {
+            'static_hits': self.static_hits,
+            'rendered': self.rendered,
+            'found': self.found,
+            'errors': self.errors,
+            'hit_rate': round(self.found / self.rendered, 3) if self.rendered else 0.0,
+            'render_share': round(self.rendered / attempts, 3) if attempts else 0.0,
+            'avg_seconds': round(self.seconds / self.rendered, 3) if self.rendered else 0.0,
+        }
+
+
+class RenderPool:
+    """Chromium with a fixed number of reusable browser contexts, started on first use.
+
+    Lives on the worker's event loop.
+    """
+
+    def __init__(self, concurrency: int = RENDER_CONCURRENCY, timeout: float = RENDER_TIMEOUT,
+                 blocked: Sequence[str] = tuple(_split(RENDER_BLOCKED_RESOURCES)),
+                 max_pages: int = RENDER_CONTEXT_MAX_PAGES):
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.blocked = frozenset(blocked)
+        self.max_pages = max_pages
+        self._playwright = None
+        self._browser = None
+        self._contexts: Optional[asyncio.Queue] = None
+        self._pages_served: Dict[int, int] = {}
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._down_until = 0.0
+
+    async def _block_heavy(self, route):
+        if route.request.resource_type in self.blocked:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _new_context(self):
+        context = await self._browser.new_context(java_script_enabled=True)
+        await context.route('**/*', self._block_heavy)
+        self._pages_served[id(context)] = 0
+        return context
+
+    async def _start(self):
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return
+            if time.monotonic() < self._down_until:
+                raise RuntimeError("headless browser is unavailable")
+            # Браузер упал: поднимаем новый вместо того, чтобы отдавать ошибки до перезапуска воркера
+            await self.close()
+            try:
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True)
+                self._contexts = asyncio.Queue()
+                for _ in range(self.concurrency):
+                    self._contexts.put_nowait(await self._new_context())
+            except Exception:
+                self._down_until = time.monotonic() + RENDER_RETRY_AFTER
+                await self.close()
+                raise
+            logger.info(f"Render pool started with {self.concurrency} contexts")
+
+    async def _wait_for_price(self, page, selectors: Sequence[str], deadline: float):
+        for selector in selectors:
+            strategy, compiled = compile_selector(selector)
+            remaining = deadline - time.monotonic()
+            if compiled is None or remaining <= 0:
+                continue
+            try:
+                await page.wait_for_function(PRICE_READY_JS, arg=[selector, strategy == 'xpath'],
+                                             timeout=remaining * 1000)
+            except PlaywrightError:
+                # Берём то, что успело отрисоваться: эвристика ещё может найти цену
+                pass
+
+    async def render(self, url: str, selectors: Sequence[str]) -> str:
+        """HTML of the page after its scripts have filled in the price elements."""
+        if self._browser is None or not self._browser.is_connected():
+            await self._start()
+        context = await self._contexts.get()
+        try:
+            deadline = time.monotonic() + self.timeout
+            page = await context.new_page()
+            try:
+                await page.goto(url, wait_until='domcontentloaded', timeout=self.timeout * 1000)
+                await self._wait_for_price(page, selectors, deadline)
+                return await page.content()
+            finally:
+                await page.close()
+        finally:
+            await self._release(context)
+
+    async def _release(self, context):
+        served = self._pages_served.pop(id(context), 0) + 1
+        if context.browser is not self._browser:
+            # Контекст упавшего браузера: новый браузер создал свои
+            return
+        if served >= self.max_pages:
+            await context.close()
+            context = await self._new_context()
+            served = 0
+        self._pages_served[id(context)] = served
+        self._contexts.put_nowait(context)
+
+    async def close(self):
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except PlaywrightError:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+_pool: Optional[RenderPool] = None
+_pid: Optional[int] = None
+
+
+def get_pool() -> RenderPool:
+    """Process-wide render pool; a forked child gets its own browser."""
+    global _pool, _pid
+    if _pool is None or _pid != os.getpid():
+        _pool = RenderPool()
+        _pid = os.getpid()
+    return _pool
+
+
+def is_running() -> bool:
+    return _pool is not None and _pid == os.getpid() and _pool._browser is not None
+
+
+async def close_pool():
+    if _pool is not None and _pid == os.getpid():
+        await _pool.close()
+
+
+async def render_page(url: str, selectors: Sequence[str],
+                      stats: Optional[RenderStats] = None) -> Optional[str]:
+    """Rendered HTML of a page, or None if the browser failed."""
+    stats = stats if stats is not None else RenderStats()
+    started = time.perf_counter()
+    try:
+        html = await get_pool().render(url, selectors)
+    except Exception as e:
+        stats.errors += 1
+        metrics.RENDER_RESULTS.labels('error').inc()
+        logger.warning(f"Error rendering {url}: {str(e)}")
+        return None
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.rendered += 1
+        stats.seconds += elapsed
+        metrics.RENDER_SECONDS.observe(elapsed)
+    return html
@@ -0,0 +1,142 @@
+"""Retry classification, backoff and a per-host circuit breaker for page fetches.
+
+Transient failures (timeouts, dropped connections, 5xx, 408/425/429) are
+retried with exponential backoff and full jitter; 429/503 honour Retry-After.
+A host that keeps failing is cut off for BREAKER_COOLDOWN seconds, so its
+remaining URLs fail immediately instead of holding connection slots, and
+then a single probe request decides whether it is back.
+"""
+import asyncio
+import email.utils
+import os
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import aiohttp
+
+RETRY_ATTEMPTS = int(os.getenv('RETRY_ATTEMPTS', 2))
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', 0.5))
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', 10))
+# Более долгий Retry-After не ждём: строка уходит на следующую проверку по расписанию
+RETRY_AFTER_MAX = float(os.getenv('RETRY_AFTER_MAX', 30))
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', 5))
+BREAKER_COOLDOWN = float(os.getenv('BREAKER_COOLDOWN', 60))
+
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+def is_retryable_status(status: int) -> bool:
+    return status in RETRYABLE_STATUSES
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Timeouts and connection-level failures are transient; bad URLs and TLS errors are not."""
+    if isinstance(error, (aiohttp.ClientConnectorCertificateError, aiohttp.ClientSSLError,
+                          aiohttp.InvalidURL)):
+        return False
+    return isinstance(error, (asyncio.TimeoutError, aiohttp.ClientConnectionError,
+                              aiohttp.ClientPayloadError))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        moment = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+    """Delay before retry number attempt + 1, or None if the server asks for too long a pause."""
+    if retry_after is not None:
+        return retry_after if retry_after <= RETRY_AFTER_MAX else None
+    # Full jitter: параллельные повторы к одному хосту не совпадают по времени
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+@dataclass
+class HostCircuit:
+    """Breaker state of a single host."""
+    failures: int = 0        # подряд, сбрасывается успешным ответом
+    opened_until: float = 0.0
+    probing: bool = False
+    trips: int = 0
+    rejected: int = 0
+    retries: int = 0
+
+
+class CircuitBreaker:
+    """Per-host breaker: closed → open after BREAKER_FAILURES consecutive failures → half-open probe.
+
+    Used from the worker's event loop thread only, so it needs no locking.
+    """
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.failure_threshold = max(1, failures)
+        self.cooldown = cooldown
+        self.hosts: Dict[str, HostCircuit] = {}
+
+    def _host(self, host: str) -> HostCircuit:
+        circuit = self.hosts.get(host)
+        if circuit is None:
+            circuit = self.hosts[host] = HostCircuit()
+        return circuit
+
+    def allow(self, host: str) -> bool:
+        """Whether a request to host may go out now."""
+        circuit = self._host(host)
+        if circuit.failures < self.failure_threshold:
+            return True
+        if time.monotonic() < circuit.opened_until or circuit.probing:
+            circuit.rejected += 1
+            return False
+        # Полуоткрытое состояние: пропускаем один пробный запрос
+        circuit.probing = True
+        return True
+
+    def record_success(self, host: str):
+        circuit = self._host(host)
+        circuit.failures = 0
+        circuit.probing = False
+
+    def record_failure(self, host: str):
+        circuit = self._host(host)
+        circuit.failures += 1
+        if circuit.probing or circuit.failures == self.failure_threshold:
+            circuit.trips += 1
+            circuit.opened_until = time.monotonic() + self.cooldown
+        circuit.probing = False
+
+    def release_probe(self, host: str):
+        """Let another request probe the host when this probe ended without an answer."""
+        self._host(host).probing = False
+
+    def record_retry(self, host: str):
+        self._host(host).retries += 1
+
+    def is_probing(self, host: str) -> bool:
+        circuit = self.hosts.get(host)
+        return circuit is not None and circuit.probing
+
+    def is_open(self, host: str) -> bool:
+        circuit = self.hosts.get(host)
+        return circuit is not None and circuit.failures >= self.failure_threshold
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            'open_hosts': sum(1 for host in self.hosts if self.is_open(host)),
+            'trips': sum(c.trips for c in self.hosts.values()),
+            'rejected': sum(c.rejected for c in self.hosts.values()),
+            'retries': sum(c.retries for c in self.hosts.values()),
+        }
@@ -0,0 +1,171 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+def host_of(url: str) -> str:
+    """Return the lowercase host part of a URL ('' for malformed URLs)."""
+    try:
+        return (urlsplit(url).hostname or '').lower()
+    except ValueError:
+        return ''
+
+
+@dataclass
+class HostState:
+    """Queue and counters of a single host within one crawl."""
+    pending: Deque[Tuple[int, Any]] = field(default_factory=deque)
+    queued: int = 0
+    in_flight: int = 0
+    completed: int = 0
+
+
+class HostLimiter:
+    """Per-host concurrency and requests-per-second budget shared by every crawl of a process.
+
+    All tasks of a worker process run on one event loop, so one limiter keeps
+    concurrent chunks of the same upload from each spending the full budget.
+    Separate worker processes and containers do not share it: the load a host
+    sees is the limit times the number of worker processes.
+    """
+
+    def __init__(self, per_host_concurrency: int = 4, per_host_rps: float = 0.0):
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self.min_interval = 1.0 / per_host_rps if per_host_rps > 0 else 0.0
+        self.in_flight: Dict[str, int] = {}
+        self.next_slot: Dict[str, float] = {}
+        self._cond: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def condition(self) -> asyncio.Condition:
+        """Condition every crawl waits on for a free host slot."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Новый цикл событий (например, после fork): слоты прежнего цикла не действуют
+            self._loop = loop
+            self._cond = asyncio.Condition()
+            self.in_flight.clear()
+            self.next_slot.clear()
+        return self._cond
+
+    def try_acquire(self, host: str, now: float) -> Tuple[bool, Optional[float]]:
+        """Take a slot of the host; otherwise return how long until its rate budget allows one.
+
+        Must be called with condition() held.
+        """
+        if self.in_flight.get(host, 0) >= self.per_host_concurrency:
+            return False, None
+        next_slot = self.next_slot.get(host, 0.0)
+        if next_slot > now:
+            return False, next_slot - now
+        self.in_flight[host] = self.in_flight.get(host, 0) + 1
+        if self.min_interval:
+            self.next_slot[host] = now + self.min_interval
+        return True, None
+
+    def release(self, host: str):
+        """Free a slot of the host; must be called with condition() held."""
+        in_flight = self.in_flight[host] - 1
+        if in_flight:
+            self.in_flight[host] = in_flight
+        else:
+            del self.in_flight[host]
+            if self.next_slot.get(host, 0.0) <= self._loop.time():
+                self.next_slot.pop(host, None)
+        self._cond.notify_all()
+
+
+class CrawlScheduler:
+    """Run coroutines over items with global and per-host limits.
+
+    Items are grouped by host and taken round-robin, so a host with thousands
+    of rows cannot starve the others. A host is skipped while it is at its
+    concurrency limit or its requests-per-second budget is spent. The host
+    limits come from a HostLimiter, which crawls of one process can share;
+    without one the scheduler gets a limiter of its own.
+    """
+
+    def __init__(self, max_concurrency: int = 100, per_host_concurrency: int = 4,
+                 per_host_rps: float = 0.0, limiter: Optional[HostLimiter] = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limiter = limiter if limiter is not None else HostLimiter(per_host_concurrency, per_host_rps)
+        self.hosts: Dict[str, HostState] = {}
+        self._ring: Deque[str] = deque()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Queued, in-flight and completed requests per host."""
+        return {
+            host: {'queued': state.queued, 'in_flight': state.in_flight,
+                   'completed': state.completed}
+            for host, state in self.hosts.items()
+        }
+
+    def _enqueue(self, items: List[Any], key: Callable[[Any], str]):
+        for index, item in enumerate(items):
+            host = key(item)
+            state = self.hosts.get(host)
+            if state is None:
+                state = self.hosts[host] = HostState()
+            if not state.pending:
+                self._ring.append(host)
+            state.pending.append((index, item))
+            state.queued += 1
+
+    async def _acquire(self) -> Optional[Tuple[str, int, Any]]:
+        loop = asyncio.get_running_loop()
+        cond = self.limiter.condition()
+        async with cond:
+            while self._ring:
+                now = loop.time()
+                wait = None
+                for _ in range(len(self._ring)):
+                    host = self._ring[0]
+                    self._ring.rotate(-1)
+                    acquired, delay = self.limiter.try_acquire(host, now)
+                    if not acquired:
+                        if delay is not None:
+                            wait = delay if wait is None else min(wait, delay)
+                        continue
+                    state = self.hosts[host]
+                    index, item = state.pending.popleft()
+                    if not state.pending:
+                        self._ring.remove(host)
+                    state.queued -= 1
+                    state.in_flight += 1
+                    return host, index, item
+                # Все хосты заняты или исчерпали лимит запросов в секунду
+                try:
+                    await asyncio.wait_for(cond.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+            return None
+
+    async def _release(self, host: str):
+        async with self.limiter.condition():
+            state = self.hosts[host]
+            state.in_flight -= 1
+            state.completed += 1
+            self.limiter.release(host)
+
+    async def run(self, items: List[Any], handler: Callable[[Any], Awaitable[Any]],
+                  key: Callable[[Any], str]) -> List[Any]:
+        """Apply handler to every item and return results in input order."""
+        self._enqueue(items, key)
+        results: List[Any] = [None] * len(items)
+
+        async def worker():
+            while True:
+                acquired = await self._acquire()
+                if acquired is None:
+                    return
+                host, index, item = acquired
+                try:
+                    results[index] = await handler(item)
+                finally:
+                    await self._release(host)
+
+        workers = min(self.max_concurrency, len(items))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        return results
@@ -1,3 +0,0 @@
-"""
-Worker service package for website parsing
-""" 
\ No newline at end of file
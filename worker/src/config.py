@@ -1,12 +0,0 @@
-from pydantic_settings import BaseSettings
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-class Settings(BaseSettings):
-    REDIS_URL: str = os.getenv("REDIS_URL", "redis://redis:6379/0")
-    DATABASE_URL: str = os.getenv("DATABASE_URL", "postgresql://user:password@db:5432/dbname")
-
-    class Config:
-        env_file = ".env" 
\ No newline at end of file
@@ -0,0 +1,179 @@
+import csv
+import io
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import case, insert
+from sqlalchemy.orm import Session
+
+import price_statistics
+import recrawl
+from models import PriceObservation, Website, upsert_insert
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT ... ON CONFLICT statement
+DB_BATCH_SIZE = int(os.getenv('DB_BATCH_SIZE', 1000))
+# Starting from this many rows PostgreSQL loads them with COPY through a staging table
+DB_COPY_THRESHOLD = int(os.getenv('DB_COPY_THRESHOLD', 20000))
+
+UPSERT_COLUMNS = [
+    'url', 'xpath', 'title', 'description', 'keywords', 'status',
+    'price', 'price_raw', 'currency', 'last_checked',
+]
+UPDATE_COLUMNS = [c for c in UPSERT_COLUMNS if c not in ('url', 'xpath')]
+# Неудачная проверка не затирает значения последней удачной: ошибка остаётся в price_observations
+SUCCESS_ONLY_COLUMNS = ['description', 'keywords', 'price', 'price_raw', 'currency']
+# Отложенная строка вообще не проверялась, поэтому её статус не меняется
+DEFERRED_PREFIX = 'deferred'
+
+
+def result_to_row(result: Dict, checked_at: datetime) -> Dict:
+    """Map a fetch result onto the websites columns."""
+    return {
+        'url': result['url'],
+        'xpath': result.get('xpath') or '',
+        'title': result.get('title', ''),
+        'description': result.get('description', ''),
+        'keywords': result.get('keywords', ''),
+        'status': result.get('status', ''),
+        'price': result.get('price'),
+        'price_raw': result.get('price_raw'),
+        'currency': result.get('currency'),
+        'last_checked': checked_at,
+    }
+
+
+def _unique_rows(results: Iterable[Dict]) -> List[Dict]:
+    # Одна и та же пара url+xpath не может обновляться дважды в одном INSERT
+    checked_at = datetime.utcnow()
+    rows = {}
+    for result in results:
+        if not result.get('url'):
+            continue
+        row = result_to_row(result, checked_at)
+        rows[(row['url'], row['xpath'])] = row
+    return list(rows.values())
+
+
+def _upsert_statement(dialect_name: str):
+    stmt = upsert_insert(Website, dialect_name)
+    succeeded = stmt.excluded.status == 'success'
+    set_ = {column: stmt.excluded[column] for column in UPDATE_COLUMNS}
+    for column in SUCCESS_ONLY_COLUMNS:
+        set_[column] = case((succeeded, stmt.excluded[column]), else_=getattr(Website, column))
+    set_['status'] = case(
+        (stmt.excluded.status.startswith(DEFERRED_PREFIX), Website.status), else_=stmt.excluded.status,
+    )
+    return stmt.on_conflict_do_update(index_elements=['url', 'xpath'], set_=set_)
+
+
+def _copy_update_clause() -> str:
+    """SET clause of the COPY merge, with the same rules as _upsert_statement."""
+    updates = []
+    for column in UPDATE_COLUMNS:
+        if column in SUCCESS_ONLY_COLUMNS:
+            value = (f"CASE WHEN EXCLUDED.status = 'success' "
+                     f"THEN EXCLUDED.{column} ELSE websites.{column} END")
+        elif column == 'status':
+            value = (f"CASE WHEN EXCLUDED.status LIKE '{DEFERRED_PREFIX}%' "
+                     f"THEN websites.status ELSE EXCLUDED.status END")
+        else:
+            value = f"EXCLUDED.{column}"
+        updates.append(f"{column} = {value}")
+    return ', '.join(updates)
+
+
+def _copy_upsert(db: Session, rows: List[Dict]) -> List[Tuple[int, str, str]]:
+    """Load rows with COPY into a temp table, then merge them in one statement."""
+    columns = ', '.join(UPSERT_COLUMNS)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if row[c] is None else row[c] for c in UPSERT_COLUMNS])
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS websites_stage "
+            "(url text, xpath text, title text, description text, "
+            "keywords text, status text, price numeric, price_raw text, "
+            "currency text, last_checked timestamp) ON COMMIT DROP"
+        )
+        cursor.execute("TRUNCATE websites_stage")
+        cursor.copy_expert(
+            f"COPY websites_stage ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+        cursor.execute(
+            f"INSERT INTO websites ({columns}) SELECT {columns} FROM websites_stage "
+            f"ON CONFLICT (url, xpath) DO UPDATE SET {_copy_update_clause()} "
+            f"RETURNING id, url, xpath"
+        )
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def _product_ids(rows: List[Dict], keys: List[Tuple[int, str, str]]) -> List[int]:
+    """Product id of every row, in row order."""
+    product_ids = {(url, xpath): product_id for product_id, url, xpath in keys}
+    return [product_ids[(row['url'], row['xpath'])] for row in rows]
+
+
+def _record_observations(db: Session, rows: List[Dict], keys: List[Tuple[int, str, str]],
+                         batch_size: int):
+    """Append one price observation per stored product."""
+    observations = [
+        {
+            'product_id': product_id,
+            'observed_at': row['last_checked'],
+            'price': row['price'],
+            'currency': row['currency'],
+            'status': row['status'],
+        }
+        for product_id, row in zip(_product_ids(rows, keys), rows)
+    ]
+    for start in range(0, len(observations), batch_size):
+        db.execute(insert(PriceObservation), observations[start:start + batch_size])
+
+
+def save_results(db: Session, results: Iterable[Dict], batch_size: int = DB_BATCH_SIZE) -> List[int]:
+    """Upsert products keyed on url + xpath and append their price observations.
+
+    Returns the ids of the products written.
+    """
+    rows = _unique_rows(results)
+    if not rows:
+        return []
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name == 'postgresql' and len(rows) >= DB_COPY_THRESHOLD:
+        keys = _copy_upsert(db, rows)
+    else:
+        stmt = _upsert_statement(dialect_name).returning(Website.id, Website.url, Website.xpath)
+        keys = []
+        for start in range(0, len(rows), batch_size):
+            keys.extend(db.execute(stmt, rows[start:start + batch_size]).all())
+    _record_observations(db, rows, keys, batch_size)
+    product_ids = _product_ids(rows, keys)
+    recrawl.reschedule(db, [
+        (product_id, row['price'], row['status'] == 'success')
+        for product_id, row in zip(product_ids, rows)
+    ])
+    logger.info(f"Stored {len(rows)} products")
+    return product_ids
+
+
+def collect_statistics(db: Session) -> Dict:
+    """Aggregate product counts and price statistics inside the database."""
+    total_products = db.execute(price_statistics.total_statement()).scalar()
+    summary = db.execute(price_statistics.summary_statement()).one()
+    median = None
+    if summary[0]:
+        median = price_statistics.median_of(db.execute(
+            price_statistics.median_statement(db.get_bind().dialect.name, summary[0])
+        ).scalars().all())
+    return price_statistics.build_statistics(total_products, summary, median)
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+WORKER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Модули воркера импортируются по имени, общие models.py и response_cache.py лежат в корне
+sys.path[:0] = [WORKER_DIR, os.path.dirname(WORKER_DIR)]
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('PARSE_EXECUTOR', 'thread')
+os.environ.setdefault('CRAWL_PER_HOST_RPS', '0')
+
+
+@pytest.fixture
+def db():
+    """Session on a fresh in-memory SQLite database with the full schema."""
+    from models import Base
+
+    engine = create_engine('sqlite://')
+
+    @event.listens_for(engine, 'connect')
+    def foreign_keys(connection, record):
+        # SQLite проверяет внешние ключи, только если это включено
+        connection.execute('PRAGMA foreign_keys=ON')
+
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
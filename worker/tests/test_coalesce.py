@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from coalesce import CoalesceStats, PageCoalescer, group_rows, normalize_url
+from download import Body
+
+URL = 'http://shop.test/item'
+
+
+def test_equal_urls_share_one_group():
+    rows = [{'url': 'HTTP://Shop.Test:80/item#reviews', 'xpath': '//a'},
+            {'url': 'https://shop.test/other', 'xpath': '//a'},
+            {'url': URL, 'xpath': '//b'}]
+    assert normalize_url(rows[0]['url']) == URL
+    assert [[row['xpath'] for row in group] for group in group_rows(rows)] == [['//a', '//b'], ['//a']]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_tasks_wait_for_one_download():
+    coalescer = PageCoalescer(redis_url='')
+    stats = CoalesceStats()
+    downloads = 0
+
+    async def request():
+        nonlocal downloads
+        downloads += 1
+        await asyncio.sleep(0.05)
+        return Body(b'<html>777</html>', 'utf-8'), None, 200
+
+    outcomes = await asyncio.gather(*(coalescer.fetch(URL, ['//p'], request, stats) for _ in range(3)))
+    assert downloads == 1
+    assert {outcome[0].data for outcome in outcomes} == {b'<html>777</html>'}
+    assert (stats.downloads, stats.in_flight) == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_waiting_task_downloads_itself_after_a_failure():
+    coalescer = PageCoalescer(redis_url='')
+    stats = CoalesceStats()
+
+    async def request():
+        await asyncio.sleep(0.01)
+        return None, 'HTTP 500', None
+
+    outcomes = await asyncio.gather(*(coalescer.fetch(URL, [], request, stats) for _ in range(2)))
+    assert [outcome[1] for outcome in outcomes] == ['HTTP 500', 'HTTP 500']
+    assert (stats.downloads, stats.in_flight) == (2, 0)
+
+
+@pytest.mark.asyncio
+async def test_other_worker_reuses_a_published_page():
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    workers = []
+    for _ in range(2):
+        coalescer = PageCoalescer(redis_url='redis://fake')
+        coalescer.redis._redis = fakeredis.FakeAsyncRedis(server=server)
+        workers.append(coalescer)
+
+    await workers[0].publish('HTTP://shop.test/item', Body(b'<html>777</html>', 'utf-8', etag='"v1"'))
+    body = await workers[1].lookup(URL, ['//p'])
+    assert (body.data, body.etag) == (b'<html>777</html>', '"v1"')
@@ -0,0 +1,58 @@
+import pytest
+
+import download
+from download import read_body
+
+HEAD = b'<html><head><title>Item</title></head><body>'
+PAGE = HEAD + b'<div id="price">12 499 \xe2\x82\xbd</div>' + b'<p>' + b'x' * 200_000 + b'</p></body></html>'
+
+
+class FakeContent:
+    def __init__(self, data):
+        self.data = data
+
+    async def iter_chunked(self, size):
+        for start in range(0, len(self.data), size):
+            yield self.data[start:start + size]
+
+
+class FakeResponse:
+    def __init__(self, data, charset=None):
+        self.content = FakeContent(data)
+        self.charset = charset
+        self.headers = {'ETag': '"v1"'}
+
+
+@pytest.fixture(params=[7, 4096, 65536])
+def chunk_size(request, monkeypatch):
+    monkeypatch.setattr(download, 'DOWNLOAD_CHUNK_SIZE', request.param)
+    return request.param
+
+
+@pytest.mark.asyncio
+async def test_reading_stops_after_the_price_element(chunk_size):
+    body = await read_body(FakeResponse(PAGE), ['//*[@id="price"]'], margin=100)
+    assert body.stopped == 'early_stop'
+    # Точка обрыва зависит только от содержимого, не от размера фрагментов
+    assert body.data == PAGE[:PAGE.index(b'<div id="price"') + len(b'<div id="price"') + 100]
+    assert body.etag == '"v1"'
+
+
+@pytest.mark.asyncio
+async def test_selector_without_an_id_reads_the_whole_page(chunk_size):
+    body = await read_body(FakeResponse(PAGE), ['//div[@class="price"]'], margin=100)
+    assert (body.stopped, body.data) == (None, PAGE)
+
+
+@pytest.mark.asyncio
+async def test_body_is_capped(chunk_size):
+    body = await read_body(FakeResponse(PAGE), [], max_bytes=1000)
+    assert (body.stopped, len(body.data)) == ('size_cap', 1000)
+
+
+@pytest.mark.asyncio
+async def test_encoding_comes_from_the_meta_tag():
+    page = '<html><head><meta charset="windows-1251"><title>Товар</title></head></html>'.encode('cp1251')
+    body = await read_body(FakeResponse(page))
+    assert body.encoding == 'cp1251'
+    assert body.data.decode(body.encoding).count('Товар') == 1
@@ -0,0 +1,48 @@
+import time
+from decimal import Decimal
+
+from extraction import extract_page_fields, parse_price
+
+PAGE = """<html><head><title>Item</title></head><body>
+<div id="sku">1234 5678 9012 3456</div>
+<div class="product"><span class="price">777 ₽</span></div>
+</body></html>"""
+
+
+def test_parse_price_keeps_ordinary_prices():
+    assert parse_price('12 499,90 ₽') == Decimal('12499.90')
+    assert parse_price('999 999 999 999') == Decimal('999999999999')
+
+
+def test_parse_price_rejects_values_that_overflow_the_column():
+    assert parse_price('1000000000000') is None
+    assert parse_price('1234 5678 9012 3456') is None
+
+
+def test_sku_in_target_node_is_not_stored_as_price():
+    # Группы цифр артикула ценой не считаются, цена находится на странице
+    fields = extract_page_fields(PAGE, ['//*[@id="sku"]'], 'utf-8')[0]
+    assert (fields['price'], fields['price_strategy']) == (Decimal('777'), 'heuristic')
+
+
+def test_css_class_selectors_are_not_taken_for_xpath():
+    for selector in ('.price', '.product .price', 'div.product > span.price'):
+        fields = extract_page_fields(PAGE, [selector], 'utf-8')[0]
+        assert (fields['price'], fields['price_strategy']) == (Decimal('777'), 'css'), selector
+
+
+def test_relative_xpath_is_still_xpath():
+    fields = extract_page_fields(PAGE, ['.//span[@class="price"]'], 'utf-8')[0]
+    assert (fields['price'], fields['price_strategy']) == (Decimal('777'), 'xpath')
+
+
+def test_long_digit_runs_do_not_backtrack():
+    digits = '7' * 40
+    page = f"""<html><body><div id="sku">Артикул {digits}</div>
+<p>{digits} штрихкод, цена 1 990 ₽</p></body></html>"""
+    started = time.perf_counter()
+    by_selector = extract_page_fields(page, ['//*[@id="sku"]'], 'utf-8')[0]
+    heuristic = extract_page_fields(page, [''], 'utf-8')[0]
+    assert time.perf_counter() - started < 0.5
+    assert by_selector['price'] is None
+    assert heuristic['price'] == Decimal('1990')
@@ -0,0 +1,42 @@
+from sqlalchemy import func, select
+
+import jobs
+import migrations
+from models import CrawlJob, CrawlResult
+
+
+def results(*urls, success=True):
+    return [{'url': url, 'xpath': '//p', 'title': url, 'success': success} for url in urls]
+
+
+def job(db) -> CrawlJob:
+    db.expire_all()
+    return db.get(CrawlJob, 'j1')
+
+
+def test_redelivered_chunk_is_not_counted_twice(db):
+    jobs.set_total(db, 'j1', 3)
+    # Воркер успел записать две строки и упал; задача пришла заново целиком
+    jobs.record_results(db, 'j1', results('http://a', 'http://b'))
+    jobs.record_results(db, 'j1', results('http://a', 'http://b'))
+    assert (job(db).done, job(db).status) == (2, 'running')
+    jobs.record_results(db, 'j1', results('http://c', success=False))
+    assert (job(db).done, job(db).failed, job(db).status) == (2, 1, 'finished')
+    assert db.execute(select(func.count(CrawlResult.id))).scalar() == 3
+
+
+def test_first_results_create_the_job(db):
+    jobs.record_results(db, 'j1', results('http://a'))
+    assert job(db).done == 1
+
+
+def test_migration_removes_duplicates_and_adds_unique_index(db):
+    engine = db.get_bind()
+    with engine.begin() as conn:
+        conn.exec_driver_sql('DROP INDEX uq_crawl_results_job_url_xpath')
+    jobs.set_total(db, 'j1', 1)
+    row = {'job_id': 'j1', 'url': 'http://a', 'xpath': '//p', 'success': True}
+    db.execute(CrawlResult.__table__.insert(), [row, row])
+    db.commit()
+    migrations.crawl_results_unique(engine)
+    assert db.execute(select(func.count(CrawlResult.id))).scalar() == 1
@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, inspect
+
+import migrations
+from models import Base
+
+
+def test_upgrade_creates_the_schema_and_can_run_again():
+    engine = create_engine('sqlite://')
+    migrations.upgrade(engine, Base.metadata)
+    migrations.upgrade(engine, Base.metadata)
+    assert {'websites', 'crawl_results', 'price_observations'} <= set(inspect(engine).get_table_names())
+
+
+def test_postgres_upgrade_runs_under_an_advisory_lock():
+    events = []
+
+    class Connection:
+        def execute(self, statement, params):
+            events.append(str(statement).split('(')[0])
+
+        def commit(self):
+            pass
+
+    @contextmanager
+    def connect():
+        yield Connection()
+
+    engine = SimpleNamespace(dialect=SimpleNamespace(name='postgresql'), connect=connect)
+    with migrations.schema_lock(engine):
+        events.append('migrate')
+    assert events == ['SELECT pg_advisory_lock', 'migrate', 'SELECT pg_advisory_unlock']
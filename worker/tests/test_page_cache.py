@@ -0,0 +1,96 @@
+from decimal import Decimal
+
+import pytest
+
+import main
+from page_cache import CachedPage, ChangeStats, content_hash, load_cache, save_validators
+from storage import save_results
+
+URL = 'http://shop.test/item'
+XPATH = '//*[@id="price"]'
+PAGE = '<html><body><span id="price">777 ₽</span></body></html>'.encode('utf-8')
+PREVIOUS = {'title': 'Item', 'description': '', 'keywords': '', 'price': Decimal('700'),
+            'price_raw': '700 ₽', 'currency': 'RUB'}
+
+
+class FakeContent:
+    def __init__(self, data):
+        self.data = data
+
+    async def iter_chunked(self, size):
+        yield self.data
+
+
+class FakeResponse:
+    def __init__(self, status, body=b''):
+        self.status = status
+        self.content = FakeContent(body)
+        self.charset = 'utf-8'
+        self.headers = {'Content-Type': 'text/html; charset=utf-8', 'ETag': '"v2"'}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+        self.sent_headers = []
+
+    def get(self, url, headers=None):
+        self.sent_headers.append(headers)
+        return self.response
+
+
+def cached_page(body_hash='old'):
+    return CachedPage(etag='"v1"', last_modified='Mon, 01 Jan 2024 00:00:00 GMT',
+                      content_hash=body_hash, fields={XPATH: PREVIOUS})
+
+
+def test_validators_and_last_values_are_loaded_back(db):
+    result = {'url': URL, 'xpath': XPATH, 'title': 'Item', 'status': 'success', 'success': True,
+              'price': Decimal('700'), 'price_raw': '700 ₽', 'currency': 'RUB',
+              'etag': '"v1"', 'last_modified': None, 'content_hash': 'abc'}
+    save_results(db, [result])
+    save_validators(db, [result])
+    db.commit()
+    cached = load_cache(db, [URL, 'http://shop.test/unknown'])
+    assert list(cached) == [URL]
+    assert cached[URL].headers() == {'If-None-Match': '"v1"'}
+    assert cached[URL].fields[XPATH]['price'] == Decimal('700')
+
+
+@pytest.mark.asyncio
+async def test_not_modified_page_reuses_the_last_values():
+    session = FakeSession(FakeResponse(304))
+    stats = ChangeStats()
+    result = (await main.fetch_page(session, [{'url': URL, 'xpath': XPATH, 'title': 'Item'}],
+                                    cached_page(), stats))[0]
+    assert session.sent_headers[0]['If-None-Match'] == '"v1"'
+    assert 'If-Modified-Since' in session.sent_headers[0]
+    assert (result['price'], result['unchanged']) == (Decimal('700'), True)
+    assert stats.not_modified == 1
+
+
+@pytest.mark.asyncio
+async def test_same_content_hash_skips_parsing():
+    stats = ChangeStats()
+    result = (await main.fetch_page(FakeSession(FakeResponse(200, PAGE)),
+                                    [{'url': URL, 'xpath': XPATH, 'title': 'Item'}],
+                                    cached_page(content_hash(PAGE)), stats))[0]
+    assert (result['price'], result['unchanged'], result['etag']) == (Decimal('700'), True, '"v2"')
+    assert stats.same_hash == 1
+
+
+@pytest.mark.asyncio
+async def test_changed_page_is_parsed_again():
+    stats = ChangeStats()
+    result = (await main.fetch_page(FakeSession(FakeResponse(200, PAGE)),
+                                    [{'url': URL, 'xpath': XPATH, 'title': 'Item'}],
+                                    cached_page(), stats))[0]
+    assert (result['price'], result['unchanged']) == (Decimal('777'), False)
+    assert result['content_hash'] == content_hash(PAGE)
+    assert stats.changed == 1
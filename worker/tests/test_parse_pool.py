@@ -0,0 +1,39 @@
+from concurrent.futures import Executor, Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import main
+
+PAGE = '<html><body><span id="price">777 ₽</span></body></html>'
+
+
+class BrokenPool(Executor):
+    """Pool whose child process has died: every submit fails."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_exception(BrokenProcessPool('child died'))
+        return future
+
+
+@pytest.fixture
+def broken_pool(monkeypatch):
+    configure = main.configure_parse_executor
+    monkeypatch.setattr(main, '_parse_executor', BrokenPool())
+    yield
+    configure('thread')
+
+
+@pytest.mark.asyncio
+async def test_broken_pool_is_replaced_and_page_retried(broken_pool):
+    fields = await main.parse_in_pool(PAGE, ['//*[@id="price"]'], 'utf-8')
+    assert str(fields[0]['price']) == '777'
+    assert not isinstance(main._parse_executor, BrokenPool)
+
+
+@pytest.mark.asyncio
+async def test_page_that_breaks_the_pool_twice_fails_alone(broken_pool, monkeypatch):
+    monkeypatch.setattr(main, 'configure_parse_executor', lambda: setattr(main, '_parse_executor', BrokenPool()))
+    with pytest.raises(BrokenProcessPool):
+        await main.parse_in_pool(PAGE, ['//*[@id="price"]'], 'utf-8')
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from pipeline import run_pipeline
+
+
+@pytest.mark.asyncio
+async def test_producer_error_waits_for_running_sink():
+    written = []
+    sink_running = threading.Event()
+
+    def sink(batch):
+        sink_running.set()
+        time.sleep(0.05)
+        written.extend(batch)
+
+    async def produce(put):
+        await put(1)
+        while not sink_running.is_set():
+            await asyncio.sleep(0.001)
+        await put(2)
+        raise RuntimeError('fetch failed')
+
+    with pytest.raises(RuntimeError, match='fetch failed'):
+        await run_pipeline(produce, sink, queue_size=1, flush_size=1)
+    # Уже поставленные в очередь результаты записаны, поток записи завершён
+    assert written == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_sink_error_stops_producer():
+    def sink(batch):
+        raise ValueError('db down')
+
+    async def produce(put):
+        for n in range(100):
+            await put(n)
+
+    with pytest.raises(ValueError, match='db down'):
+        await run_pipeline(produce, sink, queue_size=1, flush_size=1)
+
+
+@pytest.mark.asyncio
+async def test_all_results_reach_the_sink():
+    written = []
+
+    async def produce(put):
+        for n in range(10):
+            await put(n)
+
+    await run_pipeline(produce, written.extend, queue_size=2, flush_size=3)
+    assert written == list(range(10))
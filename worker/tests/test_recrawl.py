@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import recrawl
+from models import CrawlSchedule, Website
+
+NOW = datetime(2024, 1, 1)
+DAY = 24 * 3600
+
+
+def product(db, n=1) -> int:
+    website = Website(title=str(n), url=f'http://shop.test/{n}', xpath='//p', status='success')
+    db.add(website)
+    db.flush()
+    return website.id
+
+
+def schedule(db, product_id) -> CrawlSchedule:
+    db.expire_all()
+    return db.get(CrawlSchedule, product_id)
+
+
+def test_interval_halves_on_a_change_and_grows_while_stable(monkeypatch):
+    monkeypatch.setattr(recrawl, 'RECRAWL_BACKOFF', 2)
+    assert recrawl.next_interval(DAY, changed=True) == DAY // 2
+    assert recrawl.next_interval(DAY, changed=False) == 2 * DAY
+    assert recrawl.next_interval(recrawl.RECRAWL_MIN_INTERVAL, changed=True) == recrawl.RECRAWL_MIN_INTERVAL
+    assert recrawl.next_interval(recrawl.RECRAWL_MAX_INTERVAL, changed=False) == recrawl.RECRAWL_MAX_INTERVAL
+
+
+def test_reschedule_follows_price_changes(db):
+    product_id = product(db)
+    recrawl.reschedule(db, [(product_id, Decimal('100'), True)], now=NOW)
+    first = schedule(db, product_id)
+    assert (first.interval_seconds, first.next_check_at) == (
+        recrawl.RECRAWL_DEFAULT_INTERVAL, NOW + timedelta(seconds=recrawl.RECRAWL_DEFAULT_INTERVAL))
+
+    recrawl.reschedule(db, [(product_id, Decimal('100'), True)], now=NOW)
+    stable = schedule(db, product_id)
+    assert (stable.interval_seconds, stable.unchanged_checks) == (
+        recrawl.next_interval(recrawl.RECRAWL_DEFAULT_INTERVAL, changed=False), 1)
+
+    recrawl.reschedule(db, [(product_id, Decimal('90'), True)], now=NOW)
+    changed = schedule(db, product_id)
+    assert (changed.interval_seconds, changed.unchanged_checks, changed.last_price) == (
+        recrawl.next_interval(recrawl.next_interval(recrawl.RECRAWL_DEFAULT_INTERVAL, changed=False),
+                              changed=True), 0, Decimal('90'))
+
+
+def test_failed_check_keeps_the_interval_and_retries_soon(db):
+    product_id = product(db)
+    recrawl.reschedule(db, [(product_id, Decimal('100'), True)], now=NOW)
+    recrawl.reschedule(db, [(product_id, None, False)], now=NOW)
+    failed = schedule(db, product_id)
+    assert failed.interval_seconds == recrawl.RECRAWL_DEFAULT_INTERVAL
+    assert failed.last_price == Decimal('100')
+    assert failed.next_check_at == NOW + timedelta(seconds=recrawl.RECRAWL_MIN_INTERVAL)
+
+
+def test_claim_due_takes_each_due_product_once(db):
+    due, later = product(db, 1), product(db, 2)
+    recrawl.reschedule(db, [(due, Decimal('1'), True), (later, Decimal('2'), True)], now=NOW)
+    db.get(CrawlSchedule, due).next_check_at = NOW - timedelta(minutes=1)
+    db.flush()
+
+    claimed = recrawl.claim_due(db, now=NOW)
+    assert claimed == [{'url': 'http://shop.test/1', 'xpath': '//p', 'title': '1'}]
+    assert recrawl.claim_due(db, now=NOW) == []
+    assert schedule(db, due).next_check_at > NOW
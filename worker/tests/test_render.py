@@ -0,0 +1,96 @@
+"""Render fallback of fetch_page against local fixture pages and a stand-in browser pool."""
+from pathlib import Path
+
+import aiohttp
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+import main
+import render
+from render import RenderStats
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+XPATH = '//*[@id="product-price"]'
+
+
+class FakeRenderPool:
+    """Returns the saved post-script DOM of a page instead of running a browser."""
+
+    def __init__(self, pages=None, error=None):
+        self.pages = pages or {}
+        self.error = error
+        self.calls = []
+
+    async def render(self, url, selectors):
+        self.calls.append((url, list(selectors)))
+        if self.error is not None:
+            raise self.error
+        return self.pages[url.rsplit('/', 1)[-1]]
+
+
+@pytest_asyncio.fixture
+async def site():
+    async def page(request):
+        return web.FileResponse(FIXTURES / request.match_info['name'],
+                                headers={'Content-Type': 'text/html; charset=utf-8'})
+
+    app = web.Application()
+    app.router.add_get('/{name}', page)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    server = web.TCPSite(runner, '127.0.0.1', 0)
+    await server.start()
+    port = server._server.sockets[0].getsockname()[1]
+    async with aiohttp.ClientSession() as session:
+        yield session, f'http://127.0.0.1:{port}'
+    await runner.cleanup()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = FakeRenderPool({'js_price.html': (FIXTURES / 'js_price_rendered.html').read_text('utf-8')})
+    monkeypatch.setattr(render, 'get_pool', lambda: pool)
+    monkeypatch.setattr(render, 'opted_in', lambda host: host == '127.0.0.1')
+    return pool
+
+
+async def crawl(site, name):
+    session, base_url = site
+    stats = RenderStats()
+    rows = [{'url': f'{base_url}/{name}', 'xpath': XPATH, 'title': name}]
+    return (await main.fetch_page(session, rows, rendering=stats))[0], stats
+
+
+@pytest.mark.asyncio
+async def test_price_set_by_script_is_taken_from_the_rendered_page(site, pool):
+    result, stats = await crawl(site, 'js_price.html')
+    assert str(result['price']) == '12499'
+    assert result['rendered'] is True
+    assert pool.calls == [(f'{site[1]}/js_price.html', [XPATH])]
+    assert (stats.rendered, stats.found, stats.static_hits) == (1, 1, 0)
+
+
+@pytest.mark.asyncio
+async def test_price_in_the_html_skips_the_browser(site, pool):
+    result, stats = await crawl(site, 'static_price.html')
+    assert str(result['price']) == '9990'
+    assert 'rendered' not in result
+    assert pool.calls == []
+    assert stats.static_hits == 1
+
+
+@pytest.mark.asyncio
+async def test_hosts_not_opted_in_are_never_rendered(site, pool, monkeypatch):
+    monkeypatch.setattr(render, 'opted_in', lambda host: False)
+    result, stats = await crawl(site, 'js_price.html')
+    assert result['success'] and result['price'] is None
+    assert pool.calls == []
+
+
+@pytest.mark.asyncio
+async def test_browser_failure_keeps_the_static_result(site, pool):
+    pool.error = RuntimeError('headless browser is unavailable')
+    result, stats = await crawl(site, 'js_price.html')
+    assert result['success'] and result['price'] is None
+    assert stats.errors == 1
@@ -0,0 +1,50 @@
+import pytest
+
+from response_cache import MISSING, STATISTICS_KEY, ResponseCache, product_key, product_keys
+
+
+@pytest.fixture(params=['local', 'redis'])
+def cache(request):
+    cache = ResponseCache(redis_url='', local_ttl=60)
+    if request.param == 'redis':
+        fakeredis = pytest.importorskip('fakeredis')
+        cache.redis.url = 'redis://fake'
+        cache.redis._redis = fakeredis.FakeRedis()
+    return cache
+
+
+def test_invalidation_drops_only_the_written_products(cache):
+    for key in (STATISTICS_KEY, product_key(1), product_key(2)):
+        cache.get_or_set(key, lambda: 'old')
+    cache.invalidate(product_keys([1]))
+    assert cache.get(STATISTICS_KEY) is MISSING
+    assert cache.get(product_key(1)) is MISSING
+    assert cache.get(product_key(2)) == 'old'
+
+
+def test_value_computed_across_an_invalidation_is_not_stored(cache):
+    def compute():
+        # Запись в базу и инвалидация случились, пока значение считалось
+        cache.invalidate([STATISTICS_KEY])
+        return 'stale'
+
+    assert cache.get_or_set(STATISTICS_KEY, compute) == 'stale'
+    cache.local.clear()
+    assert cache.get(STATISTICS_KEY) is MISSING
+
+
+def test_other_process_does_not_store_over_an_invalidation(cache):
+    if not cache.redis.enabled:
+        pytest.skip('needs the shared tier')
+    writer = ResponseCache(redis_url='redis://fake')
+    writer.redis._redis = cache.redis._redis
+
+    def compute():
+        writer.invalidate([STATISTICS_KEY])
+        return 'stale'
+
+    assert cache.get_or_set(STATISTICS_KEY, compute) == 'stale'
+    assert writer.get(STATISTICS_KEY) is MISSING
+    writer.get_or_set(STATISTICS_KEY, lambda: 'fresh')
+    cache.local.clear()
+    assert cache.get(STATISTICS_KEY) == 'fresh'
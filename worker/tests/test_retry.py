@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+import main
+import retry
+from retry import CircuitBreaker
+
+URL = 'http://shop.test/item'
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+        self.headers = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Answers each get() with the next scripted status, or raises the scripted exception."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+
+    def get(self, url, headers=None):
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+def tripped_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failures=1, cooldown=0)
+    breaker.record_failure('shop.test')
+    return breaker
+
+
+@pytest.fixture(autouse=True)
+def no_retries(monkeypatch):
+    monkeypatch.setattr(retry, 'RETRY_ATTEMPTS', 0)
+
+
+@pytest.mark.asyncio
+async def test_probe_with_non_retryable_error_closes_breaker():
+    breaker = tripped_breaker()
+    body, error, status = await main._request_page(FakeSession(ValueError('bad')), URL, {}, (), breaker)
+    assert error == 'bad'
+    assert not breaker.is_probing('shop.test')
+    assert breaker.allow('shop.test')
+    assert not breaker.is_open('shop.test')
+
+
+@pytest.mark.asyncio
+async def test_failed_probe_reopens_breaker():
+    breaker = tripped_breaker()
+    breaker.cooldown = 60
+    breaker.hosts['shop.test'].opened_until = 0
+    await main._request_page(FakeSession(503), URL, {}, (), breaker)
+    assert not breaker.is_probing('shop.test')
+    assert not breaker.allow('shop.test')
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_lets_next_request_probe():
+    breaker = tripped_breaker()
+    with pytest.raises(asyncio.CancelledError):
+        await main._request_page(FakeSession(asyncio.CancelledError()), URL, {}, (), breaker)
+    assert not breaker.is_probing('shop.test')
+    assert breaker.allow('shop.test')
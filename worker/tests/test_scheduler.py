@@ -0,0 +1,66 @@
+import asyncio
+
+from scheduler import CrawlScheduler, HostLimiter
+
+
+def crawl(limiter, items, peak, active, delay=0.01):
+    async def handler(item):
+        active[item[0]] += 1
+        peak[item[0]] = max(peak[item[0]], active[item[0]])
+        await asyncio.sleep(delay)
+        active[item[0]] -= 1
+        return item
+
+    return CrawlScheduler(max_concurrency=50, limiter=limiter).run(items, handler, key=lambda item: item[0])
+
+
+def test_results_keep_input_order_and_hosts_are_interleaved():
+    order = []
+
+    async def handler(item):
+        order.append(item)
+        return item
+
+    items = [('a', n) for n in range(5)] + [('b', n) for n in range(2)]
+    scheduler = CrawlScheduler(max_concurrency=1, per_host_concurrency=1)
+    results = asyncio.run(scheduler.run(items, handler, key=lambda item: item[0]))
+    assert results == items
+    assert order[:4] == [('a', 0), ('b', 0), ('a', 1), ('b', 1)]
+    assert scheduler.stats()['a'] == {'queued': 0, 'in_flight': 0, 'completed': 5}
+
+
+def test_concurrent_crawls_share_the_per_host_limit():
+    limiter = HostLimiter(per_host_concurrency=2)
+    peak = {'a': 0, 'b': 0}
+    active = {'a': 0, 'b': 0}
+
+    async def main():
+        # Две порции одной загрузки в одном процессе
+        await asyncio.gather(
+            crawl(limiter, [('a', n) for n in range(10)], peak, active),
+            crawl(limiter, [('a', n) for n in range(10)] + [('b', 0)], peak, active),
+        )
+
+    asyncio.run(main())
+    assert peak['a'] == 2
+    assert limiter.in_flight == {}
+
+
+def test_rate_limit_spans_crawls():
+    limiter = HostLimiter(per_host_concurrency=10, per_host_rps=50)
+    started = []
+
+    async def handler(item):
+        started.append(asyncio.get_running_loop().time())
+
+    async def main():
+        await asyncio.gather(*(
+            CrawlScheduler(limiter=limiter).run([('a', n) for n in range(3)], handler,
+                                                key=lambda item: item[0])
+            for _ in range(2)
+        ))
+
+    asyncio.run(main())
+    gaps = [later - earlier for earlier, later in zip(started, started[1:])]
+    assert len(started) == 6
+    assert min(gaps) >= 0.015
@@ -0,0 +1,31 @@
+from decimal import Decimal
+
+import storage
+from models import Website
+
+
+def add(db, *prices, status='success'):
+    for n, price in enumerate(prices, start=len(db.query(Website).all())):
+        db.add(Website(title=str(n), url=f'http://shop.test/{n}', status=status,
+                       price=Decimal(price) if price is not None else None))
+    db.commit()
+
+
+def test_statistics_of_priced_products(db):
+    add(db, '100', '300', '200', '1000')
+    add(db, None)
+    add(db, '5', status='error: HTTP 503')
+    assert storage.collect_statistics(db) == {
+        'total_products': 6,
+        'products_with_price': 4,
+        'average_price': '400.00',
+        'min_price': '100.00',
+        'max_price': '1,000.00',
+        'median_price': '250.00',
+    }
+
+
+def test_statistics_without_prices(db):
+    assert storage.collect_statistics(db)['median_price'] is None
+    add(db, '7')
+    assert storage.collect_statistics(db)['median_price'] == '7.00'
@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+from sqlalchemy import select
+
+import storage
+from models import Website
+
+URL = 'http://shop.test/item'
+
+
+def success(price):
+    return {'url': URL, 'xpath': '//p', 'title': 'Item', 'status': 'success', 'success': True,
+            'price': price, 'price_raw': f'{price} ₽', 'currency': 'RUB',
+            'description': 'desc', 'keywords': 'kw'}
+
+
+def failure(status):
+    return {'url': URL, 'xpath': '//p', 'title': 'Item', 'status': status, 'success': False,
+            'error': 'HTTP 503'}
+
+
+def stored(db) -> Website:
+    db.expire_all()
+    return db.execute(select(Website)).scalar_one()
+
+
+def test_failed_check_keeps_last_values(db):
+    storage.save_results(db, [success(Decimal('100.00'))])
+    storage.save_results(db, [failure('error: HTTP 503')])
+    website = stored(db)
+    assert website.status == 'error: HTTP 503'
+    assert (website.price, website.price_raw, website.currency) == (Decimal('100.00'), '100.00 ₽', 'RUB')
+    assert (website.description, website.keywords) == ('desc', 'kw')
+
+
+def test_deferred_row_keeps_status(db):
+    storage.save_results(db, [success(Decimal('100.00'))])
+    storage.save_results(db, [failure('deferred: circuit open')])
+    website = stored(db)
+    assert website.status == 'success'
+    assert website.price == Decimal('100.00')
+    assert storage.collect_statistics(db)['products_with_price'] == 1
+
+
+def test_success_without_price_clears_it(db):
+    storage.save_results(db, [success(Decimal('100.00'))])
+    storage.save_results(db, [dict(success(None), price_raw=None)])
+    assert stored(db).price is None
+
+
+def test_copy_update_clause_matches_statement():
+    clause = storage._copy_update_clause()
+    assert "price = CASE WHEN EXCLUDED.status = 'success'" in clause
+    assert "status = CASE WHEN EXCLUDED.status LIKE 'deferred%'" in clause
+    assert 'last_checked = EXCLUDED.last_checked' in clause
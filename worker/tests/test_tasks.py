@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import main
+from extraction import EMPTY_FIELDS
+from models import Base
+
+ROWS = [{'url': f'http://shop.test/{n}', 'xpath': '//p', 'title': str(n)} for n in range(3)]
+
+
+@pytest.fixture
+def crawl(monkeypatch):
+    # Результаты пишутся из потока конвейера, поэтому база одна на все потоки
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(main, 'SessionLocal', sessionmaker(bind=engine))
+
+    async def fake_fetch_all(websites_data, *args, on_result=None, **kwargs):
+        for row in websites_data:
+            await on_result(main._success_result(row['url'], row['xpath'], row['title'], dict(EMPTY_FIELDS)))
+
+    progress = []
+    monkeypatch.setattr(main, 'fetch_all', fake_fetch_all)
+    monkeypatch.setattr(main.process_websites, 'update_state', lambda **kwargs: progress.append(kwargs))
+    return progress
+
+
+def test_progress_is_stored_for_a_plain_task(crawl):
+    summaries = main.process_websites.apply(args=[ROWS]).get()
+    assert [summary['success'] for summary in summaries] == [True] * 3
+    assert crawl[-1]['meta'] == {'done': 3, 'total': 3}
+
+
+@pytest.mark.parametrize('kwargs, options', [
+    ({'job_id': 'j1'}, {}),
+    ({}, {'ignore_result': True}),
+])
+def test_progress_is_not_stored_for_jobs_and_ignored_results(crawl, kwargs, options):
+    result = main.process_websites.apply(args=[ROWS], kwargs=kwargs, **options).get()
+    assert 'error' not in (result if isinstance(result, dict) else result[0])
+    assert crawl == []